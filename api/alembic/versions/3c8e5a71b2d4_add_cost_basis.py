@@ -0,0 +1,74 @@
+"""add cost basis, realized pnl and fifo lots
+
+Revision ID: 3c8e5a71b2d4
+Revises: 7d2a9c4e1f36
+Create Date: 2026-10-19 15:02:37.118402
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models import CostBasisMethod, PortfolioLot
+
+# revision identifiers, used by Alembic.
+revision: str = "3c8e5a71b2d4"
+down_revision: Union[str, None] = "7d2a9c4e1f36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+cost_basis_method = sa.Enum(CostBasisMethod, name="costbasismethod")
+
+
+def _columns(conn, table_name: str) -> set:
+    return {column["name"] for column in sa.inspect(conn).get_columns(table_name)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    # Tables may already be up to date when created by `create_all`
+    if "cost_basis_method" not in _columns(conn, "portfolios"):
+        cost_basis_method.create(conn, checkfirst=True)
+        op.add_column(
+            "portfolios",
+            sa.Column(
+                "cost_basis_method",
+                cost_basis_method,
+                nullable=False,
+                server_default=CostBasisMethod.AVERAGE.name,
+            ),
+        )
+
+    holding_columns = _columns(conn, "portfolio_holdings")
+    if "cost_basis" not in holding_columns:
+        op.add_column(
+            "portfolio_holdings", sa.Column("cost_basis", sa.Float(), nullable=True)
+        )
+        # Best effort for existing holdings: the recorded average price
+        op.execute(
+            "UPDATE portfolio_holdings SET cost_basis = quantity * avg_purchase_price"
+        )
+    if "realized_pnl" not in holding_columns:
+        op.add_column(
+            "portfolio_holdings",
+            sa.Column("realized_pnl", sa.Float(), nullable=False, server_default="0"),
+        )
+
+    PortfolioLot.__table__.create(conn, checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+
+    PortfolioLot.__table__.drop(conn, checkfirst=True)
+    with op.batch_alter_table("portfolio_holdings") as batch_op:
+        batch_op.drop_column("realized_pnl")
+        batch_op.drop_column("cost_basis")
+    with op.batch_alter_table("portfolios") as batch_op:
+        batch_op.drop_column("cost_basis_method")
+    cost_basis_method.drop(conn, checkfirst=True)
@@ -0,0 +1,69 @@
+"""unique portfolio holding per asset
+
+Revision ID: 4a9d2e6b8c13
+Revises: e51a7c3b9f02
+Create Date: 2026-10-19 19:05:13.402116
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "4a9d2e6b8c13"
+down_revision: Union[str, None] = "e51a7c3b9f02"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSTRAINT_NAME = "uq_portfolio_holdings_asset"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    constraints = sa.inspect(op.get_bind()).get_unique_constraints("portfolio_holdings")
+    # Already there when the table was created by `create_all`
+    if any(c["name"] == CONSTRAINT_NAME for c in constraints):
+        return
+
+    # Merge duplicate rows into the oldest one of each asset, summing their
+    # quantities, costs and realized PnL. The cost stays unknown if any of
+    # the merged rows had none
+    op.execute("""
+        UPDATE portfolio_holdings SET
+            quantity = totals.quantity,
+            cost_basis = totals.cost_basis,
+            realized_pnl = totals.realized_pnl,
+            avg_purchase_price = CASE
+                WHEN totals.quantity > 0 AND totals.cost_basis IS NOT NULL
+                THEN totals.cost_basis / totals.quantity
+                ELSE 0
+            END
+        FROM (
+            SELECT MIN(id) AS id,
+                   SUM(quantity) AS quantity,
+                   CASE WHEN COUNT(cost_basis) = COUNT(*)
+                        THEN SUM(cost_basis)
+                   END AS cost_basis,
+                   SUM(realized_pnl) AS realized_pnl
+            FROM portfolio_holdings
+            GROUP BY portfolio_id, asset_id
+            HAVING COUNT(*) > 1
+        ) AS totals
+        WHERE portfolio_holdings.id = totals.id
+        """)
+    op.execute("""
+        DELETE FROM portfolio_holdings WHERE id NOT IN (
+            SELECT MIN(id) FROM portfolio_holdings GROUP BY portfolio_id, asset_id
+        )
+        """)
+
+    with op.batch_alter_table("portfolio_holdings") as batch_op:
+        batch_op.create_unique_constraint(CONSTRAINT_NAME, ["portfolio_id", "asset_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("portfolio_holdings") as batch_op:
+        batch_op.drop_constraint(CONSTRAINT_NAME, type_="unique")
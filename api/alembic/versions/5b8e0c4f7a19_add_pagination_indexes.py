@@ -0,0 +1,37 @@
+"""add keyset pagination indexes
+
+Revision ID: 5b8e0c4f7a19
+Revises: c7f3a1d95e28
+Create Date: 2026-10-19 21:26:08.904117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5b8e0c4f7a19"
+down_revision: Union[str, None] = "c7f3a1d95e28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_portfolio_transactions_date_id", "portfolio_transactions", "transaction_date"),
+    ("ix_exchange_rates_effective_date_id", "exchange_rates", "effective_date"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for name, table, column in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, [column, "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
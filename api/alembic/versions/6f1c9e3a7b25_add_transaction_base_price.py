@@ -0,0 +1,50 @@
+"""add transaction base price
+
+Revision ID: 6f1c9e3a7b25
+Revises: 8d2f4b6a1e37
+Create Date: 2026-10-20 09:12:48.306117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "6f1c9e3a7b25"
+down_revision: Union[str, None] = "8d2f4b6a1e37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {
+        column["name"]
+        for column in sa.inspect(op.get_bind()).get_columns("portfolio_transactions")
+    }
+    # Existing transactions are priced at the rate of their date the next
+    # time their holding is replayed
+    if "base_price_each" not in columns:
+        op.add_column(
+            "portfolio_transactions",
+            sa.Column("base_price_each", sa.Float(), nullable=True),
+        )
+    if "base_currency_id" not in columns:
+        op.add_column(
+            "portfolio_transactions",
+            sa.Column(
+                "base_currency_id",
+                sa.Integer(),
+                sa.ForeignKey("currencies.id"),
+                nullable=True,
+            ),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("portfolio_transactions") as batch_op:
+        batch_op.drop_column("base_currency_id")
+        batch_op.drop_column("base_price_each")
@@ -0,0 +1,49 @@
+"""partition market_data and exchange_rates by month
+
+Revision ID: 7d2a9c4e1f36
+Revises: 53f0b1daef03
+Create Date: 2026-10-19 14:20:11.482913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.models import ExchangeRate, MarketData
+from app.services.retention.partitions import (
+    convert_to_partitioned,
+    convert_to_plain,
+    is_partitioned,
+    supports_partitioning,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2a9c4e1f36"
+down_revision: Union[str, None] = "53f0b1daef03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = [ExchangeRate.__table__, MarketData.__table__]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    if not supports_partitioning(conn):
+        return
+
+    for table in TABLES:
+        if not is_partitioned(conn, table.name):
+            convert_to_partitioned(conn, table)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    if not supports_partitioning(conn):
+        return
+
+    for table in TABLES:
+        if is_partitioned(conn, table.name):
+            convert_to_plain(conn, table)
@@ -0,0 +1,41 @@
+"""add indexes for user scoped transaction listing
+
+Revision ID: 8d2f4b6a1e37
+Revises: 5b8e0c4f7a19
+Create Date: 2026-10-19 22:14:37.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2f4b6a1e37"
+down_revision: Union[str, None] = "5b8e0c4f7a19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    (
+        "ix_portfolio_transactions_portfolio_id_date_id",
+        "portfolio_transactions",
+        ["portfolio_id", "transaction_date", "id"],
+    ),
+    ("ix_portfolios_user_id", "portfolios", ["user_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,30 @@
+"""add portfolio snapshots
+
+Revision ID: 9e4b27c5d1a8
+Revises: 3c8e5a71b2d4
+Create Date: 2026-10-19 16:40:52.207131
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.models import PortfolioSnapshot
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4b27c5d1a8"
+down_revision: Union[str, None] = "3c8e5a71b2d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by the snapshot job, which backfills on its first run
+    PortfolioSnapshot.__table__.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    PortfolioSnapshot.__table__.drop(op.get_bind(), checkfirst=True)
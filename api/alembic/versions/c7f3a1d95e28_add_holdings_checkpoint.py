@@ -0,0 +1,53 @@
+"""add holdings checkpoint
+
+Revision ID: c7f3a1d95e28
+Revises: 4a9d2e6b8c13
+Create Date: 2026-10-19 20:41:37.218554
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c7f3a1d95e28"
+down_revision: Union[str, None] = "4a9d2e6b8c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_portfolio_transactions_portfolio_id_id"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("portfolios")}
+    if "holdings_checkpoint" not in columns:
+        op.add_column(
+            "portfolios", sa.Column("holdings_checkpoint", sa.Integer(), nullable=True)
+        )
+        # Existing holdings were kept up to date by every write, so they
+        # include every transaction so far
+        op.execute("""
+            UPDATE portfolios SET holdings_checkpoint = (
+                SELECT MAX(id) FROM portfolio_transactions
+                WHERE portfolio_transactions.portfolio_id = portfolios.id
+            )
+            """)
+
+    indexes = {
+        index["name"] for index in inspector.get_indexes("portfolio_transactions")
+    }
+    if INDEX_NAME not in indexes:
+        op.create_index(
+            INDEX_NAME, "portfolio_transactions", ["portfolio_id", "id"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(INDEX_NAME, table_name="portfolio_transactions")
+    with op.batch_alter_table("portfolios") as batch_op:
+        batch_op.drop_column("holdings_checkpoint")
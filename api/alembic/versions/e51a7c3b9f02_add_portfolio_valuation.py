@@ -0,0 +1,40 @@
+"""add latest portfolio valuation
+
+Revision ID: e51a7c3b9f02
+Revises: 9e4b27c5d1a8
+Create Date: 2026-10-19 18:12:44.530961
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e51a7c3b9f02"
+down_revision: Union[str, None] = "9e4b27c5d1a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("portfolios")
+    }
+    # Filled by the bulk revaluation job
+    if "total_value" not in columns:
+        op.add_column("portfolios", sa.Column("total_value", sa.Float(), nullable=True))
+    if "valued_at" not in columns:
+        op.add_column(
+            "portfolios",
+            sa.Column("valued_at", sa.DateTime(timezone=True), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("portfolios") as batch_op:
+        batch_op.drop_column("valued_at")
+        batch_op.drop_column("total_value")
@@ -1,15 +1,26 @@
-from typing import Optional
+from typing import AsyncGenerator, Generator, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.auth_cache import token_cache, user_cache
 from app.core.config import settings
 from app.core.security import decode_token
-from app.core.database import get_db
+from app.core.database import (
+    AsyncReadSessionLocal,
+    AsyncSessionLocal,
+    ReadSessionLocal,
+    SessionLocal,
+    get_async_db,
+    get_db,
+)
+from app.core.replica import REPLICA_KEY, USER_ID_KEY, get_last_write, read_router
 from app.models.user import User
+from app.schemas.token import TokenPayload
 from app.crud.user import get_by_id
 
 # OAuth2 token URL (the login endpoint)
@@ -18,39 +29,131 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
+def _verify_token(token: str) -> TokenPayload:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = decode_token(token)
+            if not payload:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Could not validate credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        except (JWTError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        token_cache.set(token, payload)
+    return payload
+
+
+def _load_user(db: Session, user_id: int) -> User:
+    user = user_cache.get(db, user_id)
+    if user is None:
+        generation = user_cache.token(user_id)
+        user = get_by_id(db, user_id=user_id)
+
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+        # The replica may not have a change the cache was just invalidated for
+        if not db.info.get(REPLICA_KEY):
+            user_cache.set(user, generation)
+    # Commits of this session are the user's writes, see `get_read_db`
+    db.info[USER_ID_KEY] = user.id
+    return user
+
+
+def _check_active(user: User) -> User:
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user",
+        )
+    return user
+
+
+def _check_admin(user: User) -> User:
+    if not user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return user
+
+
 def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
 ) -> User:
     """
     Dependency for getting the current authenticated user.
     Validates the JWT token and returns the corresponding user.
+    Verified tokens and their users are served from a cache when possible.
 
     Raises:
         HTTPException: If token is invalid or user not found
     """
+    return _load_user(db, _verify_token(token).sub)
+
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    """
+    `get_current_user` for `async def` endpoints, with the user attached to
+    their async session.
+    """
+    return await db.run_sync(_load_user, _verify_token(token).sub)
+
+
+def get_read_db(request: Request) -> Generator:
+    """
+    Dependency for the session of a read-only endpoint. It reads from the
+    read replica, if there is one, unless the client wrote in the last
+    `READ_REPLICA_MAX_LAG_SECONDS` and the replica may miss the write.
+    """
+    use_replica = read_router.use_replica(get_last_write(request))
+    db = (ReadSessionLocal if use_replica else SessionLocal)()
+    db.info[REPLICA_KEY] = use_replica
     try:
-        payload = decode_token(token)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except (JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        yield db
+    finally:
+        db.close()
 
-    user = get_by_id(db, user_id=payload.sub)
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    return user
+async def get_async_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    `get_read_db` for `async def` endpoints.
+    """
+    use_replica = read_router.use_replica(get_last_write(request))
+    async with (AsyncReadSessionLocal if use_replica else AsyncSessionLocal)() as db:
+        db.info[REPLICA_KEY] = use_replica
+        yield db
+
+
+def get_current_reader(
+    db: Session = Depends(get_read_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    """
+    `get_current_user` for read-only endpoints, loaded through their read
+    session so a request holds a single connection.
+    """
+    return _load_user(db, _verify_token(token).sub)
+
+
+async def get_current_reader_async(
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(oauth2_scheme),
+) -> User:
+    """
+    `get_current_reader` for `async def` endpoints.
+    """
+    return await db.run_sync(_load_user, _verify_token(token).sub)
 
 
 def get_current_active_user(
@@ -63,12 +166,34 @@ def get_current_active_user(
     Raises:
         HTTPException: If user is inactive
     """
-    if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user",
-        )
-    return current_user
+    return _check_active(current_user)
+
+
+async def get_current_active_user_async(
+    current_user: User = Depends(get_current_user_async),
+) -> User:
+    """
+    `get_current_active_user` for `async def` endpoints.
+    """
+    return _check_active(current_user)
+
+
+def get_current_active_reader(
+    current_user: User = Depends(get_current_reader),
+) -> User:
+    """
+    `get_current_active_user` for read-only endpoints.
+    """
+    return _check_active(current_user)
+
+
+async def get_current_active_reader_async(
+    current_user: User = Depends(get_current_reader_async),
+) -> User:
+    """
+    `get_current_active_user` for read-only `async def` endpoints.
+    """
+    return _check_active(current_user)
 
 
 def get_current_admin_user(
@@ -81,12 +206,16 @@ def get_current_admin_user(
     Raises:
         HTTPException: If user is not an admin
     """
-    if not current_user.is_superuser:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
-    return current_user
+    return _check_admin(current_user)
+
+
+def get_current_admin_reader(
+    current_user: User = Depends(get_current_active_reader),
+) -> User:
+    """
+    `get_current_admin_user` for read-only endpoints.
+    """
+    return _check_admin(current_user)
 
 
 def get_optional_current_user(
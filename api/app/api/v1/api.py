@@ -10,6 +10,7 @@ from app.api.v1.endpoints import (
     asset_type,
     currency,
     portfolio,
+    exchange_rates,
 )
 
 api_router = APIRouter()
@@ -22,6 +23,9 @@ api_router.include_router(
     asset_type.router, prefix="/asset-types", tags=["asset-types"]
 )
 api_router.include_router(currency.router, prefix="/currencies", tags=["currencies"])
+api_router.include_router(
+    exchange_rates.router, prefix="/exchange-rates", tags=["exchange-rates"]
+)
 api_router.include_router(
     portfolio_transactions.router,
     prefix="/portfolio-transactions",
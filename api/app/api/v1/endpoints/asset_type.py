@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
@@ -11,10 +11,19 @@ router = APIRouter()
 
 @router.get("/", response_model=schemas.AssetTypeList)
 def read_asset_types(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
 ) -> Any:
-    result = crud.asset_type.get_multi(db=db, skip=skip, limit=limit)
-    return {"result": result[0], "total": result[1]}
+    result = crud.asset_type.get_multi(
+        db=db, skip=skip, limit=limit, cursor=cursor, total_mode=total_mode
+    )
+    return {
+        "result": result[0],
+        "total": result[1],
+        "next_cursor": result[2],
+        "has_more": result[3],
+    }
@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
@@ -11,13 +11,22 @@ router = APIRouter()
 
 @router.get("/", response_model=schemas.AssetList)
 def read_assets(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
 ) -> Any:
-    assets = crud.asset.get_multi(db=db, skip=skip, limit=limit)
-    return {"result": assets[0], "total": assets[1]}
+    assets = crud.asset.get_multi(
+        db=db, skip=skip, limit=limit, cursor=cursor, total_mode=total_mode
+    )
+    return {
+        "result": assets[0],
+        "total": assets[1],
+        "next_cursor": assets[2],
+        "has_more": assets[3],
+    }
 
 
 @router.post("/", response_model=schemas.asset.Asset)
@@ -42,9 +51,9 @@ def create_asset(
 @router.get("/{asset_id}", response_model=schemas.asset.Asset)
 def read_asset(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     asset_id: int,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
 ) -> Any:
     """
     Get asset by ID.
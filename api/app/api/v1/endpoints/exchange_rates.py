@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.api import deps
+from app.services.exports import streaming as exports
+from app.services.retention.exchange_rates import get_rate_history
+
+router = APIRouter()
+
+
+@router.get("/", response_model=schemas.ExchangeRateList)
+def read_exchange_rates(
+    db: Session = Depends(deps.get_read_db),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    result = crud.exchange_rate.get_multi(
+        db=db, skip=skip, limit=limit, cursor=cursor, total_mode=total_mode
+    )
+    return {
+        "result": result[0],
+        "total": result[1],
+        "next_cursor": result[2],
+        "has_more": result[3],
+    }
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_exchange_rates(
+    *,
+    db: Session = Depends(deps.get_db),
+    format: exports.ExportFormat = exports.ExportFormat.CSV,
+    source_currency_id: Optional[int] = None,
+    target_currency_id: Optional[int] = None,
+    start: Optional[datetime] = Query(default=None, alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    current_user: models.user.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Stream exchange rates, oldest first, as CSV, JSON lines or Arrow IPC.
+    """
+    start = start.replace(tzinfo=start.tzinfo or timezone.utc) if start else None
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+
+    query = exports.exchange_rates(
+        db,
+        source_currency_id=source_currency_id,
+        target_currency_id=target_currency_id,
+        start=start,
+        end=end,
+    )
+    try:
+        content = exports.stream_rows(query, format=format)
+    except exports.ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    return StreamingResponse(
+        content,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": "attachment; filename="
+            f"exchange_rates.{exports.FILE_EXTENSIONS[format]}"
+        },
+    )
+
+
+@router.get("/history", response_model=schemas.ExchangeRateHistory)
+def read_exchange_rate_history(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    source_currency_id: int,
+    target_currency_id: int,
+    start: datetime = Query(alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    timeframe: models.TimeFrame = models.TimeFrame.ONE_HOUR,
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    """
+    OHLC history of a currency pair, served from the coarsest rollup tier
+    that satisfies the requested timeframe.
+    """
+    start = start.replace(tzinfo=start.tzinfo or timezone.utc)
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+    end = end or datetime.now(timezone.utc)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'",
+        )
+
+    df = get_rate_history(
+        db,
+        source_currency_id=source_currency_id,
+        target_currency_id=target_currency_id,
+        start=start,
+        end=end,
+        timeframe=timeframe,
+    )
+    return {
+        "source_currency_id": source_currency_id,
+        "target_currency_id": target_currency_id,
+        "timeframe": timeframe,
+        "result": df.to_dict("records"),
+    }
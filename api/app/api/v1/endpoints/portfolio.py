@@ -1,49 +1,180 @@
-from typing import Any, List
+from datetime import datetime, timezone
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.services.currency_conversion.converter import currency_converter
+from app.services.exports import streaming as exports
+from app.services.valuation import (
+    bulk,
+    cost_basis,
+    projection,
+    summary as summary_service,
+)
+from app.services.valuation.consolidated import compute_consolidated
+from app.services.valuation.engine import (
+    HoldingColumns,
+    load_holdings,
+    value_holdings,
+)
+from app.services.valuation.risk import compute_risk
+from app.services.valuation.snapshots import get_portfolio_history
 
 router = APIRouter()
 
 
 @router.get("/", response_model=schemas.PortfolioList)
-def read_portfolios(
-    db: Session = Depends(deps.get_db),
+async def read_portfolios(
+    db: AsyncSession = Depends(deps.get_async_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_active_reader_async),
 ) -> Any:
     if crud.user.is_superuser(current_user):
-        result = crud.portfolio.get_multi(db, skip=skip, limit=limit)
+        result = await crud.portfolio.get_multi_async(
+            db, skip=skip, limit=limit, cursor=cursor, total_mode=total_mode
+        )
     else:
-        result = crud.portfolio.get_multi(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
+        result = await crud.portfolio.get_multi_async(
+            db,
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            total_mode=total_mode,
         )
-    return {"result": result[0], "total": result[1]}
+    return {
+        "result": result[0],
+        "total": result[1],
+        "next_cursor": result[2],
+        "has_more": result[3],
+    }
 
 
 @router.post("/", response_model=schemas.PortfolioInDBBase)
-def create_portfolio(
+async def create_portfolio(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     obj_in: schemas.Portfolio,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    current_user: models.user.User = Depends(deps.get_current_active_user_async),
 ) -> Any:
-    result = crud.portfolio.create(db=db, obj_in=obj_in, user_id=current_user.id)
+    result = await crud.portfolio.create_async(
+        db, obj_in=obj_in, user_id=current_user.id
+    )
     return result
 
 
-@router.get("/{portfolio_id}", response_model=schemas.Portfolio)
-def read_portfolio(
+# Declared before /{portfolio_id} so the path is not parsed as an id
+@router.get("/consolidated", response_model=schemas.ConsolidatedPortfolio)
+def read_consolidated_portfolio(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    current_user: models.user.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    """
+    All holdings of the current user across their portfolios, merged per
+    asset and converted to their preferred currency.
+    """
+    return compute_consolidated(db, user=current_user)
+
+
+@router.post(
+    "/revaluations",
+    response_model=schemas.PortfolioRevaluationJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def start_portfolio_revaluation(
+    *,
+    workers: Optional[int] = Query(None, ge=1),
+    chunk_size: Optional[int] = Query(None, ge=1),
+    current_user: models.user.User = Depends(deps.get_current_admin_user),
+) -> Any:
+    """
+    Revalue every portfolio in the background across a process pool.
+    """
+    try:
+        return bulk.start_revaluation(workers=workers, chunk_size=chunk_size)
+    except bulk.RevaluationRunning as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/revaluations/{job_id}", response_model=schemas.PortfolioRevaluationJob)
+def read_portfolio_revaluation(
+    *,
+    job_id: str,
+    current_user: models.user.User = Depends(deps.get_current_admin_user),
+) -> Any:
+    job = bulk.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Revaluation not found",
+        )
+    return job
+
+
+@router.post("/holdings/rebuild", response_model=schemas.PortfolioHoldingsRebuild)
+def rebuild_portfolio_holdings(
     *,
     db: Session = Depends(deps.get_db),
-    portfolio_id: int,
+    portfolio_id: Optional[List[int]] = Query(None),
+    current_user: models.user.User = Depends(deps.get_current_admin_user),
+) -> Any:
+    """
+    Rebuild the holdings of the given portfolios, or of all of them, from
+    the transaction log.
+    """
+    return projection.rebuild_holdings(db, portfolio_ids=portfolio_id)
+
+
+@router.get("/holdings/export", response_class=StreamingResponse)
+def export_portfolio_holdings(
+    *,
+    db: Session = Depends(deps.get_db),
+    format: exports.ExportFormat = exports.ExportFormat.CSV,
+    portfolio_id: Optional[List[int]] = Query(None),
     current_user: models.user.User = Depends(deps.get_current_active_user),
 ) -> Any:
-    result = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+    """
+    Stream the holdings of the given portfolios, or of all the user's ones,
+    as CSV, JSON lines or Arrow IPC.
+    """
+    query = exports.holdings(
+        db,
+        user_id=None if crud.user.is_superuser(current_user) else current_user.id,
+        portfolio_ids=portfolio_id,
+    )
+    try:
+        content = exports.stream_rows(query, format=format)
+    except exports.ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    return StreamingResponse(
+        content,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": "attachment; filename="
+            f"holdings.{exports.FILE_EXTENSIONS[format]}"
+        },
+    )
+
+
+@router.get("/{portfolio_id}", response_model=schemas.Portfolio)
+async def read_portfolio(
+    *,
+    db: AsyncSession = Depends(deps.get_async_read_db),
+    portfolio_id: int,
+    current_user: models.user.User = Depends(deps.get_current_active_reader_async),
+) -> Any:
+    result = await crud.portfolio.get_by_id_async(db, id=portfolio_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -77,7 +208,11 @@ def update_portfolio(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions",
         )
-    portfolio = crud.portfolio.update(db=db, db_obj=portfolio, obj_in=obj_in)
+    method = result.cost_basis_method
+    with crud.unit_of_work(db):
+        portfolio = crud.portfolio.update(db=db, db_obj=result, obj_in=obj_in)
+        if portfolio.cost_basis_method != method:
+            projection.rebuild_holdings(db, portfolio_ids=[portfolio.id])
     return portfolio
 
 
@@ -103,6 +238,152 @@ def delete_portfolio(
     return result
 
 
+@router.get("/{portfolio_id}/summary", response_model=schemas.PortfolioSummary)
+def read_portfolio_summary(
+    *,
+    db: Session = Depends(deps.get_db),
+    portfolio_id: int,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    # Cached summaries carry their owner, so a hit needs no query
+    result = summary_service.get_cached_summary(portfolio_id)
+    if result is None:
+        portfolio = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+        if not portfolio:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Portfolio not found",
+            )
+        if not crud.user.is_superuser(current_user) and (
+            portfolio.user_id != current_user.id
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+            )
+        return summary_service.build_summary(db, portfolio=portfolio)
+
+    if not crud.user.is_superuser(current_user) and (
+        result["user_id"] != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return result
+
+
+@router.get("/{portfolio_id}/history", response_model=schemas.PortfolioHistory)
+def read_portfolio_history(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    portfolio_id: int,
+    start: datetime = Query(alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    resolution: models.TimeFrame = models.TimeFrame.ONE_DAY,
+    current_user: models.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    """
+    Value of the portfolio over time, served from the daily snapshots where
+    possible and otherwise rebuilt from its transactions and the exchange
+    rate history.
+    """
+    portfolio = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found",
+        )
+    if not crud.user.is_superuser(current_user) and (
+        portfolio.user_id != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    start = start.replace(tzinfo=start.tzinfo or timezone.utc)
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+    end = end or datetime.now(timezone.utc)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'",
+        )
+
+    df = get_portfolio_history(
+        db, portfolio=portfolio, start=start, end=end, timeframe=resolution
+    )
+    df["value"] = df["value"].astype(object).where(df["value"].notna(), None)
+    return {
+        "portfolio_id": portfolio.id,
+        "base_currency_id": portfolio.base_currency_id,
+        "timeframe": resolution,
+        "result": df.to_dict("records"),
+    }
+
+
+@router.get("/{portfolio_id}/risk", response_model=schemas.PortfolioRisk)
+def read_portfolio_risk(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    portfolio_id: int,
+    resolution: models.TimeFrame = models.TimeFrame.ONE_DAY,
+    window: int = Query(90, ge=2, le=5000),
+    confidence: float = Query(0.95, gt=0, lt=1),
+    current_user: models.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    """
+    Volatility, correlation, historical VaR/CVaR and max drawdown of the
+    current holdings over the last `window` candles of their market data.
+    """
+    portfolio = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found",
+        )
+    if not crud.user.is_superuser(current_user) and (
+        portfolio.user_id != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    return compute_risk(
+        db,
+        portfolio=portfolio,
+        timeframe=resolution,
+        window=window,
+        confidence=confidence,
+    )
+
+
+@router.get("/{portfolio_id}/pnl", response_model=schemas.PortfolioPnL)
+def read_portfolio_pnl(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    portfolio_id: int,
+    current_user: models.User = Depends(deps.get_current_active_reader),
+) -> Any:
+    portfolio = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found",
+        )
+    if not crud.user.is_superuser(current_user) and (
+        portfolio.user_id != current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    return cost_basis.compute_pnl(db, portfolio=portfolio)
+
+
 @router.post("/{portfolio_id}/holdings", response_model=schemas.PortfolioHolding)
 def create_portfolio_holding(
     *,
@@ -132,42 +413,77 @@ def create_portfolio_holding(
             detail="Asset not found",
         )
 
-    # TODO: set price_each in transaction
+    # Quantities are in units of the asset's currency, so one unit costs 1
+    # in that currency and the cost basis is the value when it was added
     transaction_in = schemas.PortfolioTransactionCreate(
         asset_id=asset.id,
         quantity=obj_in.quantity,
-        price_each=0,
+        price_each=1,
         portfolio_id=portfolio.id,
         price_currency_id=asset.currency_id,
         transaction_type="buy",
     )
-    crud.portfolio_transaction.create(db, obj_in=transaction_in)
+    with crud.unit_of_work(db):
+        transaction = crud.portfolio_transaction.create(db, obj_in=transaction_in)
+        result = cost_basis.record_transaction(
+            db, portfolio=portfolio, transaction=transaction
+        )
+    return result
 
-    same_asset_holding = crud.portfolio.get_holding_by_asset_id(
-        db, portfolio_id=portfolio.id, asset_id=asset.id
-    )
-    if same_asset_holding:
-        result = crud.portfolio.update_holding(
-            db,
-            db_obj=same_asset_holding,
-            obj_in={"quantity": same_asset_holding.quantity + obj_in.quantity},
+
+def _value_holdings_page(
+    db: Session,
+    *,
+    portfolio: models.Portfolio,
+    rows: List[models.PortfolioHolding],
+    whole_portfolio: bool,
+) -> None:
+    # Value all holdings at once against the converter's rate vector. A
+    # page is weighted against the whole portfolio, so every holding is
+    # valued when only some are returned
+    currency_converter.ensure_fresh(db)
+    if whole_portfolio:
+        columns = HoldingColumns.from_holdings(
+            rows, base_currency_id=portfolio.base_currency_id
         )
     else:
-        result = crud.portfolio.create_holding(
-            db, obj_in=obj_in, portfolio_id=portfolio_id
-        )
-
-    return result
+        columns = load_holdings(db, portfolio_ids=[portfolio.id])
+    valuation = value_holdings(columns, converter=currency_converter)
+    # Holdings are ordered by id. One created or deleted since the page was
+    # read is not in both, and is left unvalued rather than given another's
+    ids = np.array([row.id for row in rows], dtype=np.int64)
+    index = np.minimum(np.searchsorted(columns.holding_id, ids), len(columns) - 1)
+    found = (
+        columns.holding_id[index] == ids if len(columns) else np.zeros(len(ids), bool)
+    )
+    for row, i, ok in zip(rows, index, found):
+        if not ok:
+            continue
+        value, weight = valuation.values[i], valuation.weights[i]
+        if not np.isnan(value):
+            row.total_value = float(value)
+            row.weight = float(weight) if not np.isnan(weight) else None
+            if row.cost_basis is not None:
+                row.unrealized_pnl = row.total_value - row.cost_basis
 
 
 @router.get("/{portfolio_id}/holdings", response_model=List[schemas.PortfolioHolding])
-def get_portfolio_holdings(
+async def get_portfolio_holdings(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+    response: Response,
     portfolio_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    skip: int = 0,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(deps.get_current_active_reader_async),
 ) -> Any:
-    portfolio = crud.portfolio.get_by_id(db=db, id=portfolio_id)
+    """
+    Holdings of a portfolio, all of them (after `cursor`, if given) unless
+    `limit` is given. The cursor of the next page is returned in the
+    `X-Next-Cursor` header.
+    """
+    portfolio = await crud.portfolio.get_by_id_async(db, id=portfolio_id)
     if not portfolio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -181,16 +497,19 @@ def get_portfolio_holdings(
             detail="Not enough permissions",
         )
 
-    result = crud.portfolio.get_multi_holdings(db, portfolio_id=portfolio_id)
-    for row in result:
-        rate = crud.exchange_rate.get_latest_rate(
-            db,
-            source_currency_id=row.asset.currency_id,
-            target_currency_id=portfolio.base_currency_id,
-        )
-        if rate:
-            row.total_value = row.quantity * (rate.rate or 0)
+    page = await crud.portfolio.get_multi_holdings_async(
+        db, portfolio_id=portfolio_id, skip=skip, limit=limit, cursor=cursor
+    )
+    result = page.result
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
 
+    await db.run_sync(
+        _value_holdings_page,
+        portfolio=portfolio,
+        rows=result,
+        whole_portfolio=limit is None and not skip and cursor is None,
+    )
     return result
 
 
@@ -204,6 +523,11 @@ def delete_portfolio_holding(
     portfolio_id: int,
     current_user: models.user.User = Depends(deps.get_current_active_user),
 ):
+    """
+    Sell the whole holding. The holding is kept at quantity zero with its
+    realized PnL, as after any other sale, so that a rebuild from the
+    transaction log yields the same row.
+    """
     portfolio = crud.portfolio.get_by_id(db, portfolio_id)
     if not portfolio:
         raise HTTPException(
@@ -219,7 +543,7 @@ def delete_portfolio_holding(
         )
 
     holding = crud.portfolio.get_holding_by_id(db, id=id)
-    if not holding:
+    if not holding or holding.portfolio_id != portfolio.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Portfolio holding not found",
@@ -227,16 +551,18 @@ def delete_portfolio_holding(
 
     asset = crud.asset.get_by_id(db, id=holding.asset_id)
 
-    # TODO: set price_each in transaction
+    # Sold at its current value, see create_portfolio_holding
     transaction_in = schemas.PortfolioTransactionCreate(
         asset_id=holding.asset_id,
         quantity=holding.quantity,
-        price_each=0,
+        price_each=1,
         portfolio_id=portfolio.id,
         price_currency_id=asset.currency_id,
-        transaction_type="sell",
+        transaction_type="sale",
     )
-    crud.portfolio_transaction.create(db, obj_in=transaction_in)
-
-    result = crud.portfolio.delete_holding(db, db_obj=holding)
-    return result
+    with crud.unit_of_work(db):
+        transaction = crud.portfolio_transaction.create(db, obj_in=transaction_in)
+        holding = cost_basis.record_transaction(
+            db, portfolio=portfolio, transaction=transaction
+        )
+    return holding
@@ -1,37 +1,66 @@
-from typing import Any, List
+from datetime import datetime, timezone
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.services.exports import streaming as exports
+from app.services.imports.transactions import ImportFormat, import_transactions
+from app.services.valuation import cost_basis
 
 router = APIRouter()
 
 
 @router.get("/", response_model=schemas.portfolio_transaction.PortfolioTransactionList)
-def read_portfolio_transactions(
-    db: Session = Depends(deps.get_db),
+async def read_portfolio_transactions(
+    db: AsyncSession = Depends(deps.get_async_read_db),
+    portfolio_id: Optional[int] = None,
+    asset_id: Optional[int] = None,
+    start: Optional[datetime] = Query(default=None, alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_active_reader_async),
 ) -> Any:
-    if crud.user.is_superuser(current_user):
-        transactions = crud.portfolio_transaction.get_multi(db, skip=skip, limit=limit)
-    else:
-        transactions = crud.portfolio_transaction.get_multi(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
-        )
-    return {"result": transactions[0], "total": transactions[1]}
+    """
+    Transactions newest first, of the current user's portfolios unless the
+    user is a superuser. `from` is inclusive and `to` exclusive.
+    """
+    start = start.replace(tzinfo=start.tzinfo or timezone.utc) if start else None
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+
+    transactions = await crud.portfolio_transaction.get_multi_async(
+        db,
+        user_id=None if crud.user.is_superuser(current_user) else current_user.id,
+        portfolio_id=portfolio_id,
+        asset_id=asset_id,
+        start=start,
+        end=end,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        total_mode=total_mode,
+    )
+    return {
+        "result": transactions[0],
+        "total": transactions[1],
+        "next_cursor": transactions[2],
+        "has_more": transactions[3],
+    }
 
 
-@router.post("/", response_model=schemas.portfolio_transaction.PortfolioTransaction)
-def create_portfolio_transaction(
+def _create_portfolio_transaction(
+    db: Session,
     *,
-    db: Session = Depends(deps.get_db),
     transaction_in: schemas.PortfolioTransactionCreate,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
-) -> Any:
+    current_user: models.user.User,
+) -> models.PortfolioTransaction:
     asset = crud.asset.get_by_id(db=db, id=transaction_in.asset_id)
     if not asset:
         raise HTTPException(
@@ -49,67 +78,146 @@ def create_portfolio_transaction(
             detail="Not enough permissions",
         )
 
-    holding = crud.portfolio.get_holding_by_asset_id(
-        db, portfolio_id=portfolio.id, asset_id=asset.id
-    )
+    with crud.unit_of_work(db):
+        transaction = crud.portfolio_transaction.create(
+            db=db,
+            obj_in=transaction_in,
+        )
+        cost_basis.record_transaction(db, portfolio=portfolio, transaction=transaction)
+
+    # Reloaded with the relations the response serializes
+    return crud.portfolio_transaction.get_by_id(db, id=transaction.id)
+
 
-    if holding:
-        if transaction_in.transaction_type == models.TransactionType.BUY:
-            crud.portfolio.update_holding(
-                db,
-                db_obj=holding,
-                obj_in={"quantity": holding.quantity + transaction_in.quantity},
-            )
-        elif transaction_in.transaction_type == models.TransactionType.SALE:
-            crud.portfolio.update_holding(
-                db,
-                db_obj=holding,
-                obj_in={"quantity": holding.quantity - transaction_in.quantity},
-            )
-    else:
-        if transaction_in.transaction_type == models.TransactionType.BUY:
-            obj_in = schemas.PortfolioHoldingCreate(
-                asset_id=asset.id,
-                quantity=transaction_in.quantity,
-                avg_purchase_price=transaction_in.price_each,
-            )
-            crud.portfolio.create_holding(db, portfolio_id=portfolio.id, obj_in=obj_in)
-
-    transaction = crud.portfolio_transaction.create(
-        db=db,
-        obj_in=transaction_in,
+@router.post("/", response_model=schemas.portfolio_transaction.PortfolioTransaction)
+async def create_portfolio_transaction(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    transaction_in: schemas.PortfolioTransactionCreate,
+    current_user: models.user.User = Depends(deps.get_current_active_user_async),
+) -> Any:
+    return await db.run_sync(
+        _create_portfolio_transaction,
+        transaction_in=transaction_in,
+        current_user=current_user,
     )
 
-    return transaction
+
+@router.post("/import", response_model=schemas.PortfolioTransactionImport)
+def import_portfolio_transactions(
+    *,
+    db: Session = Depends(deps.get_db),
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = None,
+    portfolio_id: Optional[int] = None,
+    current_user: models.user.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Bulk import transactions from a CSV or JSON lines file, read as a stream
+    and inserted in chunks. Valid rows are imported even if others fail;
+    the response lists the errors of every rejected row. A file that is not
+    UTF-8 is rejected before any row is imported.
+
+    The format defaults to JSON lines for `.jsonl`/`.ndjson` files and to
+    CSV otherwise. `portfolio_id` is used for rows that do not have one.
+    """
+    if format is None:
+        name = (file.filename or "").lower()
+        format = (
+            ImportFormat.JSONL
+            if name.endswith((".jsonl", ".ndjson"))
+            else ImportFormat.CSV
+        )
+
+    try:
+        return import_transactions(
+            db,
+            user=current_user,
+            stream=file.file,
+            format=format,
+            portfolio_id=portfolio_id,
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be UTF-8 encoded",
+        )
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_portfolio_transactions(
+    db: Session = Depends(deps.get_db),
+    format: exports.ExportFormat = exports.ExportFormat.CSV,
+    portfolio_id: Optional[int] = None,
+    asset_id: Optional[int] = None,
+    start: Optional[datetime] = Query(default=None, alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    current_user: models.user.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Stream all transactions matching the list filters as CSV, JSON lines or
+    Arrow IPC, oldest first.
+    """
+    start = start.replace(tzinfo=start.tzinfo or timezone.utc) if start else None
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+
+    query = exports.transactions(
+        db,
+        user_id=None if crud.user.is_superuser(current_user) else current_user.id,
+        portfolio_id=portfolio_id,
+        asset_id=asset_id,
+        start=start,
+        end=end,
+    )
+    try:
+        content = exports.stream_rows(query, format=format)
+    except exports.ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    return StreamingResponse(
+        content,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": "attachment; filename="
+            f"transactions.{exports.FILE_EXTENSIONS[format]}"
+        },
+    )
 
 
 @router.get(
     "/{transaction_id}",
     response_model=schemas.portfolio_transaction.PortfolioTransaction,
 )
-def read_portfolio_transaction(
+async def read_portfolio_transaction(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_read_db),
     transaction_id: int,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
+    current_user: models.user.User = Depends(deps.get_current_active_reader_async),
 ) -> Any:
-    transaction = crud.portfolio_transaction.get(db=db, id=transaction_id)
+    transaction = await crud.portfolio_transaction.get_by_id_async(
+        db, id=transaction_id
+    )
     if not transaction:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Transaction not found",
         )
 
+    portfolio = await crud.portfolio.get_by_id_async(db, id=transaction.portfolio_id)
+    if portfolio.user_id != current_user.id and not crud.user.is_superuser(
+        current_user
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
     return transaction
 
 
-@router.delete("/{transaction_id}", response_model=schemas.SimpleMessageResponse)
-def delete_portfolio_transaction(
-    *,
-    db: Session = Depends(deps.get_db),
-    transaction_id: int,
-    current_user: models.user.User = Depends(deps.get_current_active_user),
-) -> Any:
+def _delete_portfolio_transaction(
+    db: Session, *, transaction_id: int, current_user: models.user.User
+) -> None:
     transaction = crud.portfolio_transaction.get_by_id(db=db, id=transaction_id)
     if not transaction:
         raise HTTPException(
@@ -126,16 +234,19 @@ def delete_portfolio_transaction(
             detail="Not enough permissions",
         )
 
-    holding = crud.portfolio.get_holding_by_asset_id(
-        db, portfolio_id=transaction.portfolio_id, asset_id=transaction.asset_id
-    )
+    cost_basis.remove_transaction(db, portfolio=portfolio, transaction=transaction)
 
-    if holding:
-        crud.portfolio.update_holding(
-            db,
-            db_obj=holding,
-            obj_in={"quantity": holding.quantity - transaction.quantity},
-        )
 
-    transaction = crud.portfolio_transaction.delete(db=db, db_obj=transaction)
+@router.delete("/{transaction_id}", response_model=schemas.SimpleMessageResponse)
+async def delete_portfolio_transaction(
+    *,
+    db: AsyncSession = Depends(deps.get_async_db),
+    transaction_id: int,
+    current_user: models.user.User = Depends(deps.get_current_active_user_async),
+) -> Any:
+    await db.run_sync(
+        _delete_portfolio_transaction,
+        transaction_id=transaction_id,
+        current_user=current_user,
+    )
     return {"details": "ok"}
@@ -1,14 +1,16 @@
 """Users endpoints."""
 
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core import security
 from app.core.config import settings
 
 router = APIRouter()
@@ -16,20 +18,29 @@ router = APIRouter()
 
 @router.get("/", response_model=schemas.user.UserListResponse)
 def read_users(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.user.User = Depends(deps.get_current_admin_user),
+    cursor: Optional[str] = None,
+    total_mode: crud.TotalMode = Query(crud.TotalMode.EXACT, alias="total"),
+    current_user: models.user.User = Depends(deps.get_current_admin_reader),
 ) -> Any:
     """
     Retrieve users.
     """
-    users, total = crud.user.get_multi(db, skip=skip, limit=limit)
-    return {"result": users, "total": total}
+    users, total, next_cursor, has_more = crud.user.get_multi(
+        db, skip=skip, limit=limit, cursor=cursor, total_mode=total_mode
+    )
+    return {
+        "result": users,
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
 
 
 @router.post("/", response_model=schemas.user.User)
-def create_user(
+async def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: schemas.user.UserCreate,
@@ -38,13 +49,16 @@ def create_user(
     """
     Create new user.
     """
-    user = crud.user.get_by_email(db, email=user_in.email)
+    user = await run_in_threadpool(crud.user.get_by_email, db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The user with this email already exists in the system.",
         )
-    user = crud.user.create(db, obj_in=user_in)
+    hashed_password = await security.get_password_hash_async(user_in.password)
+    user = await run_in_threadpool(
+        crud.user.create, db, obj_in=user_in, hashed_password=hashed_password
+    )
     return user
 
 
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core import events, metrics
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.token import TokenPayload
+
+
+class TokenCache:
+    """
+    Claims of verified tokens, least recently used dropped first. A token is
+    served from the cache until it expires.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, TokenPayload]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[TokenPayload]:
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload and payload.exp < time.time():
+                del self._entries[token]
+                payload = None
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return payload
+
+    def set(self, token: str, payload: TokenPayload) -> None:
+        with self._lock:
+            self._entries[token] = payload
+            self._entries.move_to_end(token)
+            while len(self._entries) > settings.AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class UserCache:
+    """
+    Column values of recently authenticated users, least recently used
+    dropped first. An entry is dropped when its user changes and expires
+    after `AUTH_USER_CACHE_SECONDS`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Bumped on every invalidation of a user, so a user loaded while it
+        # was changed is not stored
+        self._generation: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: int) -> Optional[User]:
+        """
+        The cached user attached to `db` as if it had been loaded, without
+        a query.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[0] > settings.AUTH_USER_CACHE_SECONDS:
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            values = entry[1]
+
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def token(self, user_id: int) -> int:
+        with self._lock:
+            return self._generation.get(user_id, 0)
+
+    def set(self, user: User, token: int) -> bool:
+        """
+        Store a user unless it was invalidated since `token` was taken.
+        """
+        values = {
+            attribute.key: getattr(user, attribute.key)
+            for attribute in inspect(User).column_attrs
+        }
+        with self._lock:
+            if token != self._generation.get(user.id, 0):
+                return False
+            self._entries[user.id] = (time.monotonic(), values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > settings.AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation[user_id] = self._generation.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for user_id in self._entries:
+                self._generation[user_id] = self._generation.get(user_id, 0) + 1
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+user_cache = UserCache()
+
+
+def _on_user_changed(*, user_id: int) -> None:
+    user_cache.invalidate(user_id)
+
+
+def _on_relay_resumed() -> None:
+    user_cache.clear()
+
+
+events.subscribe(events.USER_CHANGED, _on_user_changed, remote=True)
+events.subscribe(events.RELAY_RESUMED, _on_relay_resumed)
+
+metrics.register(
+    "fibook_auth_cache_hits_total",
+    kind="counter",
+    description="Authentication lookups served from the cache",
+    collect=lambda: {
+        (("cache", "token"),): token_cache.hits,
+        (("cache", "user"),): user_cache.hits,
+    },
+)
+metrics.register(
+    "fibook_auth_cache_misses_total",
+    kind="counter",
+    description="Authentication lookups that missed the cache",
+    collect=lambda: {
+        (("cache", "token"),): token_cache.misses,
+        (("cache", "user"),): user_cache.misses,
+    },
+)
@@ -13,16 +13,95 @@ class Settings(BaseSettings):
 
     # Database
     SQLALCHEMY_DATABASE_URI: str = os.getenv("DATABASE_URL")
+    # URL of the same database for the async endpoints, by default the one
+    # above with its driver swapped for asyncpg or aiosqlite
+    ASYNC_DATABASE_URI: Optional[str] = None
+
+    # Connection pool of each engine. Connections are tested before use with
+    # DB_POOL_PRE_PING and replaced once older than DB_POOL_RECYCLE_SECONDS
+    # (-1 keeps them)
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Set when connecting through PgBouncer in transaction pooling mode, which
+    # cannot keep prepared statements; turns off prepared statement caching
+    DB_PGBOUNCER: bool = False
+
+    # Optional read replica for the read-only endpoints. A client that wrote
+    # in the last READ_REPLICA_MAX_LAG_SECONDS reads from the primary instead,
+    # so it sees its own writes; keep it above the replica's lag. The time of
+    # the last write is returned in a cookie and an X-Last-Write header, so
+    # every worker routes the client's next reads; their clocks must agree
+    READ_REPLICA_DATABASE_URI: Optional[str] = None
+    READ_REPLICA_MAX_LAG_SECONDS: float = 5
 
     # JWT Token settings
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 8 * 60 * 60
 
+    # Verified token claims and users are cached per process so that an
+    # authenticated request needs no query. Claims are kept until the token
+    # expires. A cached user is dropped when any process commits a change to
+    # it (relayed over Postgres NOTIFY); the user TTL only matters on other
+    # databases or for changes missed while the relay reconnects
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_SECONDS: int = 30
+
+    # bcrypt cost of new password hashes; older hashes are upgraded on login.
+    # Hashing runs on a pool of this many threads
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+
     # First superuser
     FIRST_SUPERUSER_EMAIL: str = "admin@example.com"
     FIRST_SUPERUSER_PASSWORD: str = "admin"
 
+    # Background jobs (rollups, partitions, snapshots, holdings catch-up).
+    # Every process that enables them runs its own scheduler, so enable them
+    # in exactly one process, not in every API worker. Fetching crypto prices
+    # from Nobitex makes external calls and is enabled separately
+    BACKGROUND_TASKS_ENABLED: bool = False
+    CRYPTO_PRICE_FETCH_ENABLED: bool = False
+
+    # Exchange rate retention: raw rates are rolled up into hourly and daily
+    # OHLC buckets, then pruned once they are older than these horizons
+    EXCHANGE_RATE_ROLLUP_INTERVAL_MINUTES: int = 60
+    EXCHANGE_RATE_RAW_RETENTION_DAYS: int = 30
+    EXCHANGE_RATE_HOURLY_RETENTION_DAYS: int = 365
+
+    # Monthly range partitions of market_data and exchange_rates (Postgres
+    # only). Old partitions are detached and dropped, not deleted row by row
+    PARTITION_MONTHS_AHEAD: int = 3
+    MARKET_DATA_RETENTION_DAYS: Optional[int] = None
+
+    # Direct connection the event relay listens on when the database URI
+    # goes through a transaction pooler, which cannot hold a LISTEN
+    EVENT_RELAY_DATABASE_URI: Optional[str] = None
+
+    # In-memory currency conversion matrix, refreshed from new exchange rates
+    CURRENCY_CONVERSION_REFRESH_SECONDS: int = 60
+
+    # Portfolio summaries are cached per process until any process commits a
+    # change to their portfolio or to a currency pair they convert through.
+    # Other processes' changes arrive over Postgres NOTIFY; without it (e.g.
+    # on SQLite) they are only picked up once the summary expires
+    PORTFOLIO_SUMMARY_CACHE_SECONDS: int = 300
+
+    # Daily portfolio snapshots, backfilled on startup at most this far back
+    PORTFOLIO_SNAPSHOT_BACKFILL_DAYS: int = 365
+
+    # Return covariances of asset sets for the risk analytics, recomputed at
+    # the latest when a bucket closes
+    RISK_CACHE_SECONDS: int = 300
+
+    # Bulk revaluation of all portfolios: worker processes (number of CPUs by
+    # default) and portfolios valued per task
+    PORTFOLIO_REVALUATION_WORKERS: Optional[int] = None
+    PORTFOLIO_REVALUATION_CHUNK_SIZE: int = 2000
+
     BACKEND_CORS_ORIGINS: List[str] = [
         "http://localhost:5173",
     ]
@@ -1,19 +1,81 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from alembic.config import Config
 from alembic import command
 
+from app.core import pool
 from app.core.config import settings
 
+# Async driver of each database the app runs on
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """
+    `url` with its driver replaced by the async driver of its database.
+
+    Raises:
+        ValueError: If there is no async driver for the database
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}")
+    return parsed.set(
+        drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"
+    ).render_as_string(hide_password=False)
+
+
 SQLALCHEMY_DATABASE_URL = settings.SQLALCHEMY_DATABASE_URI
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    **pool.engine_options(SQLALCHEMY_DATABASE_URL, name="primary"),
+)
+pool.instrument(engine, name="primary")
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URI or async_database_url(
+    SQLALCHEMY_DATABASE_URL
+)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **pool.engine_options(ASYNC_DATABASE_URL, name="async")
+)
+pool.instrument(async_engine.sync_engine, name="async")
+
+# The primary serves the reads too unless a replica is configured
+read_engine, async_read_engine = engine, async_engine
+if settings.READ_REPLICA_DATABASE_URI:
+    read_engine = create_engine(
+        settings.READ_REPLICA_DATABASE_URI,
+        **pool.engine_options(settings.READ_REPLICA_DATABASE_URI, name="replica"),
+    )
+    pool.instrument(read_engine, name="replica")
+    ASYNC_READ_DATABASE_URL = async_database_url(settings.READ_REPLICA_DATABASE_URI)
+    async_read_engine = create_async_engine(
+        ASYNC_READ_DATABASE_URL,
+        **pool.engine_options(ASYNC_READ_DATABASE_URL, name="async_replica"),
+    )
+    pool.instrument(async_read_engine.sync_engine, name="async_replica")
+
+# Rows are not expired on commit: async endpoints serialize them after the
+# session's work is done, where an expired attribute cannot be loaded
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Sessions of the read-only endpoints, see `app.api.deps.get_read_db`
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, autoflush=False, expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
@@ -27,6 +89,12 @@ def get_db() -> Generator:
         db.close()
 
 
+# Dependency to get an async DB session, for `async def` endpoints
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def run_migrations():
     alembic_cfg = Config("alembic.ini")
     command.upgrade(alembic_cfg, "head")
@@ -0,0 +1,303 @@
+import json
+import select
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, func, inspect
+from sqlalchemy import select as sql_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.models.exchange_rate import ExchangeRate
+from app.models.portfolio import Portfolio
+from app.models.portfolio_holdings import PortfolioHolding
+from app.models.portfolio_transaction import PortfolioTransaction
+from app.models.user import User
+from app.services.logger import logger
+
+# Published with `portfolio_id` after a commit that touched the portfolio,
+# its holdings or its transactions, and `since`: the earliest transaction
+# date among the transactions it created, changed or deleted, None if it
+# touched none with a known date
+PORTFOLIO_CHANGED = "portfolio_changed"
+# Published with `source_currency_id`, `target_currency_id`, `rate` and
+# `effective_date` after a commit that created an exchange rate
+EXCHANGE_RATE_CREATED = "exchange_rate_created"
+# Published with `user_id` after a commit that updated or deleted a user
+USER_CHANGED = "user_changed"
+# Published without payload whenever the relay (re)starts listening, as
+# events of other processes may have been missed until then
+RELAY_RESUMED = "relay_resumed"
+
+_PENDING_KEY = "pending_events"
+_UNRELAYED_KEY = "unrelayed_events"
+
+# Postgres channel the events are relayed to other processes on
+RELAY_CHANNEL = "fibook_events"
+RELAY_RETRY_SECONDS = 5
+# Notifications are limited to 8000 bytes
+RELAY_MESSAGE_BYTES = 7000
+# Tells this process' relayed events apart from other processes' ones
+_ORIGIN = uuid.uuid4().hex
+
+_handlers: Dict[str, List[Callable[..., Any]]] = defaultdict(list)
+_remote_handlers: Dict[str, List[Callable[..., Any]]] = defaultdict(list)
+
+
+def subscribe(name: str, handler: Callable[..., Any], *, remote: bool = False) -> None:
+    """
+    Call `handler` for every `name` event published in this process and,
+    with `remote`, for those relayed from other processes too. Handlers that
+    write to the database should stay local, or every process repeats them.
+    """
+    if handler not in _handlers[name]:
+        _handlers[name].append(handler)
+    if remote and handler not in _remote_handlers[name]:
+        _remote_handlers[name].append(handler)
+
+
+def unsubscribe(name: str, handler: Callable[..., Any]) -> None:
+    for handlers in (_handlers, _remote_handlers):
+        if handler in handlers[name]:
+            handlers[name].remove(handler)
+
+
+def _call(handlers: List[Callable[..., Any]], name: str, payload: Dict) -> None:
+    for handler in list(handlers):
+        try:
+            handler(**payload)
+        except Exception as e:
+            logger.error(f"Event handler for {name} failed: {str(e)}")
+
+
+def publish(name: str, **payload: Any) -> None:
+    """
+    Call every handler of `name` in this process. A failing handler is
+    logged and does not stop the others.
+    """
+    _call(_handlers[name], name, payload)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    raise TypeError(f"Cannot relay {type(value).__name__}")
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if obj.keys() == {"datetime"}:
+        return datetime.fromisoformat(obj["datetime"])
+    return obj
+
+
+def _messages(events: List[tuple]) -> List[str]:
+    """
+    Events as JSON arrays that each fit in a Postgres notification.
+    """
+    messages, batch, size = [], [], 0
+    for name, payload in events:
+        item = json.dumps(
+            {"origin": _ORIGIN, "name": name, "payload": payload},
+            default=_encode_value,
+        )
+        if batch and size + len(item) > RELAY_MESSAGE_BYTES:
+            messages.append(f"[{','.join(batch)}]")
+            batch, size = [], 0
+        batch.append(item)
+        size += len(item) + 1
+    if batch:
+        messages.append(f"[{','.join(batch)}]")
+    return messages
+
+
+def _relay(session: Session, events: List[tuple]) -> None:
+    # Sent in the session's transaction, so Postgres delivers them to the
+    # other processes only once it commits, and never if it rolls back
+    if not events or session.get_bind().dialect.name != "postgresql":
+        return
+    session.connection().execute(
+        sql_select(
+            *(func.pg_notify(RELAY_CHANNEL, message) for message in _messages(events))
+        )
+    )
+
+
+def receive(message: str) -> None:
+    """
+    Publish an event relayed from another process to the handlers that
+    subscribed with `remote`. This process' own events were published to
+    them already.
+    """
+    for data in json.loads(message, object_hook=_decode_value):
+        if data["origin"] != _ORIGIN:
+            _call(_remote_handlers[data["name"]], data["name"], data["payload"])
+
+
+def publish_after_commit(session: Session, name: str, **payload: Any) -> None:
+    """
+    Publish an event once the session's transaction commits, for changes
+    the session does not see, e.g. ones written with Core statements.
+    Dropped if the transaction rolls back.
+    """
+    session.info.setdefault(_PENDING_KEY, []).append((name, payload))
+    session.info.setdefault(_UNRELAYED_KEY, []).append((name, payload))
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _earliest(*values: Optional[datetime]) -> Optional[datetime]:
+    values = [_as_utc(value) for value in values if value is not None]
+    return min(values) if values else None
+
+
+def _transaction_dates(obj: PortfolioTransaction) -> List[datetime]:
+    # Current and replaced dates, read from the attribute history so that
+    # an expired date (e.g. a server default) is not loaded mid-flush
+    history = inspect(obj).attrs.transaction_date.history
+    return [date for date in history.sum() if date is not None]
+
+
+def _collect(session: Session) -> List[tuple]:
+    events = []
+    portfolios: Dict[int, Optional[datetime]] = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, PortfolioTransaction):
+            portfolios[obj.portfolio_id] = _earliest(
+                portfolios.get(obj.portfolio_id), *_transaction_dates(obj)
+            )
+        elif isinstance(obj, PortfolioHolding):
+            portfolios.setdefault(obj.portfolio_id, None)
+        elif isinstance(obj, Portfolio):
+            portfolios.setdefault(obj.id, None)
+        elif isinstance(obj, User) and obj not in session.new:
+            events.append((USER_CHANGED, {"user_id": obj.id}))
+        elif isinstance(obj, ExchangeRate) and obj in session.new:
+            events.append(
+                (
+                    EXCHANGE_RATE_CREATED,
+                    {
+                        "source_currency_id": obj.source_currency_id,
+                        "target_currency_id": obj.target_currency_id,
+                        "rate": obj.rate,
+                        "effective_date": obj.effective_date,
+                    },
+                )
+            )
+    events.extend(
+        (PORTFOLIO_CHANGED, {"portfolio_id": portfolio_id, "since": since})
+        for portfolio_id, since in portfolios.items()
+        if portfolio_id is not None
+    )
+    return events
+
+
+# ORM changes are collected on flush and only published once the transaction
+# commits, so handlers never see rolled back changes. Core statements bypass
+# the session and have to queue their own events with `publish_after_commit`.
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    events = _collect(session)
+    session.info.setdefault(_PENDING_KEY, []).extend(events)
+    _relay(session, events)
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session) -> None:
+    _relay(session, session.info.pop(_UNRELAYED_KEY, []))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    # Events repeated across the flushes of one transaction are published
+    # once; changes to a portfolio are merged, since their earliest date
+    pending: Dict[tuple, Dict[str, Any]] = {}
+    for name, payload in session.info.pop(_PENDING_KEY, []):
+        if name == PORTFOLIO_CHANGED:
+            key = (name, payload["portfolio_id"])
+            if key in pending:
+                since = _earliest(pending[key]["since"], payload["since"])
+                payload = dict(payload, since=since)
+        else:
+            key = (name, tuple(sorted(payload.items())))
+            if key in pending:
+                continue
+        pending[key] = payload
+    for (name, _), payload in pending.items():
+        publish(name, **payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_UNRELAYED_KEY, None)
+
+
+class _Relay(threading.Thread):
+    """
+    Listens on `RELAY_CHANNEL` over its own connection and hands the
+    events of other processes to `receive`, reconnecting after failures.
+    """
+
+    def __init__(self, url):
+        super().__init__(name="event-relay", daemon=True)
+        self.engine = create_engine(url, poolclass=NullPool)
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Event relay failed: {str(e)}")
+                self.stopped.wait(RELAY_RETRY_SECONDS)
+        self.engine.dispose()
+
+    def _listen(self) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            dbapi = connection.driver_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {RELAY_CHANNEL}")
+            publish(RELAY_RESUMED)
+            while not self.stopped.is_set():
+                if select.select([dbapi], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    receive(dbapi.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+
+_relay_thread: Optional[_Relay] = None
+
+
+def start_relay(engine: Engine, url: Optional[str] = None) -> None:
+    """
+    Start receiving the events other processes commit, on Postgres with
+    psycopg2. `url` overrides the engine's for the listening connection,
+    which cannot go through a transaction pooler.
+    """
+    global _relay_thread
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg2":
+        return
+    if _relay_thread is None:
+        _relay_thread = _Relay(url or engine.url)
+        _relay_thread.start()
+
+
+def stop_relay() -> None:
+    global _relay_thread
+    if _relay_thread is not None:
+        _relay_thread.stopped.set()
+        _relay_thread.join()
+        _relay_thread = None
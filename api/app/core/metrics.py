@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, Union
+
+# Label (name, value) pairs of one sample of a metric
+Labels = Tuple[Tuple[str, str], ...]
+Samples = Union[float, Dict[Labels, float]]
+
+
+@dataclass
+class Metric:
+    name: str
+    kind: str
+    description: str
+    collect: Callable[[], Samples]
+
+
+_metrics: Dict[str, Metric] = {}
+
+
+def register(
+    name: str, *, kind: str, description: str, collect: Callable[[], Samples]
+) -> None:
+    """
+    Expose a metric on /metrics. `collect` is called on every scrape and
+    returns the value, or the values per label set.
+    """
+    _metrics[name] = Metric(name, kind, description, collect)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def render() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    lines: List[str] = []
+    for metric in _metrics.values():
+        samples = metric.collect()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(
+            f"{metric.name}{_format_labels(labels)} {value}"
+            for labels, value in samples.items()
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class PoolStats:
+    """
+    Checkout counters of one engine's connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.overflows = 0
+
+    def checked_out(self, wait: float, *, overflow: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += wait
+            self.overflows += overflow
+
+    def timed_out(self, wait: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds += wait
+
+
+# Instrumented engines and the stats of their pools, by pool name. Stats
+# outlive the pool, which `Engine.dispose` replaces
+_engines: Dict[str, Engine] = {}
+_stats: Dict[str, PoolStats] = {}
+
+
+class _MeteredPool:
+    # Times every checkout: the wait for a free connection, plus connecting
+    # or pinging it when needed
+    def connect(self):
+        stats = _stats[self.logging_name]
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            stats.timed_out(time.perf_counter() - start)
+            raise
+        stats.checked_out(
+            time.perf_counter() - start, overflow=self.checkedout() > self.size()
+        )
+        return connection
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, *, name: str) -> Dict[str, Any]:
+    """
+    `create_engine` or `create_async_engine` arguments of a pool named
+    `name`, sized and checked as configured in the settings.
+    """
+    parsed = make_url(url)
+    asynchronous = parsed.get_driver_name() in ("asyncpg", "aiosqlite")
+    options: Dict[str, Any] = {
+        "poolclass": MeteredAsyncAdaptedQueuePool if asynchronous else MeteredQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_POOL_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+    if settings.DB_PGBOUNCER and parsed.get_driver_name() == "asyncpg":
+        # PgBouncer may run each transaction on another server connection,
+        # where a statement prepared earlier does not exist. psycopg2 does
+        # not prepare statements
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+def instrument(engine: Engine, *, name: str) -> None:
+    """
+    Export the pool metrics of an engine created with `engine_options`.
+    Takes the sync engine of an async one.
+    """
+    _stats.setdefault(name, PoolStats())
+    _engines[name] = engine
+
+
+def _per_pool(value) -> Dict[metrics.Labels, float]:
+    return {(("pool", name),): value(name) for name in _engines}
+
+
+metrics.register(
+    "fibook_db_pool_checkouts_total",
+    kind="counter",
+    description="Connections checked out of the pool",
+    collect=lambda: _per_pool(lambda name: _stats[name].checkouts),
+)
+metrics.register(
+    "fibook_db_pool_checkout_wait_seconds_total",
+    kind="counter",
+    description="Time spent checking out connections, timed out ones included",
+    collect=lambda: _per_pool(lambda name: _stats[name].wait_seconds),
+)
+metrics.register(
+    "fibook_db_pool_checkout_timeouts_total",
+    kind="counter",
+    description="Checkouts that gave up waiting for a free connection",
+    collect=lambda: _per_pool(lambda name: _stats[name].timeouts),
+)
+metrics.register(
+    "fibook_db_pool_overflow_checkouts_total",
+    kind="counter",
+    description="Checkouts that took the connections in use beyond the pool size",
+    collect=lambda: _per_pool(lambda name: _stats[name].overflows),
+)
+metrics.register(
+    "fibook_db_pool_connections_in_use",
+    kind="gauge",
+    description="Connections currently checked out",
+    collect=lambda: _per_pool(lambda name: _engines[name].pool.checkedout()),
+)
+metrics.register(
+    "fibook_db_pool_overflow_connections",
+    kind="gauge",
+    description="Open connections beyond the pool size",
+    collect=lambda: _per_pool(lambda name: max(_engines[name].pool.overflow(), 0)),
+)
+metrics.register(
+    "fibook_db_pool_size",
+    kind="gauge",
+    description="Connections the pool keeps open",
+    collect=lambda: _per_pool(lambda name: _engines[name].pool.size()),
+)
@@ -0,0 +1,118 @@
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+
+# Session.info key of the user a request's session writes for
+USER_ID_KEY = "user_id"
+# Session.info key of sessions that read from the replica
+REPLICA_KEY = "replica"
+
+# Time of the client's last write, returned after every request that commits
+# one and sent back by the client with its next requests
+LAST_WRITE_COOKIE = "fibook_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+# Commit times of the current request, see `track_writes`
+_request_writes: ContextVar[Optional[List[float]]] = ContextVar(
+    "request_writes", default=None
+)
+
+
+class ReadRouter:
+    """
+    Picks the database of a read. A client whose last write is less than
+    `READ_REPLICA_MAX_LAG_SECONDS` old reads from the primary, which has the
+    write, everyone else from the replica. The client carries the time of
+    its last write, so whichever process serves the read can route it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def use_replica(self, last_write: Optional[float]) -> bool:
+        if not settings.READ_REPLICA_DATABASE_URI:
+            return False
+        replica = (
+            last_write is None
+            or time.time() - last_write > settings.READ_REPLICA_MAX_LAG_SECONDS
+        )
+        with self._lock:
+            if replica:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+        return replica
+
+
+read_router = ReadRouter()
+
+
+def get_last_write(request: Request) -> Optional[float]:
+    """
+    Time of the client's last write, from the header or else the cookie.
+    """
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(
+        LAST_WRITE_COOKIE
+    )
+    try:
+        last_write = float(value) if value else None
+    except ValueError:
+        return None
+    return last_write if last_write is not None and math.isfinite(last_write) else None
+
+
+async def track_writes(request: Request, call_next) -> Response:
+    """
+    HTTP middleware that returns the time of a request's last commit to the
+    client, as a cookie that lives as long as the replica may lag and as a
+    header for clients without cookies.
+    """
+    if not settings.READ_REPLICA_DATABASE_URI:
+        return await call_next(request)
+
+    writes: List[float] = []
+    token = _request_writes.set(writes)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_writes.reset(token)
+    if writes:
+        value = f"{writes[-1]:.6f}"
+        response.headers[LAST_WRITE_HEADER] = value
+        response.set_cookie(
+            LAST_WRITE_COOKIE,
+            value,
+            max_age=math.ceil(settings.READ_REPLICA_MAX_LAG_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    writes = _request_writes.get()
+    if writes is not None and session.info.get(USER_ID_KEY) is not None:
+        writes.append(time.time())
+
+
+metrics.register(
+    "fibook_db_reads_total",
+    kind="counter",
+    description="Read-only requests by the database they were routed to",
+    collect=lambda: {
+        (("target", "replica"),): read_router.replica_reads,
+        (("target", "primary"),): read_router.primary_reads,
+    },
+)
@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Tuple, Union, Optional
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -8,8 +10,21 @@ from pydantic import ValidationError
 from app.core.config import settings
 from app.schemas.token import TokenPayload
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes made with other rounds verify, and are flagged
+# for an upgrade by `verify_and_update_password`
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+# bcrypt runs on its own threads, which it releases the GIL on, so a burst
+# of logins queues here instead of taking every request worker
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
 
 
 # JWT token functions
@@ -36,14 +51,40 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against a hash
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_executor.submit(
+        pwd_context.verify, plain_password, hashed_password
+    ).result()
 
 
 def get_password_hash(password: str) -> str:
     """
     Hash a password
     """
-    return pwd_context.hash(password)
+    return password_executor.submit(pwd_context.hash, password).result()
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password against a hash without blocking the event loop. The
+    second value is a new hash when the old one was made with other rounds.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor,
+        pwd_context.verify_and_update,
+        plain_password,
+        hashed_password,
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password without blocking the event loop
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, pwd_context.hash, password
+    )
 
 
 def decode_token(token: str) -> Optional[TokenPayload]:
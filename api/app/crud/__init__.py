@@ -6,4 +6,7 @@ from app.crud import (
     currency,
     portfolio,
     exchange_rate,
+    portfolio_snapshot,
 )
+from app.crud.pagination import TotalMode
+from app.crud.session import unit_of_work
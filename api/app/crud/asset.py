@@ -1,7 +1,9 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Optional, Union
 
 from sqlalchemy.orm import Session
 
+from app.crud.pagination import Page, TotalMode, paginate
+
 from app.models.asset import Asset
 from app.schemas.asset import AssetCreate, AssetUpdate
 
@@ -16,8 +18,10 @@ def get_multi(
     asset_type_id: Optional[int] = None,
     currency_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[Asset], int]:
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
     query = db.query(Asset)
 
     if asset_type_id is not None:
@@ -26,10 +30,14 @@ def get_multi(
     if currency_id is not None:
         query = query.filter(Asset.currency_id == currency_id)
 
-    total = query.count()
-    assets = query.offset(skip).limit(limit).all()
-
-    return assets, total
+    return paginate(
+        query,
+        keys=[Asset.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+    )
 
 
 def create(db: Session, *, obj_in: AssetCreate) -> Asset:
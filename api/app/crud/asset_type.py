@@ -1,6 +1,8 @@
-from typing import List, Optional, Tuple
+from typing import Optional
 from sqlalchemy.orm import Session
 
+from app.crud.pagination import Page, TotalMode, paginate
+
 from app.models.asset_type import AssetType
 
 
@@ -9,11 +11,20 @@ def get_by_id(db: Session, id: int) -> Optional[AssetType]:
 
 
 def get_multi(
-    db: Session, *, skip: int = 0, limit: int = 100
-) -> Tuple[List[AssetType], int]:
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
     query = db.query(AssetType)
 
-    total = query.count()
-    result = query.offset(skip).limit(limit).all()
-
-    return result, total
+    return paginate(
+        query,
+        keys=[AssetType.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+    )
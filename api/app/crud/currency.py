@@ -1,6 +1,8 @@
-from typing import List, Optional, Tuple
+from typing import Optional
 from sqlalchemy.orm import Session
 
+from app.crud.pagination import Page, TotalMode, paginate
+
 from app.models.currency import Currency
 
 
@@ -13,11 +15,20 @@ def get_by_code(db: Session, *, code: str) -> Currency | None:
 
 
 def get_multi(
-    db: Session, *, skip: int = 0, limit: int = 100
-) -> Tuple[List[Currency], int]:
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
     query = db.query(Currency)
 
-    total = query.count()
-    result = query.offset(skip).limit(limit).all()
-
-    return result, total
+    return paginate(
+        query,
+        keys=[Currency.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+    )
@@ -1,6 +1,9 @@
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional
+from sqlalchemy import and_, func
 from sqlalchemy.orm import Session
 
+from app.crud.pagination import Page, TotalMode, paginate
+
 from app.schemas.exchange_rate import ExchangeRateCreate
 from app.models.exchange_rate import ExchangeRate
 
@@ -10,14 +13,25 @@ def get_by_id(db: Session, id: int) -> Optional[ExchangeRate]:
 
 
 def get_multi(
-    db: Session, *, skip: int = 0, limit: int = 100
-) -> Tuple[List[ExchangeRate], int]:
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
     query = db.query(ExchangeRate)
 
-    total = query.count()
-    result = query.offset(skip).limit(limit).all()
-
-    return result, total
+    # Newest first
+    return paginate(
+        query,
+        keys=[ExchangeRate.effective_date, ExchangeRate.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+        descending=True,
+    )
 
 
 def get_latest_rate(
@@ -32,6 +46,63 @@ def get_latest_rate(
     )
 
 
+def get_latest_rates(
+    db: Session,
+    *,
+    source_currency_ids: Optional[Iterable[int]] = None,
+    target_currency_id: Optional[int] = None,
+) -> List[ExchangeRate]:
+    """
+    Latest rate of every currency pair in one query, optionally restricted
+    to some source currencies and a single target currency.
+    """
+    latest = db.query(
+        ExchangeRate.source_currency_id,
+        ExchangeRate.target_currency_id,
+        func.max(ExchangeRate.effective_date).label("effective_date"),
+    ).group_by(ExchangeRate.source_currency_id, ExchangeRate.target_currency_id)
+
+    if source_currency_ids is not None:
+        latest = latest.filter(
+            ExchangeRate.source_currency_id.in_(list(source_currency_ids))
+        )
+
+    if target_currency_id is not None:
+        latest = latest.filter(ExchangeRate.target_currency_id == target_currency_id)
+
+    latest = latest.subquery()
+    rows = (
+        db.query(ExchangeRate)
+        .join(
+            latest,
+            and_(
+                ExchangeRate.source_currency_id == latest.c.source_currency_id,
+                ExchangeRate.target_currency_id == latest.c.target_currency_id,
+                ExchangeRate.effective_date == latest.c.effective_date,
+            ),
+        )
+        .order_by(ExchangeRate.id)
+        .all()
+    )
+
+    # Several rows can share the latest effective date, keep the newest one
+    return list(
+        {(row.source_currency_id, row.target_currency_id): row for row in rows}.values()
+    )
+
+
+def get_created_since(
+    db: Session, *, last_id: int, limit: int = 10000
+) -> List[ExchangeRate]:
+    return (
+        db.query(ExchangeRate)
+        .filter(ExchangeRate.id > last_id)
+        .order_by(ExchangeRate.id)
+        .limit(limit)
+        .all()
+    )
+
+
 def create(db: Session, *, obj_in: ExchangeRateCreate) -> ExchangeRate:
     db_obj = ExchangeRate(**obj_in.model_dump())
     db.add(db_obj)
@@ -0,0 +1,163 @@
+import base64
+import binascii
+import enum
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import InstrumentedAttribute, Query
+
+# Planner estimates below this are replaced by an exact count, which is cheap
+# at that size and more reliable than the statistics of small tables
+EXACT_COUNT_BELOW = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class TotalMode(str, enum.Enum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
+class Page(NamedTuple):
+    """
+    One page of a list. Unpacks like the `(result, total)` pairs the crud
+    functions returned before cursors.
+    """
+
+    result: List[Any]
+    total: Optional[int]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Opaque cursor for the sort key values of the last row of a page.
+    """
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    return (
+        base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        .rstrip(b"=")
+        .decode()
+    )
+
+
+def decode_cursor(cursor: str, *, keys: Sequence[InstrumentedAttribute]) -> List[Any]:
+    """
+    Sort key values of a cursor, typed like the columns they are compared
+    with.
+
+    Raises:
+        InvalidCursor: If the cursor was not made for these keys
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor("Invalid cursor")
+
+    typed = []
+    for key, value in zip(keys, values):
+        python_type = key.type.python_type
+        try:
+            if value is None:
+                raise TypeError
+            if python_type is datetime:
+                typed.append(datetime.fromisoformat(value))
+            else:
+                typed.append(python_type(value))
+        except (TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor")
+    return typed
+
+
+def estimate_count(query: Query) -> int:
+    """
+    Row count of a query as estimated by the PostgreSQL planner from the
+    table statistics, without running it. Other databases have no usable
+    estimate and count exactly.
+    """
+    session = query.session
+    dialect = session.get_bind().dialect
+    if dialect.name != "postgresql":
+        return query.count()
+
+    compiled = query.statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.params
+    if compiled.positional:
+        # asyncpg takes `$1` style parameters, in order
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = (
+        session.connection()
+        .exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params)
+        .scalar()
+    )
+    if isinstance(plan, str):
+        # asyncpg leaves json undecoded
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < EXACT_COUNT_BELOW:
+        return query.count()
+    return estimate
+
+
+def paginate(
+    query: Query,
+    *,
+    keys: Sequence[InstrumentedAttribute],
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    descending: bool = False,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
+    """
+    Order a query by `keys`, the last of which must be unique (the id), and
+    return one page of it with the total row count.
+
+    With a cursor the page starts right after the row it was made from, an
+    index range scan on `keys` that costs the same however deep the page is.
+    Without one `skip` rows are skipped, for clients that page by offset.
+    Either way the page comes with the cursor of the next one, None on the
+    last page.
+
+    The total is counted with `TotalMode.EXACT`, estimated by the planner
+    with `TotalMode.ESTIMATE` and left out with `TotalMode.NONE`, where
+    `has_more` tells whether there is a next page.
+    """
+    ordered = query.order_by(*(key.desc() if descending else key for key in keys))
+    if cursor is not None:
+        after = tuple_(*decode_cursor(cursor, keys=keys))
+        row = tuple_(*keys)
+        ordered = ordered.filter(row < after if descending else row > after)
+    elif skip:
+        ordered = ordered.offset(skip)
+
+    rows = ordered.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    next_cursor = None
+    if has_more:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+
+    total = None
+    if total_mode is TotalMode.EXACT:
+        total = query.count()
+    elif total_mode is TotalMode.ESTIMATE:
+        # The last page of an offset listing already tells the exact total
+        if cursor is None and not has_more and (rows or not skip):
+            total = skip + len(rows)
+        else:
+            total = estimate_count(query)
+    return Page(rows, total, next_cursor, has_more)
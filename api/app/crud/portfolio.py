@@ -1,9 +1,17 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+import math
+from typing import Any, Dict, List, Optional, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, update as sql_update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload
 
-from app.crud.exchange_rate import get_latest_rate
+from app.crud.pagination import Page, TotalMode, decode_cursor, paginate
+from app.crud.session import async_variant, save
 
+from app.services.currency_conversion.converter import currency_converter
+from app.services.valuation.engine import HoldingColumns, value_holdings
+
+from app.models.asset import Asset as AssetModel
 from app.models.portfolio import Portfolio as PortfolioModel
 from app.models.portfolio_holdings import PortfolioHolding as PortfolioHoldingModel
 
@@ -25,8 +33,10 @@ def get_multi(
     user_id: Optional[int] = None,
     base_currency_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[Portfolio], int]:
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
     query = db.query(PortfolioModel)
 
     if user_id is not None:
@@ -35,17 +45,20 @@ def get_multi(
     if base_currency_id is not None:
         query = query.filter(PortfolioModel.base_currency_id == base_currency_id)
 
-    total = query.count()
-    assets = query.offset(skip).limit(limit).all()
-
-    return assets, total
+    return paginate(
+        query,
+        keys=[PortfolioModel.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+    )
 
 
 def create(db: Session, *, obj_in: Portfolio, user_id: int) -> Portfolio:
     db_obj = PortfolioModel(**obj_in.model_dump(), user_id=user_id)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
@@ -62,8 +75,7 @@ def update(
             setattr(db_obj, field, update_data[field])
 
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
@@ -71,7 +83,7 @@ def update_holding(
     db: Session,
     *,
     db_obj: PortfolioHoldingModel,
-    obj_in: Union[PortfolioHoldingUpdate, Dict[str, Any]]
+    obj_in: Union[PortfolioHoldingUpdate, Dict[str, Any]],
 ) -> PortfolioHoldingModel:
     if isinstance(obj_in, dict):
         update_data = obj_in
@@ -83,14 +95,13 @@ def update_holding(
             setattr(db_obj, field, update_data[field])
 
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
 def delete(db: Session, *, db_obj: PortfolioModel) -> Portfolio:
     db.delete(db_obj)
-    db.commit()
+    save(db)
     return db_obj
 
 
@@ -100,18 +111,38 @@ def get_multi_holdings(
     portfolio_id: int,
     asset_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
-) -> List[PortfolioHolding]:
-    query = db.query(PortfolioHoldingModel).filter(
-        PortfolioHoldingModel.portfolio_id == portfolio_id
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Page:
+    # Load the asset with the relations the response serializes in the same
+    # query, instead of one lazy load per holding
+    asset = joinedload(PortfolioHoldingModel.asset)
+    query = (
+        db.query(PortfolioHoldingModel)
+        .options(
+            asset.joinedload(AssetModel.asset_type),
+            asset.joinedload(AssetModel.currency),
+        )
+        .filter(PortfolioHoldingModel.portfolio_id == portfolio_id)
     )
 
     if asset_id:
         query = query.filter(PortfolioHoldingModel.asset_id == asset_id)
 
-    assets = query.offset(skip).limit(limit).all()
-
-    return assets
+    if limit is None:
+        # Every holding after the cursor, or after `skip` without one, like
+        # a page of `paginate` without an end
+        query = query.order_by(PortfolioHoldingModel.id)
+        if cursor is not None:
+            (after,) = decode_cursor(cursor, keys=[PortfolioHoldingModel.id])
+            query = query.filter(PortfolioHoldingModel.id > after)
+        elif skip:
+            query = query.offset(skip)
+        result = query.all()
+        return Page(result, len(result))
+    return paginate(
+        query, keys=[PortfolioHoldingModel.id], cursor=cursor, skip=skip, limit=limit
+    )
 
 
 def get_holding_by_id(db: Session, *, id: int) -> PortfolioHolding:
@@ -140,26 +171,125 @@ def create_holding(
 ) -> PortfolioHoldingModel:
     db_obj = PortfolioHoldingModel(**obj_in.model_dump(), portfolio_id=portfolio_id)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
+def add_to_holding(
+    db: Session,
+    *,
+    portfolio_id: int,
+    asset_id: int,
+    quantity: float,
+    cost: Optional[float] = 0.0,
+) -> PortfolioHoldingModel:
+    """
+    Add a quantity and its cost to a holding, creating the holding if it does
+    not exist, in one atomic `INSERT ... ON CONFLICT DO UPDATE`. Concurrent
+    writers can neither lose an update nor create a second row for the same
+    asset. A null cost makes the cost basis unknown. Does not commit.
+    """
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    table = PortfolioHoldingModel.__table__
+
+    stmt = insert(PortfolioHoldingModel).values(
+        portfolio_id=portfolio_id,
+        asset_id=asset_id,
+        quantity=quantity,
+        cost_basis=cost,
+        avg_purchase_price=cost / quantity if quantity > 0 and cost else 0.0,
+        realized_pnl=0.0,
+    )
+    new_quantity = table.c.quantity + stmt.excluded.quantity
+    new_cost = table.c.cost_basis + stmt.excluded.cost_basis
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.portfolio_id, table.c.asset_id],
+        set_={
+            "quantity": new_quantity,
+            "cost_basis": new_cost,
+            "avg_purchase_price": case(
+                (new_quantity > 0, func.coalesce(new_cost / new_quantity, 0.0)),
+                else_=0.0,
+            ),
+            "updated_at": func.now(),
+        },
+    )
+    return db.execute(
+        stmt.returning(PortfolioHoldingModel),
+        execution_options={"populate_existing": True},
+    ).scalar_one()
+
+
+def upsert_holdings(db: Session, *, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert or overwrite the quantity, cost basis, average price and realized
+    PnL of many holdings with one multi-row `INSERT ... ON CONFLICT DO
+    UPDATE`. Does not commit.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+    stmt = insert(PortfolioHoldingModel)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["portfolio_id", "asset_id"],
+        set_={
+            "quantity": stmt.excluded.quantity,
+            "cost_basis": stmt.excluded.cost_basis,
+            "avg_purchase_price": stmt.excluded.avg_purchase_price,
+            "realized_pnl": stmt.excluded.realized_pnl,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def advance_checkpoint(db: Session, *, portfolio_id: int, transaction_id: int) -> None:
+    """
+    Move the holdings checkpoint of a portfolio forward to `transaction_id`,
+    never back. Locks the portfolio row until the commit, which serializes
+    the writers of one portfolio's holdings. Does not commit.
+    """
+    table = PortfolioModel.__table__
+    checkpoint = func.coalesce(table.c.holdings_checkpoint, 0)
+    # Not an edit of the portfolio, so `updated_at` is kept as it is
+    db.execute(
+        sql_update(table)
+        .where(table.c.id == portfolio_id)
+        .values(
+            holdings_checkpoint=case(
+                (checkpoint < transaction_id, transaction_id),
+                else_=table.c.holdings_checkpoint,
+            ),
+            updated_at=table.c.updated_at,
+        )
+    )
+
+
 def delete_holding(db: Session, *, db_obj: PortfolioHoldingModel) -> PortfolioHolding:
     db.delete(db_obj)
-    db.commit()
+    save(db)
     return db_obj
 
 
 def calculate_holding_total_value(
     db: Session, *, holding: PortfolioHoldingModel
 ) -> Optional[float]:
-    rate = get_latest_rate(
-        db,
-        source_currency_id=holding.asset.currency_id,
-        target_currency_id=holding.portfolio.base_currency_id,
+    currency_converter.refresh(db)
+    valuation = value_holdings(
+        HoldingColumns.from_holdings(
+            [holding], base_currency_id=holding.portfolio.base_currency_id
+        ),
+        converter=currency_converter,
     )
-    if rate:
-        return holding.quantity * (rate.rate or 0)
+    value = valuation.values[0]
+    return None if math.isnan(value) else float(value)
+
 
-    return None
+# Async variants, for `AsyncSession`
+get_by_id_async = async_variant(get_by_id)
+get_multi_async = async_variant(get_multi)
+create_async = async_variant(create)
+get_multi_holdings_async = async_variant(get_multi_holdings)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.portfolio_snapshot import PortfolioSnapshot
+
+
+def get_latest(
+    db: Session, *, portfolio_id: int, before: Optional[datetime] = None
+) -> Optional[PortfolioSnapshot]:
+    query = db.query(PortfolioSnapshot).filter(
+        PortfolioSnapshot.portfolio_id == portfolio_id
+    )
+
+    if before is not None:
+        query = query.filter(PortfolioSnapshot.bucket_start < before)
+
+    return query.order_by(PortfolioSnapshot.bucket_start.desc()).first()
+
+
+def get_multi(
+    db: Session, *, portfolio_id: int, start: datetime, end: datetime
+) -> List[PortfolioSnapshot]:
+    return (
+        db.query(PortfolioSnapshot)
+        .filter(PortfolioSnapshot.portfolio_id == portfolio_id)
+        .filter(PortfolioSnapshot.bucket_start >= start)
+        .filter(PortfolioSnapshot.bucket_start <= end)
+        .order_by(PortfolioSnapshot.bucket_start)
+        .all()
+    )
+
+
+def get_latest_days(
+    db: Session, *, portfolio_ids: Iterable[int]
+) -> Dict[int, datetime]:
+    """
+    Start of the newest snapshot day of each portfolio that has one.
+    """
+    return dict(
+        db.query(
+            PortfolioSnapshot.portfolio_id, func.max(PortfolioSnapshot.bucket_start)
+        )
+        .filter(PortfolioSnapshot.portfolio_id.in_(list(portfolio_ids)))
+        .group_by(PortfolioSnapshot.portfolio_id)
+        .all()
+    )
+
+
+def delete_since(db: Session, *, portfolio_id: int, since: datetime) -> int:
+    """
+    Drop the snapshots of a portfolio from `since` on, e.g. after its
+    history changed. Does not commit.
+    """
+    return (
+        db.query(PortfolioSnapshot)
+        .filter(PortfolioSnapshot.portfolio_id == portfolio_id)
+        .filter(PortfolioSnapshot.bucket_start >= since)
+        .delete(synchronize_session=False)
+    )
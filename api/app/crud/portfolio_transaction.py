@@ -1,7 +1,13 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session, joinedload
 
+from app.crud.pagination import Page, TotalMode, paginate
+from app.crud.session import async_variant, save
+
+from app.models.asset import Asset
+from app.models.portfolio import Portfolio
 from app.models.portfolio_transaction import PortfolioTransaction
 from app.schemas.portfolio_transaction import (
     PortfolioTransactionCreate,
@@ -9,30 +15,96 @@ from app.schemas.portfolio_transaction import (
 )
 
 
+def _with_relations(query: Query) -> Query:
+    # Load the relations the response serializes in the same query, instead
+    # of lazily per transaction, which async sessions cannot do
+    asset = joinedload(PortfolioTransaction.asset)
+    return query.options(
+        asset.joinedload(Asset.asset_type),
+        asset.joinedload(Asset.currency),
+        joinedload(PortfolioTransaction.price_currency),
+    )
+
+
 def get_by_id(db: Session, id: int) -> Optional[PortfolioTransaction]:
-    return db.query(PortfolioTransaction).filter(PortfolioTransaction.id == id).first()
+    return (
+        _with_relations(db.query(PortfolioTransaction))
+        .filter(PortfolioTransaction.id == id)
+        .first()
+    )
 
 
-def get_multi(
+def filter_multi(
     db: Session,
     *,
     asset_id: Optional[int] = None,
     user_id: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
-) -> Tuple[List[PortfolioTransaction], int]:
+    portfolio_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Query:
+    """
+    Unordered query of the transactions matching the filters of `get_multi`.
+    """
     query = db.query(PortfolioTransaction)
 
     if asset_id is not None:
         query = query.filter(PortfolioTransaction.asset_id == asset_id)
 
     if user_id is not None:
-        query = query.filter(PortfolioTransaction.portfolio.user_id == user_id)
+        # Resolve the user's portfolios first. With their ids in the query
+        # the planner knows how many transactions each one has, where a join
+        # would be planned as if every user had an average share of them
+        portfolio_ids = [
+            row.id
+            for row in db.query(Portfolio.id).filter(Portfolio.user_id == user_id)
+        ]
+        query = query.filter(PortfolioTransaction.portfolio_id.in_(portfolio_ids))
+
+    if portfolio_id is not None:
+        query = query.filter(PortfolioTransaction.portfolio_id == portfolio_id)
+
+    if start is not None:
+        query = query.filter(PortfolioTransaction.transaction_date >= start)
+
+    if end is not None:
+        query = query.filter(PortfolioTransaction.transaction_date < end)
+
+    return query
 
-    total = query.count()
-    transactions = query.offset(skip).limit(limit).all()
 
-    return transactions, total
+def get_multi(
+    db: Session,
+    *,
+    asset_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    portfolio_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
+    query = filter_multi(
+        db,
+        asset_id=asset_id,
+        user_id=user_id,
+        portfolio_id=portfolio_id,
+        start=start,
+        end=end,
+    )
+
+    # Newest first
+    return paginate(
+        _with_relations(query),
+        keys=[PortfolioTransaction.transaction_date, PortfolioTransaction.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+        descending=True,
+    )
 
 
 def create(
@@ -44,8 +116,7 @@ def create(
         **obj_in.model_dump(),
     )
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
@@ -63,14 +134,22 @@ def update(
     for field in update_data:
         if field in update_data and update_data[field] is not None:
             setattr(db_obj, field, update_data[field])
+    if {"price_each", "price_currency_id", "transaction_date"} & set(update_data):
+        # Priced again at the next replay
+        db_obj.base_price_each = None
+        db_obj.base_currency_id = None
 
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    save(db, db_obj)
     return db_obj
 
 
 def delete(db: Session, *, db_obj: PortfolioTransaction) -> PortfolioTransaction:
     db.delete(db_obj)
-    db.commit()
+    save(db)
     return db_obj
+
+
+# Async variants, for `AsyncSession`
+get_by_id_async = async_variant(get_by_id)
+get_multi_async = async_variant(get_multi)
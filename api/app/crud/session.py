@@ -0,0 +1,67 @@
+import functools
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+# Session.info flag set while a unit of work is open
+UNIT_OF_WORK = "unit_of_work"
+
+
+@contextmanager
+def unit_of_work(db: Session) -> Iterator[Session]:
+    """
+    Group several crud writes into one database transaction. Inside the
+    block writes are only staged in the session and committed once at the
+    end, or rolled back together if the block raises. Nested blocks join
+    the outer one.
+
+    Rows are expired by the commit, so only the ones that are read again,
+    e.g. the rows an endpoint returns, are reloaded.
+    """
+    if db.info.get(UNIT_OF_WORK):
+        yield db
+        return
+
+    db.info[UNIT_OF_WORK] = True
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop(UNIT_OF_WORK, None)
+
+
+def in_unit_of_work(db: Session) -> bool:
+    return bool(db.info.get(UNIT_OF_WORK))
+
+
+def save(db: Session, *objs: Any) -> None:
+    """
+    Commit and refresh `objs`, unless a unit of work is open, which commits
+    them later.
+    """
+    if in_unit_of_work(db):
+        return
+    db.commit()
+    for obj in objs:
+        db.refresh(obj)
+
+
+def async_variant(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Async twin of a crud function, taking an `AsyncSession`. The function
+    runs unchanged on the sync side of the session, whose queries go through
+    the async driver without a thread, so each query has one implementation.
+    """
+
+    @functools.wraps(fn)
+    async def run(db: AsyncSession, *args: Any, **kwargs: Any) -> T:
+        return await db.run_sync(fn, *args, **kwargs)
+
+    return run
@@ -1,8 +1,11 @@
 from typing import Any, Dict, Optional, Union
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash, verify_password
+from app.crud.pagination import Page, TotalMode, paginate
+
+from app.core.security import get_password_hash, verify_and_update_password
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
@@ -15,16 +18,34 @@ def get_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def get_multi(db: Session, *, skip: int = 0, limit: int = 100):
-    users = db.query(User).offset(skip).limit(limit).all()
-    total = db.query(User).count()
-    return users, total
+def get_multi(
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Page:
+    return paginate(
+        db.query(User),
+        keys=[User.id],
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        total_mode=total_mode,
+    )
 
 
-def create(db: Session, *, obj_in: UserCreate) -> User:
+def create(
+    db: Session, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+) -> User:
+    """
+    `hashed_password` is the hash of `obj_in.password` when the caller
+    already made it, off the event loop.
+    """
     db_obj = User(
         email=obj_in.email,
-        hashed_password=get_password_hash(obj_in.password),
+        hashed_password=hashed_password or get_password_hash(obj_in.password),
         full_name=obj_in.full_name,
         is_superuser=obj_in.is_superuser,
     )
@@ -60,12 +81,29 @@ def delete(db: Session, *, db_obj: User) -> User:
     return db_obj
 
 
-def authenticate(db: Session, *, email: str, password: str) -> Optional[User]:
-    user = get_by_email(db, email=email)
+def _set_hashed_password(db: Session, user: User, hashed_password: str) -> None:
+    user.hashed_password = hashed_password
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+
+
+async def authenticate(
+    db: AsyncSession, *, email: str, password: str
+) -> Optional[User]:
+    """
+    The user with this email and password. The password is checked on the
+    hashing threads and its hash is upgraded if it was made with other
+    rounds than `PASSWORD_HASH_ROUNDS`.
+    """
+    user = await db.run_sync(get_by_email, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        await db.run_sync(_set_hashed_password, user, new_hash)
     return user
 
 
@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 
 from app.api.v1.api import api_router
+from app.core import events, metrics
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import async_engine, async_read_engine, engine, Base
+from app.core.replica import track_writes
+from app.crud.pagination import InvalidCursor
+from app.services.background_tasks import get_scheduler
 
 # Uncomment to create tables on startup (consider using Alembic instead)
 Base.metadata.create_all(bind=engine)
@@ -13,7 +18,17 @@ Base.metadata.create_all(bind=engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Server is starting up!")
+    scheduler = get_scheduler() if settings.BACKGROUND_TASKS_ENABLED else None
+    if scheduler:
+        scheduler.start()
+    events.start_relay(engine, settings.EVENT_RELAY_DATABASE_URI)
     yield
+    events.stop_relay()
+    if scheduler:
+        scheduler.shutdown()
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
     print("Server is shutting down!")
 
 
@@ -37,10 +52,20 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Tells the client the time of its last write, see `app.core.replica`
+app.middleware("http")(track_writes)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)}
+    )
+
+
 @app.get("/")
 async def root():
     return {
@@ -55,6 +80,11 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     from app.core.database import run_migrations
@@ -3,7 +3,10 @@ from app.models.asset_type import AssetType
 from app.models.asset import Asset
 from app.models.currency import Currency
 from app.models.exchange_rate import ExchangeRate
+from app.models.exchange_rate_rollup import ExchangeRateRollup
 from app.models.market_data import MarketData, TimeFrame
-from app.models.portfolio import Portfolio
+from app.models.portfolio import Portfolio, CostBasisMethod
+from app.models.portfolio_lot import PortfolioLot
+from app.models.portfolio_snapshot import PortfolioSnapshot
 from app.models.portfolio_holdings import PortfolioHolding
 from app.models.user import User
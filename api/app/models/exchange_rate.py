@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    DateTime,
+    Boolean,
+    Index,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,6 +16,12 @@ from app.core.database import Base
 
 class ExchangeRate(Base):
     __tablename__ = "exchange_rates"
+    # Range partitioned by month on Postgres, see services.retention.partitions
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index("ix_exchange_rates_effective_date_id", "effective_date", "id"),
+        {"info": {"partition_by": "effective_date"}},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     rate = Column(Float, nullable=False, default=0)
@@ -0,0 +1,53 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    Float,
+    ForeignKey,
+    DateTime,
+    Enum,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+from app.models.market_data import TimeFrame
+
+
+class ExchangeRateRollup(Base):
+    """
+    OHLC rollup of `exchange_rates` for a currency pair, one row per bucket.
+    Hourly buckets are built from the raw rates and daily buckets from the
+    hourly ones, so both survive the pruning of the raw table.
+    """
+
+    __tablename__ = "exchange_rate_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "source_currency_id",
+            "target_currency_id",
+            "timeframe",
+            "bucket_start",
+            name="uq_exchange_rate_rollups_pair_bucket",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    timeframe = Column(Enum(TimeFrame), nullable=False, index=True)
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    open_rate = Column(Float, nullable=False, default=0)
+    high_rate = Column(Float, nullable=False, default=0)
+    low_rate = Column(Float, nullable=False, default=0)
+    close_rate = Column(Float, nullable=False, default=0)
+    sample_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Foreign keys
+    source_currency_id = Column(Integer, ForeignKey("currencies.id"))
+    target_currency_id = Column(Integer, ForeignKey("currencies.id"))
+
+    # Relationships
+    source_currency = relationship("Currency", foreign_keys=[source_currency_id])
+    target_currency = relationship("Currency", foreign_keys=[target_currency_id])
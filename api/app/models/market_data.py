@@ -10,6 +10,7 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import timedelta
 import enum
 
 from app.core.database import Base
@@ -25,9 +26,27 @@ class TimeFrame(str, enum.Enum):
     ONE_DAY = "1d"
     ONE_WEEK = "1w"
 
+    @property
+    def duration(self) -> timedelta:
+        return _TIMEFRAME_DURATIONS[self]
+
+
+_TIMEFRAME_DURATIONS = {
+    TimeFrame.ONE_MINUTE: timedelta(minutes=1),
+    TimeFrame.FIVE_MINUTES: timedelta(minutes=5),
+    TimeFrame.FIFTEEN_MINUTES: timedelta(minutes=15),
+    TimeFrame.THIRTY_MINUTES: timedelta(minutes=30),
+    TimeFrame.ONE_HOUR: timedelta(hours=1),
+    TimeFrame.FOUR_HOURS: timedelta(hours=4),
+    TimeFrame.ONE_DAY: timedelta(days=1),
+    TimeFrame.ONE_WEEK: timedelta(weeks=1),
+}
+
 
 class MarketData(Base):
     __tablename__ = "market_data"
+    # Range partitioned by month on Postgres, see services.retention.partitions
+    __table_args__ = {"info": {"partition_by": "date_time"}}
 
     id = Column(Integer, primary_key=True, index=True)
     date_time = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,10 +1,25 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    DateTime,
+    Boolean,
+    Enum,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import enum
 
 from app.core.database import Base
 
 
+class CostBasisMethod(str, enum.Enum):
+    AVERAGE = "average"
+    FIFO = "fifo"
+
+
 class Portfolio(Base):
     __tablename__ = "portfolios"
 
@@ -12,11 +27,23 @@ class Portfolio(Base):
     name = Column(String, index=True, nullable=False)
     description = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    cost_basis_method = Column(
+        Enum(CostBasisMethod),
+        nullable=False,
+        default=CostBasisMethod.AVERAGE,
+        server_default=CostBasisMethod.AVERAGE.name,
+    )
+    # Latest value in the base currency, written by the bulk revaluation job
+    total_value = Column(Float, nullable=True)
+    valued_at = Column(DateTime(timezone=True), nullable=True)
+    # Id of the last transaction applied to the holdings, see
+    # `services.valuation.projection`
+    holdings_checkpoint = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Foreign keys
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     base_currency_id = Column(Integer, ForeignKey("currencies.id"))
 
     # Relationships
@@ -25,3 +52,12 @@ class Portfolio(Base):
     holdings = relationship(
         "PortfolioHolding", back_populates="portfolio", cascade="all, delete-orphan"
     )
+    lots = relationship(
+        "PortfolioLot", back_populates="portfolio", cascade="all, delete-orphan"
+    )
+    snapshots = relationship(
+        "PortfolioSnapshot",
+        back_populates="portfolio",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
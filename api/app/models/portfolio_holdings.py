@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,10 +7,20 @@ from app.core.database import Base
 
 class PortfolioHolding(Base):
     __tablename__ = "portfolio_holdings"
+    __table_args__ = (
+        UniqueConstraint(
+            "portfolio_id", "asset_id", name="uq_portfolio_holdings_asset"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     quantity = Column(Float, nullable=False, default=1.0)
     avg_purchase_price = Column(Float, nullable=False, default=0.0)
+    # Cost of the remaining quantity and PnL of the quantity sold, both in the
+    # portfolio's base currency. A null cost basis is unknown, e.g. after a
+    # buy whose price could not be converted
+    cost_basis = Column(Float, nullable=True, default=0.0)
+    realized_pnl = Column(Float, nullable=False, default=0.0, server_default="0")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
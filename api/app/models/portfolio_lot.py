@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class PortfolioLot(Base):
+    """
+    A buy that is still (partly) held, for FIFO cost basis. Sales consume the
+    open lots of a holding oldest first.
+    """
+
+    __tablename__ = "portfolio_lots"
+    __table_args__ = (
+        Index(
+            "ix_portfolio_lots_open",
+            "portfolio_id",
+            "asset_id",
+            "acquired_at",
+            "id",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    quantity = Column(Float, nullable=False)
+    remaining_quantity = Column(Float, nullable=False)
+    # Cost per unit in the portfolio's base currency, null if unknown
+    cost_each = Column(Float, nullable=True)
+    acquired_at = Column(DateTime(timezone=True), nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Foreign keys
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    transaction_id = Column(
+        Integer, ForeignKey("portfolio_transactions.id", ondelete="CASCADE")
+    )
+
+    # Relationships
+    portfolio = relationship("Portfolio", back_populates="lots")
+    asset = relationship("Asset")
+    transaction = relationship("PortfolioTransaction")
@@ -0,0 +1,43 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    Float,
+    ForeignKey,
+    DateTime,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class PortfolioSnapshot(Base):
+    """
+    Value of a portfolio in its base currency at the end of a day, labelled
+    by the start of that day.
+    """
+
+    __tablename__ = "portfolio_snapshots"
+    __table_args__ = (
+        UniqueConstraint(
+            "portfolio_id", "bucket_start", name="uq_portfolio_snapshots_day"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Null when a held asset had no rate to the base currency yet
+    total_value = Column(Float, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Foreign keys
+    portfolio_id = Column(
+        Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False
+    )
+    base_currency_id = Column(Integer, ForeignKey("currencies.id"))
+
+    # Relationships
+    portfolio = relationship("Portfolio", back_populates="snapshots")
+    base_currency = relationship("Currency")
@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    DateTime,
+    Enum,
+    Index,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -13,6 +22,19 @@ class TransactionType(str, enum.Enum):
 
 class PortfolioTransaction(Base):
     __tablename__ = "portfolio_transactions"
+    __table_args__ = (
+        # Transactions of a portfolio after its holdings checkpoint
+        Index("ix_portfolio_transactions_portfolio_id_id", "portfolio_id", "id"),
+        # Keyset pagination, newest first
+        Index("ix_portfolio_transactions_date_id", "transaction_date", "id"),
+        # Keyset pagination of the transactions of a portfolio or user
+        Index(
+            "ix_portfolio_transactions_portfolio_id_date_id",
+            "portfolio_id",
+            "transaction_date",
+            "id",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     transaction_type = Column(Enum(TransactionType), nullable=False)
@@ -20,6 +42,10 @@ class PortfolioTransaction(Base):
         Float, nullable=False
     )  # quantity of asset without conversion, eg. 0.005 BTC or 10 dollars...
     price_each = Column(Float, nullable=False)
+    # Price in the portfolio's base currency at the rate of the transaction
+    # date, stored the first time the transaction is costed so a replay
+    # reproduces the same cost basis
+    base_price_each = Column(Float, nullable=True)
     notes = Column(String, nullable=True)
 
     transaction_date = Column(DateTime(timezone=True), server_default=func.now())
@@ -27,6 +53,7 @@ class PortfolioTransaction(Base):
 
     # Foreign keys
     price_currency_id = Column(Integer, ForeignKey("currencies.id"))
+    base_currency_id = Column(Integer, ForeignKey("currencies.id"), nullable=True)
     portfolio_id = Column(Integer, ForeignKey("portfolios.id"))
     asset_id = Column(Integer, ForeignKey("assets.id"))
 
@@ -34,3 +61,4 @@ class PortfolioTransaction(Base):
     portfolio = relationship("Portfolio", foreign_keys=[portfolio_id])
     asset = relationship("Asset", foreign_keys=[asset_id])
     price_currency = relationship("Currency", foreign_keys=[price_currency_id])
+    base_currency = relationship("Currency", foreign_keys=[base_currency_id])
@@ -9,6 +9,7 @@ from app.schemas.portfolio_transaction import (
     PortfolioTransactionUpdate,
     PortfolioTransactionInDB,
     PortfolioTransactionList,
+    PortfolioTransactionImport,
 )
 from app.schemas.asset_type import AssetTypeList
 from app.schemas.currency import CurrencyList
@@ -17,6 +18,13 @@ from app.schemas.portfolio import (
     Portfolio,
     PortfolioUpdate,
     PortfolioInDBBase,
+    PortfolioSummary,
+    PortfolioHistory,
+    PortfolioPnL,
+    ConsolidatedPortfolio,
+    PortfolioRevaluationJob,
+    PortfolioHoldingsRebuild,
+    PortfolioRisk,
 )
 from app.schemas.portfolio_holding import (
     PortfolioHolding,
@@ -24,4 +32,10 @@ from app.schemas.portfolio_holding import (
     PortfolioHoldingCreate,
     PortfolioHoldingInDBBase,
 )
-from app.schemas.exchange_rate import ExchangeRateBase, ExchangeRateCreate
+from app.schemas.exchange_rate import (
+    ExchangeRate,
+    ExchangeRateBase,
+    ExchangeRateCreate,
+    ExchangeRateList,
+    ExchangeRateHistory,
+)
@@ -55,4 +55,8 @@ class AssetInDB(AssetInDBBase):
 # Properties to return for multiple assets
 class AssetList(BaseModel):
     result: List[Asset]
-    total: int
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
@@ -32,4 +32,8 @@ class AssetTypeInDB(AssetTypeInDBBase):
 # Properties to return for multiple assets
 class AssetTypeList(BaseModel):
     result: List[AssetType]
-    total: int
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
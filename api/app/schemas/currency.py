@@ -34,4 +34,8 @@ class CurrencyInDB(CurrencyInDBBase):
 # Properties to return for multiple assets
 class CurrencyList(BaseModel):
     result: List[Currency]
-    total: int
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
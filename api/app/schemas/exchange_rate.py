@@ -1,6 +1,9 @@
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
+from app.models.market_data import TimeFrame
+
 
 # Shared properties
 class ExchangeRateBase(BaseModel):
@@ -11,3 +14,44 @@ class ExchangeRateBase(BaseModel):
 class ExchangeRateCreate(ExchangeRateBase):
     source_currency_id: int
     target_currency_id: int
+
+
+# Properties shared by models stored in DB
+class ExchangeRateInDBBase(ExchangeRateCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Properties to return via API
+class ExchangeRate(ExchangeRateInDBBase):
+    pass
+
+
+# Properties to return for multiple exchange rates
+class ExchangeRateList(BaseModel):
+    result: List[ExchangeRate]
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+# One OHLC bucket of a currency pair's history
+class ExchangeRateCandle(BaseModel):
+    bucket_start: datetime
+    open_rate: float
+    high_rate: float
+    low_rate: float
+    close_rate: float
+    sample_count: int
+
+
+class ExchangeRateHistory(BaseModel):
+    source_currency_id: int
+    target_currency_id: int
+    timeframe: TimeFrame
+    result: List[ExchangeRateCandle]
@@ -2,6 +2,9 @@ from typing import Optional, List
 from datetime import datetime
 from pydantic import BaseModel
 
+from app.models.market_data import TimeFrame
+from app.models.portfolio import CostBasisMethod
+
 
 # Shared properties
 class PortfolioBase(BaseModel):
@@ -9,12 +12,15 @@ class PortfolioBase(BaseModel):
     description: Optional[str] = None
     is_active: bool
     base_currency_id: int
+    cost_basis_method: CostBasisMethod = CostBasisMethod.AVERAGE
 
 
 # Properties shared by models stored in DB
 class PortfolioInDBBase(PortfolioBase):
     id: int
     user_id: int
+    total_value: Optional[float] = None
+    valued_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -28,6 +34,7 @@ class PortfolioUpdate(BaseModel):
     description: Optional[str] = None
     is_active: Optional[bool] = None
     base_currency_id: Optional[int] = None
+    cost_basis_method: Optional[CostBasisMethod] = None
 
 
 # Properties to return via API
@@ -43,4 +50,144 @@ class PortfolioInDB(PortfolioInDBBase):
 # Properties to return for multiple assets
 class PortfolioList(BaseModel):
     result: List[PortfolioInDB]
-    total: int
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+class PortfolioAllocation(BaseModel):
+    asset_type_id: int
+    asset_type_name: Optional[str] = None
+    value: float
+    weight: Optional[float] = None
+
+
+# Portfolio value in its base currency, with the change since the previous
+# valuation
+class PortfolioSummary(BaseModel):
+    portfolio_id: int
+    base_currency_id: int
+    total_value: float
+    holdings_count: int
+    unpriced_holdings_count: int
+    allocation: List[PortfolioAllocation]
+    valued_at: datetime
+    previous_total_value: Optional[float] = None
+    previous_valued_at: Optional[datetime] = None
+    change: Optional[float] = None
+    change_percent: Optional[float] = None
+
+
+class PortfolioValuePoint(BaseModel):
+    bucket_start: datetime
+    value: Optional[float] = None
+
+
+# Portfolio value over time in its base currency
+class PortfolioHistory(BaseModel):
+    portfolio_id: int
+    base_currency_id: int
+    timeframe: TimeFrame
+    result: List[PortfolioValuePoint]
+
+
+class HoldingPnL(BaseModel):
+    holding_id: int
+    asset_id: int
+    quantity: float
+    avg_purchase_price: float
+    cost_basis: Optional[float] = None
+    market_value: Optional[float] = None
+    realized_pnl: float
+    unrealized_pnl: Optional[float] = None
+
+
+# Cost basis and PnL in the portfolio's base currency. Totals are null when
+# any holding's figure is unknown
+class PortfolioPnL(BaseModel):
+    portfolio_id: int
+    base_currency_id: int
+    cost_basis_method: CostBasisMethod
+    cost_basis: Optional[float] = None
+    market_value: Optional[float] = None
+    realized_pnl: Optional[float] = None
+    unrealized_pnl: Optional[float] = None
+    holdings: List[HoldingPnL]
+
+
+class ConsolidatedAsset(BaseModel):
+    asset_id: int
+    asset_type_id: int
+    currency_id: int
+    quantity: float
+    value: Optional[float] = None
+    weight: Optional[float] = None
+    portfolios_count: int
+
+
+# Every holding of a user across their portfolios, in their preferred
+# currency
+class ConsolidatedPortfolio(BaseModel):
+    currency_id: int
+    total_value: float
+    portfolios_count: int
+    holdings_count: int
+    unpriced_holdings_count: int
+    assets: List[ConsolidatedAsset]
+    allocation: List[PortfolioAllocation]
+
+
+class PortfolioRevaluationJob(BaseModel):
+    id: str
+    status: str
+    workers: int
+    chunk_size: int
+    total: int = 0
+    done: int = 0
+    written: int = 0
+    progress: Optional[float] = None
+    throughput: Optional[float] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class PortfolioHoldingsRebuild(BaseModel):
+    portfolios: int
+    transactions: int
+    holdings: int
+    replayed: int
+
+
+class AssetRisk(BaseModel):
+    asset_id: int
+    weight: float
+    volatility: float
+    max_drawdown: float
+
+
+# Risk of the current holdings over a window of market data. `correlation`
+# is aligned with `asset_ids`
+class PortfolioRisk(BaseModel):
+    portfolio_id: int
+    base_currency_id: int
+    timeframe: TimeFrame
+    window: int
+    confidence: float
+    observations: int
+    coverage: Optional[float] = None
+    volatility: Optional[float] = None
+    var: Optional[float] = None
+    cvar: Optional[float] = None
+    var_amount: Optional[float] = None
+    cvar_amount: Optional[float] = None
+    max_drawdown: Optional[float] = None
+    asset_ids: List[int]
+    missing_asset_ids: List[int]
+    correlation: List[List[Optional[float]]]
+    assets: List[AssetRisk]
@@ -16,6 +16,8 @@ class PortfolioHoldingInDBBase(PortfolioHoldingBase):
     id: int
     portfolio_id: int
     avg_purchase_price: float
+    cost_basis: Optional[float] = None
+    realized_pnl: float = 0.0
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -40,7 +42,11 @@ class PortfolioHolding(PortfolioHoldingBase):
     id: int
     asset: Asset
     avg_purchase_price: float
+    cost_basis: Optional[float] = None
+    realized_pnl: float = 0.0
     total_value: Optional[float] = None
+    unrealized_pnl: Optional[float] = None
+    weight: Optional[float] = None
 
 
 # Properties properties stored in DB
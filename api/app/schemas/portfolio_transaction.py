@@ -58,4 +58,22 @@ class PortfolioTransactionInDB(PortfolioTransactionInDBBase):
 # Properties to return for multiple
 class PortfolioTransactionList(BaseModel):
     result: List[PortfolioTransaction]
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+class PortfolioTransactionImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+# Outcome of a bulk import, `row` counts data rows from 1
+class PortfolioTransactionImport(BaseModel):
     total: int
+    imported: int
+    failed: int
+    holdings_updated: int
+    errors: List[PortfolioTransactionImportError]
@@ -40,7 +40,11 @@ class User(UserBase):
 
 class UserListResponse(BaseModel):
     result: List[User]
-    total: int
+    # Null when the list was requested with `total=none`
+    total: Optional[int]
+    # Pass as `cursor` for the next page, null on the last one
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 
 # Properties properties stored in DB
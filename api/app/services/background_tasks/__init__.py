@@ -1,7 +1,16 @@
+from datetime import datetime, timezone
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from app.services.market_data.NobitexAPI import NobitexAPI
+from app.services.retention.exchange_rates import run_retention
+from app.services.retention.market_data import prune_market_data
+from app.services.retention.partitions import ensure_partitions
+from app.services.valuation.projection import catch_up_all
+from app.services.valuation.snapshots import take_snapshots
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app import crud, schemas
 
@@ -34,13 +43,61 @@ def get_crypto_prices():
             crud.exchange_rate.create(db, obj_in=obj)
 
 
+def rollup_exchange_rates():
+    with SessionLocal() as db:
+        run_retention(db)
+
+
+def maintain_partitions():
+    with SessionLocal() as db:
+        ensure_partitions(db)
+        prune_market_data(db)
+
+
+def snapshot_portfolios():
+    with SessionLocal() as db:
+        take_snapshots(db)
+
+
+def catch_up_holdings():
+    with SessionLocal() as db:
+        catch_up_all(db)
+
+
 def get_scheduler():
     scheduler = BackgroundScheduler()
 
+    if settings.CRYPTO_PRICE_FETCH_ENABLED:
+        scheduler.add_job(
+            func=get_crypto_prices,
+            trigger=IntervalTrigger(minutes=10),
+            id=f"crypto_nobitex_1",
+            replace_existing=True,
+        )
+    scheduler.add_job(
+        func=rollup_exchange_rates,
+        trigger=IntervalTrigger(minutes=settings.EXCHANGE_RATE_ROLLUP_INTERVAL_MINUTES),
+        id="exchange_rate_rollup",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        func=maintain_partitions,
+        trigger=IntervalTrigger(hours=12),
+        id="table_partitions",
+        replace_existing=True,
+    )
+    # Runs once on startup to backfill missed days, then after every midnight
+    scheduler.add_job(
+        func=snapshot_portfolios,
+        trigger=CronTrigger(hour=0, minute=5, timezone=timezone.utc),
+        next_run_time=datetime.now(timezone.utc),
+        id="portfolio_snapshots",
+        replace_existing=True,
+    )
     scheduler.add_job(
-        func=get_crypto_prices,
-        trigger=IntervalTrigger(minutes=10),
-        id=f"crypto_nobitex_1",
+        func=catch_up_holdings,
+        trigger=IntervalTrigger(minutes=5),
+        id="holdings_catch_up",
         replace_existing=True,
     )
 
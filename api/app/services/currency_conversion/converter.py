@@ -0,0 +1,362 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import exchange_rate as crud_exchange_rate
+from app.models.currency import Currency
+from app.models.exchange_rate import ExchangeRate
+from app.services.logger import logger
+
+# A refresh that finds more new rates than this rebuilds from scratch instead
+REFRESH_BATCH_SIZE = 10000
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return -np.inf
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CurrencyConverter:
+    """
+    Any-to-any currency conversion over the latest exchange rates.
+
+    Keeps a dense matrix of direct rates between all currencies (a quoted
+    rate also gives the inverse edge unless that pair is quoted itself) and
+    the all-pairs shortest paths through it, measured in hops. The rate of a
+    path is the product of its rates, so every conversion is a matrix lookup
+    once the paths are built, and a directly quoted pair converts at exactly
+    its stored rate.
+
+    New rates update a single edge: an existing edge only re-multiplies the
+    path rates, a new edge relaxes the path matrices through it in O(n^2).
+    The process-wide instance is `currency_converter`; call `ensure_fresh`
+    before reading to pick up rates written by other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._refreshed_at = 0.0
+        self._last_rate_id = 0
+        self._reset([])
+
+    def __getstate__(self) -> dict:
+        # Pickled as a read-only copy of the matrices, e.g. for worker
+        # processes; the lock is recreated on the other side
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _reset(self, currency_ids: List[int]) -> None:
+        n = len(currency_ids)
+        self._ids = np.array(currency_ids, dtype=np.int64)
+        self._index: Dict[int, int] = {cid: i for i, cid in enumerate(currency_ids)}
+        # Dense id -> index lookup for vectorized conversions
+        self._lookup = np.full(max(currency_ids, default=0) + 1, -1, dtype=np.int64)
+        self._lookup[self._ids] = np.arange(n)
+        # Direct edges: rate, whether the rate was quoted (not inverted) and
+        # the effective date it was quoted at
+        self._edge_rate = np.full((n, n), np.nan)
+        self._edge_quoted = np.zeros((n, n), dtype=bool)
+        self._edge_date = np.full((n, n), -np.inf)
+        # Shortest paths: hop count, next hop and rate along the path
+        self._hops = np.full((n, n), np.inf)
+        self._next = np.full((n, n), -1, dtype=np.int64)
+        self._path_rate = np.full((n, n), np.nan)
+        np.fill_diagonal(self._hops, 0)
+        np.fill_diagonal(self._next, np.arange(n))
+        np.fill_diagonal(self._path_rate, 1)
+
+    def load(self, db: Session) -> None:
+        """
+        Rebuild the matrices from the latest rate of every currency pair.
+        """
+        currency_ids = [row[0] for row in db.query(Currency.id).order_by(Currency.id)]
+        last_rate_id = db.query(func.max(ExchangeRate.id)).scalar() or 0
+        rates = crud_exchange_rate.get_latest_rates(db)
+
+        with self._lock:
+            self._reset(currency_ids)
+            for rate in rates:
+                self._set_edge(
+                    rate.source_currency_id,
+                    rate.target_currency_id,
+                    rate.rate,
+                    rate.effective_date,
+                )
+            self._build_paths()
+            self._last_rate_id = last_rate_id
+            self._loaded = True
+            self._refreshed_at = time.monotonic()
+
+        logger.info(
+            f"Currency converter loaded {len(currency_ids)} currencies, "
+            f"{len(rates)} pairs"
+        )
+
+    def refresh(self, db: Session) -> None:
+        """
+        Apply the rates created since the last load or refresh.
+        """
+        if not self._loaded:
+            self.load(db)
+            return
+
+        rates = crud_exchange_rate.get_created_since(
+            db, last_id=self._last_rate_id, limit=REFRESH_BATCH_SIZE
+        )
+        unknown = {
+            cid
+            for rate in rates
+            for cid in (rate.source_currency_id, rate.target_currency_id)
+            if cid not in self._index
+        }
+        if unknown or len(rates) >= REFRESH_BATCH_SIZE:
+            self.load(db)
+            return
+
+        with self._lock:
+            self._apply_rates(rates)
+            if rates:
+                self._last_rate_id = max(self._last_rate_id, rates[-1].id)
+            self._refreshed_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session) -> "CurrencyConverter":
+        """
+        Refresh from the database if the last refresh is older than
+        `CURRENCY_CONVERSION_REFRESH_SECONDS`.
+        """
+        age = time.monotonic() - self._refreshed_at
+        if not self._loaded or age > settings.CURRENCY_CONVERSION_REFRESH_SECONDS:
+            self.refresh(db)
+        return self
+
+    def _set_edge(
+        self,
+        source_currency_id: int,
+        target_currency_id: int,
+        rate: Optional[float],
+        effective_date: Optional[datetime],
+    ) -> Optional[bool]:
+        """
+        Store a quoted rate and its derived inverse.
+
+        Returns:
+            Optional[bool]: None if the rate was ignored, True if it added a
+                            new edge to the graph, False if it only changed
+                            the weight of existing edges
+        """
+        i = self._index.get(source_currency_id)
+        j = self._index.get(target_currency_id)
+        if i is None or j is None or i == j or not rate or rate <= 0:
+            return None
+
+        date = _timestamp(effective_date)
+        if self._edge_quoted[i, j] and date < self._edge_date[i, j]:
+            return None
+
+        added = np.isnan(self._edge_rate[i, j]) or np.isnan(self._edge_rate[j, i])
+        self._edge_rate[i, j] = rate
+        self._edge_quoted[i, j] = True
+        self._edge_date[i, j] = date
+        if not self._edge_quoted[j, i]:
+            self._edge_rate[j, i] = 1 / rate
+            self._edge_date[j, i] = date
+        return bool(added)
+
+    def _apply_rates(self, rates: Iterable[ExchangeRate]) -> bool:
+        """
+        Apply rates edge by edge, then re-multiply the paths once.
+
+        Returns:
+            bool: True if any rate added a new edge
+        """
+        changed = added = False
+        for rate in rates:
+            result = self._set_edge(
+                rate.source_currency_id,
+                rate.target_currency_id,
+                rate.rate,
+                rate.effective_date,
+            )
+            if result is None:
+                continue
+            changed = True
+            if result:
+                added = True
+                i = self._index[rate.source_currency_id]
+                j = self._index[rate.target_currency_id]
+                self._add_edge_paths(i, j)
+                self._add_edge_paths(j, i)
+        if changed:
+            self._multiply_paths()
+        return added
+
+    def _build_paths(self) -> None:
+        """
+        Floyd-Warshall over hop counts, vectorized per intermediate node.
+        """
+        n = len(self._ids)
+        edges = ~np.isnan(self._edge_rate)
+        hops = np.where(edges, 1.0, np.inf)
+        nxt = np.where(edges, np.arange(n)[None, :], -1)
+        np.fill_diagonal(hops, 0)
+        np.fill_diagonal(nxt, np.arange(n))
+
+        for k in range(n):
+            via = hops[:, k, None] + hops[None, k, :]
+            better = via < hops
+            hops = np.where(better, via, hops)
+            nxt = np.where(better, nxt[:, k, None], nxt)
+
+        self._hops = hops
+        self._next = nxt
+        self._multiply_paths()
+
+    def _add_edge_paths(self, i: int, j: int) -> None:
+        """
+        Relax every path through a newly added edge i -> j.
+        """
+        via = self._hops[:, i, None] + 1 + self._hops[None, j, :]
+        better = via < self._hops
+        if not better.any():
+            return
+        first = self._next[:, i].copy()
+        first[i] = j
+        self._hops = np.where(better, via, self._hops)
+        self._next = np.where(better, first[:, None], self._next)
+
+    def _multiply_paths(self) -> None:
+        """
+        Multiply the rates along every shortest path, one hop at a time for
+        all pairs at once.
+        """
+        n = len(self._ids)
+        reachable = np.isfinite(self._hops)
+        target = np.broadcast_to(np.arange(n)[None, :], (n, n))
+        current = np.broadcast_to(np.arange(n)[:, None], (n, n)).copy()
+        path_rate = np.ones((n, n))
+
+        active = reachable & (current != target)
+        while active.any():
+            step = self._next[current[active], target[active]]
+            path_rate[active] *= self._edge_rate[current[active], step]
+            current[active] = step
+            active = reachable & (current != target)
+
+        path_rate[~reachable] = np.nan
+        self._path_rate = path_rate
+
+    def update_rate(
+        self,
+        *,
+        source_currency_id: int,
+        target_currency_id: int,
+        rate: float,
+        effective_date: Optional[datetime] = None,
+    ) -> bool:
+        """
+        Apply a single new rate.
+
+        Returns:
+            bool: True if the rate added a new edge, which can reroute
+                  conversions between other currencies as well
+        """
+        with self._lock:
+            result = self._set_edge(
+                source_currency_id, target_currency_id, rate, effective_date
+            )
+            if result is None:
+                return False
+            if result:
+                i = self._index[source_currency_id]
+                j = self._index[target_currency_id]
+                self._add_edge_paths(i, j)
+                self._add_edge_paths(j, i)
+            self._multiply_paths()
+            return result
+
+    def _indices(self, currency_ids: np.ndarray) -> np.ndarray:
+        inside = (currency_ids >= 0) & (currency_ids < len(self._lookup))
+        indices = np.full(currency_ids.shape, -1, dtype=np.int64)
+        indices[inside] = self._lookup[currency_ids[inside]]
+        return indices
+
+    def get_rates(
+        self,
+        source_currency_ids: Union[int, Sequence[int], np.ndarray],
+        target_currency_ids: Union[int, Sequence[int], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Conversion rates for aligned (or broadcastable) arrays of source and
+        target currencies, NaN where no path exists.
+        """
+        sources = np.asarray(source_currency_ids, dtype=np.int64)
+        targets = np.asarray(target_currency_ids, dtype=np.int64)
+        sources, targets = np.broadcast_arrays(sources, targets)
+
+        with self._lock:
+            i = self._indices(sources)
+            j = self._indices(targets)
+            known = (i >= 0) & (j >= 0)
+            rates = np.full(sources.shape, np.nan)
+            rates[known] = self._path_rate[i[known], j[known]]
+
+        rates[sources == targets] = 1
+        return rates
+
+    def get_rate(
+        self, *, source_currency_id: int, target_currency_id: int
+    ) -> Optional[float]:
+        rate = self.get_rates([source_currency_id], [target_currency_id])[0]
+        return None if np.isnan(rate) else float(rate)
+
+    def convert(
+        self,
+        amounts: Union[float, Sequence[float], np.ndarray],
+        source_currency_ids: Union[int, Sequence[int], np.ndarray],
+        target_currency_ids: Union[int, Sequence[int], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Convert an array of amounts in one vectorized call. Amounts without
+        a conversion path come back as NaN.
+        """
+        return np.asarray(amounts, dtype=float) * self.get_rates(
+            source_currency_ids, target_currency_ids
+        )
+
+    def path(self, *, source_currency_id: int, target_currency_id: int) -> List[int]:
+        """
+        Currency ids along the conversion path, both ends included, or an
+        empty list if the currencies are not connected.
+        """
+        if source_currency_id == target_currency_id:
+            return [source_currency_id]
+
+        with self._lock:
+            i = self._index.get(source_currency_id)
+            j = self._index.get(target_currency_id)
+            if i is None or j is None or not np.isfinite(self._hops[i, j]):
+                return []
+
+            path = [i]
+            while path[-1] != j:
+                path.append(int(self._next[path[-1], j]))
+            return [int(self._ids[k]) for k in path]
+
+
+currency_converter = CurrencyConverter()
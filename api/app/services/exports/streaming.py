@@ -0,0 +1,253 @@
+import csv
+import enum
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer
+from sqlalchemy.orm import Query, Session
+
+from app.core.database import SessionLocal
+from app.crud import portfolio_transaction as crud_portfolio_transaction
+from app.models.exchange_rate import ExchangeRate
+from app.models.portfolio import Portfolio
+from app.models.portfolio_holdings import PortfolioHolding
+from app.models.portfolio_transaction import PortfolioTransaction
+
+# Rows fetched from the server-side cursor and written at a time
+EXPORT_BATCH_SIZE = 5000
+
+TRANSACTION_COLUMNS = [
+    PortfolioTransaction.id,
+    PortfolioTransaction.portfolio_id,
+    PortfolioTransaction.asset_id,
+    PortfolioTransaction.transaction_type,
+    PortfolioTransaction.quantity,
+    PortfolioTransaction.price_each,
+    PortfolioTransaction.price_currency_id,
+    PortfolioTransaction.transaction_date,
+    PortfolioTransaction.notes,
+    PortfolioTransaction.created_at,
+]
+HOLDING_COLUMNS = [
+    PortfolioHolding.id,
+    PortfolioHolding.portfolio_id,
+    PortfolioHolding.asset_id,
+    PortfolioHolding.quantity,
+    PortfolioHolding.avg_purchase_price,
+    PortfolioHolding.cost_basis,
+    PortfolioHolding.realized_pnl,
+    PortfolioHolding.updated_at,
+]
+EXCHANGE_RATE_COLUMNS = [
+    ExchangeRate.id,
+    ExchangeRate.source_currency_id,
+    ExchangeRate.target_currency_id,
+    ExchangeRate.rate,
+    ExchangeRate.effective_date,
+]
+
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    ARROW = "arrow"
+
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+FILE_EXTENSIONS = {
+    ExportFormat.CSV: "csv",
+    ExportFormat.NDJSON: "ndjson",
+    ExportFormat.ARROW: "arrows",
+}
+
+
+class ExportUnavailable(RuntimeError):
+    pass
+
+
+def transactions(
+    db: Session,
+    *,
+    user_id: Optional[int] = None,
+    portfolio_id: Optional[int] = None,
+    asset_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Query:
+    """
+    Transactions to export, filtered like the transaction list, by id.
+    """
+    return (
+        crud_portfolio_transaction.filter_multi(
+            db,
+            user_id=user_id,
+            portfolio_id=portfolio_id,
+            asset_id=asset_id,
+            start=start,
+            end=end,
+        )
+        .with_entities(*TRANSACTION_COLUMNS)
+        .order_by(PortfolioTransaction.id)
+    )
+
+
+def holdings(
+    db: Session,
+    *,
+    user_id: Optional[int] = None,
+    portfolio_ids: Optional[List[int]] = None,
+) -> Query:
+    """
+    Holdings to export, of the user's portfolios if `user_id` is given.
+    """
+    query = db.query(*HOLDING_COLUMNS)
+
+    if user_id is not None:
+        query = query.join(Portfolio, Portfolio.id == PortfolioHolding.portfolio_id)
+        query = query.filter(Portfolio.user_id == user_id)
+
+    if portfolio_ids:
+        query = query.filter(PortfolioHolding.portfolio_id.in_(portfolio_ids))
+
+    return query.order_by(PortfolioHolding.portfolio_id, PortfolioHolding.id)
+
+
+def exchange_rates(
+    db: Session,
+    *,
+    source_currency_id: Optional[int] = None,
+    target_currency_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Query:
+    """
+    Exchange rates to export, oldest first.
+    """
+    query = db.query(*EXCHANGE_RATE_COLUMNS)
+
+    if source_currency_id is not None:
+        query = query.filter(ExchangeRate.source_currency_id == source_currency_id)
+
+    if target_currency_id is not None:
+        query = query.filter(ExchangeRate.target_currency_id == target_currency_id)
+
+    if start is not None:
+        query = query.filter(ExchangeRate.effective_date >= start)
+
+    if end is not None:
+        query = query.filter(ExchangeRate.effective_date < end)
+
+    return query.order_by(ExchangeRate.effective_date, ExchangeRate.id)
+
+
+def _batches(query: Query) -> Iterator[Sequence[Any]]:
+    # A session of its own, the request's one is closed before or while the
+    # response body is sent
+    with SessionLocal() as db:
+        result = db.execute(
+            query.statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        yield from result.partitions()
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _csv(query: Query, names: List[str]) -> Iterator[bytes]:
+    # Only dates and enums need converting, the csv module writes the rest
+    converted = [
+        i
+        for i, description in enumerate(query.column_descriptions)
+        if isinstance(description["type"], (DateTime, Enum))
+    ]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in _batches(query):
+        rows = [list(row) for row in batch]
+        for row in rows:
+            for i in converted:
+                row[i] = _plain(row[i])
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(query: Query, names: List[str]) -> Iterator[bytes]:
+    for batch in _batches(query):
+        yield "".join(
+            json.dumps(dict(zip(names, row)), default=_plain) + "\n" for row in batch
+        ).encode()
+
+
+def _arrow_type(pa: Any, column_type: Any) -> Any:
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    return pa.string()
+
+
+def _arrow(pa: Any, query: Query) -> Iterator[bytes]:
+    schema = pa.schema(
+        (description["name"], _arrow_type(pa, description["type"]))
+        for description in query.column_descriptions
+    )
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in _batches(query):
+            writer.write_batch(
+                pa.record_batch(
+                    [
+                        pa.array(values, type=field.type)
+                        for field, values in zip(schema, zip(*batch))
+                    ],
+                    schema=schema,
+                )
+            )
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End of stream marker
+    yield sink.getvalue()
+
+
+def stream_rows(query: Query, *, format: ExportFormat) -> Iterator[bytes]:
+    """
+    Encoded rows of a column query, streamed from a server-side cursor in
+    batches of `EXPORT_BATCH_SIZE`, so memory use does not depend on the row
+    count. The query runs in a session of its own when the stream is read.
+
+    Raises:
+        ExportUnavailable: For Arrow if pyarrow is not installed
+    """
+    names = [description["name"] for description in query.column_descriptions]
+    if format == ExportFormat.CSV:
+        return _csv(query, names)
+    if format == ExportFormat.NDJSON:
+        return _ndjson(query, names)
+
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise ExportUnavailable("Arrow export requires pyarrow")
+    return _arrow(pyarrow, query)
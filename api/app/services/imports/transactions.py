@@ -0,0 +1,282 @@
+import codecs
+import csv
+import enum
+import io
+import json
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.core import events
+from app.crud import portfolio as crud_portfolio
+from app.crud import portfolio_snapshot as crud_portfolio_snapshot
+from app.models.asset import Asset
+from app.models.currency import Currency
+from app.models.portfolio import Portfolio
+from app.models.portfolio_transaction import PortfolioTransaction
+from app.models.user import User
+from app.schemas.portfolio_transaction import PortfolioTransactionCreate
+from app.services.logger import logger
+from app.services.valuation.cost_basis import rebuild_holding
+from app.services.valuation.snapshots import day_start
+
+# Rows validated and inserted per database transaction
+IMPORT_CHUNK_SIZE = 5000
+
+# Bytes decoded at a time when checking the encoding of an upload
+READ_BLOCK_SIZE = 1 << 16
+
+MISSING = object()
+
+
+class ImportFormat(str, enum.Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+def check_encoding(stream: BinaryIO) -> None:
+    """
+    Decode a seekable upload once and rewind it, so that a file that is not
+    UTF-8 is rejected before any of its rows are committed.
+
+    Raises:
+        UnicodeDecodeError: If the file is not valid UTF-8
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b""):
+        decoder.decode(block)
+    decoder.decode(b"", final=True)
+    stream.seek(0)
+
+
+def read_rows(stream: BinaryIO, *, format: ImportFormat) -> Iterator[Any]:
+    """
+    Rows of an uploaded file as dicts, one at a time. A line that cannot be
+    parsed is yielded as the exception it raised.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if format == ImportFormat.CSV:
+        for row in csv.DictReader(text):
+            # Empty cells are missing values, not empty strings
+            yield {key: value or None for key, value in row.items() if key}
+        return
+
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else ValueError("Expected a JSON object")
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Tuple[int, Any]]]:
+    chunk = []
+    for number, row in enumerate(rows, start=1):
+        chunk.append((number, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TransactionImport:
+    """
+    Bulk import of portfolio transactions for one user.
+
+    Rows are validated and inserted in chunks, each chunk with one multi-row
+    insert and one commit. Referenced portfolios, assets and currencies are
+    checked with one query per chunk for the ids not seen before. Holdings
+    are rebuilt once per affected (portfolio, asset) after the last chunk,
+    instead of once per row.
+    """
+
+    def __init__(self, db: Session, *, user: User, portfolio_id: Optional[int] = None):
+        self.db = db
+        self.user = user
+        self.portfolio_id = portfolio_id
+        self.total = 0
+        self.imported = 0
+        self.errors: List[Dict[str, Any]] = []
+        # Owner of every referenced portfolio, MISSING if it does not exist
+        self._owners: Dict[int, Any] = {}
+        self._asset_ids: Dict[int, bool] = {}
+        self._currency_ids: Dict[int, bool] = {}
+        # Earliest imported transaction date per (portfolio, asset)
+        self._affected: Dict[Tuple[int, int], datetime] = {}
+
+    def _error(self, number: int, *messages: str) -> None:
+        self.errors.append({"row": number, "errors": list(messages)})
+
+    def _load_references(self, transactions: List[PortfolioTransactionCreate]) -> None:
+        portfolio_ids = {t.portfolio_id for t in transactions} - self._owners.keys()
+        if portfolio_ids:
+            self._owners.update(dict.fromkeys(portfolio_ids, MISSING))
+            self._owners.update(
+                self.db.query(Portfolio.id, Portfolio.user_id).filter(
+                    Portfolio.id.in_(portfolio_ids)
+                )
+            )
+
+        for model, known, ids in (
+            (Asset, self._asset_ids, {t.asset_id for t in transactions}),
+            (Currency, self._currency_ids, {t.price_currency_id for t in transactions}),
+        ):
+            ids -= known.keys()
+            if ids:
+                known.update(dict.fromkeys(ids, False))
+                known.update(
+                    (row[0], True)
+                    for row in self.db.query(model.id).filter(model.id.in_(ids))
+                )
+
+    def _check(self, transaction: PortfolioTransactionCreate) -> List[str]:
+        errors = []
+        owner = self._owners[transaction.portfolio_id]
+        if owner is MISSING:
+            errors.append("Portfolio not found")
+        elif owner != self.user.id and not self.user.is_superuser:
+            errors.append("Not enough permissions")
+        if not self._asset_ids[transaction.asset_id]:
+            errors.append("Asset not found")
+        if not self._currency_ids[transaction.price_currency_id]:
+            errors.append("Currency not found")
+        return errors
+
+    def _import_chunk(self, chunk: List[Tuple[int, Any]]) -> None:
+        validated = []
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                self._error(number, str(row))
+                continue
+            if self.portfolio_id is not None:
+                row.setdefault("portfolio_id", self.portfolio_id)
+            try:
+                validated.append(
+                    (number, PortfolioTransactionCreate.model_validate(row))
+                )
+            except ValidationError as e:
+                self._error(
+                    number,
+                    *(
+                        f"{'.'.join(str(part) for part in error['loc'])}: "
+                        f"{error['msg']}"
+                        for error in e.errors()
+                    ),
+                )
+
+        self._load_references([transaction for _, transaction in validated])
+        now = datetime.now(timezone.utc)
+        rows = []
+        for number, transaction in validated:
+            errors = self._check(transaction)
+            if errors:
+                self._error(number, *errors)
+                continue
+
+            row = transaction.model_dump()
+            date = row["transaction_date"] or now
+            row["transaction_date"] = date = date.replace(
+                tzinfo=date.tzinfo or timezone.utc
+            )
+            rows.append(row)
+            key = (transaction.portfolio_id, transaction.asset_id)
+            self._affected[key] = min(self._affected.get(key, date), date)
+
+        if rows:
+            self.db.execute(insert(PortfolioTransaction), rows)
+            self.db.commit()
+            self.imported += len(rows)
+
+    def _rebuild(self) -> None:
+        """
+        Replay the affected holdings and drop the daily snapshots from the
+        earliest imported day on, so the snapshot job rewrites them.
+
+        The holdings checkpoints are moved past the imported transactions
+        first, so the projector's catch-up does not apply them a second time.
+        """
+        portfolio_ids = {pid for pid, _ in self._affected}
+        portfolios = {
+            portfolio.id: portfolio
+            for portfolio in self.db.query(Portfolio).filter(
+                Portfolio.id.in_(portfolio_ids)
+            )
+        }
+        last_ids = (
+            self.db.query(
+                PortfolioTransaction.portfolio_id, func.max(PortfolioTransaction.id)
+            )
+            .filter(PortfolioTransaction.portfolio_id.in_(portfolio_ids))
+            .group_by(PortfolioTransaction.portfolio_id)
+            .order_by(PortfolioTransaction.portfolio_id)
+        )
+        for portfolio_id, transaction_id in last_ids:
+            crud_portfolio.advance_checkpoint(
+                self.db, portfolio_id=portfolio_id, transaction_id=transaction_id
+            )
+        since: Dict[int, datetime] = {}
+        for (portfolio_id, asset_id), date in self._affected.items():
+            rebuild_holding(
+                self.db, portfolio=portfolios[portfolio_id], asset_id=asset_id
+            )
+            since[portfolio_id] = min(since.get(portfolio_id, date), date)
+        for portfolio_id, date in since.items():
+            crud_portfolio_snapshot.delete_since(
+                self.db, portfolio_id=portfolio_id, since=day_start(date)
+            )
+            # The snapshots are already dropped in this transaction
+            events.publish_after_commit(
+                self.db, events.PORTFOLIO_CHANGED, portfolio_id=portfolio_id, since=None
+            )
+        self.db.commit()
+
+    def run(self, rows: Iterable[Any]) -> Dict[str, Any]:
+        for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+            self.total += len(chunk)
+            self._import_chunk(chunk)
+        self._rebuild()
+
+        logger.info(
+            f"Imported {self.imported}/{self.total} transactions for user "
+            f"{self.user.id}, {len(self._affected)} holdings rebuilt"
+        )
+        return {
+            "total": self.total,
+            "imported": self.imported,
+            "failed": len(self.errors),
+            "holdings_updated": len(self._affected),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
+
+
+def import_transactions(
+    db: Session,
+    *,
+    user: User,
+    stream: BinaryIO,
+    format: ImportFormat,
+    portfolio_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Import transactions from a CSV (with a header row) or JSON lines upload.
+    Each row has the fields of `PortfolioTransactionCreate`; `portfolio_id`
+    may be left out when a default is given.
+
+    Returns:
+        Dict[str, Any]: Row counts and the errors of every rejected row
+
+    Raises:
+        UnicodeDecodeError: If the file is not valid UTF-8, before anything
+                            is imported
+    """
+    check_encoding(stream)
+    return TransactionImport(db, user=user, portfolio_id=portfolio_id).run(
+        read_rows(stream, format=format)
+    )
@@ -0,0 +1,398 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.exchange_rate import ExchangeRate
+from app.models.exchange_rate_rollup import ExchangeRateRollup
+from app.models.market_data import TimeFrame
+from app.services.logger import logger
+from app.services.retention.partitions import drop_partitions_before, is_partitioned
+
+PAIR_COLUMNS = ["source_currency_id", "target_currency_id"]
+OHLC_COLUMNS = ["open_rate", "high_rate", "low_rate", "close_rate", "sample_count"]
+
+# Rollup tiers, coarsest first. Each tier is built from the one after it and
+# the last tier is built from the raw `exchange_rates` rows.
+ROLLUP_TIMEFRAMES = (TimeFrame.ONE_DAY, TimeFrame.ONE_HOUR)
+
+# How much source data a single rollup pass loads into memory
+ROLLUP_WINDOWS = {
+    TimeFrame.ONE_HOUR: timedelta(days=7),
+    TimeFrame.ONE_DAY: timedelta(days=366),
+}
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _freq(timeframe: TimeFrame) -> pd.Timedelta:
+    return pd.Timedelta(timeframe.duration)
+
+
+def get_watermark(db: Session, *, timeframe: TimeFrame) -> Optional[datetime]:
+    """
+    Start of the newest bucket of a rollup tier. Everything before it is
+    final, the bucket itself may still be partial.
+    """
+    result = (
+        db.query(func.max(ExchangeRateRollup.bucket_start))
+        .filter(ExchangeRateRollup.timeframe == timeframe)
+        .scalar()
+    )
+    return _as_utc(result)
+
+
+def _load_raw(
+    db: Session,
+    *,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    source_currency_id: Optional[int] = None,
+    target_currency_id: Optional[int] = None,
+) -> pd.DataFrame:
+    query = select(
+        ExchangeRate.source_currency_id,
+        ExchangeRate.target_currency_id,
+        ExchangeRate.rate,
+        ExchangeRate.effective_date,
+    )
+    if start is not None:
+        query = query.where(ExchangeRate.effective_date >= start)
+    if end is not None:
+        query = query.where(ExchangeRate.effective_date < end)
+    if source_currency_id is not None:
+        query = query.where(ExchangeRate.source_currency_id == source_currency_id)
+    if target_currency_id is not None:
+        query = query.where(ExchangeRate.target_currency_id == target_currency_id)
+
+    df = pd.DataFrame(
+        db.execute(query).all(), columns=PAIR_COLUMNS + ["rate", "effective_date"]
+    )
+    df["effective_date"] = pd.to_datetime(df["effective_date"], utc=True)
+    df = df.rename(columns={"effective_date": "bucket_start"})
+    df["open_rate"] = df["high_rate"] = df["low_rate"] = df["close_rate"] = df["rate"]
+    df["sample_count"] = 1
+    return df.drop(columns=["rate"])
+
+
+def _load_rollups(
+    db: Session,
+    *,
+    timeframe: TimeFrame,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    source_currency_id: Optional[int] = None,
+    target_currency_id: Optional[int] = None,
+) -> pd.DataFrame:
+    query = select(
+        ExchangeRateRollup.source_currency_id,
+        ExchangeRateRollup.target_currency_id,
+        ExchangeRateRollup.bucket_start,
+        ExchangeRateRollup.open_rate,
+        ExchangeRateRollup.high_rate,
+        ExchangeRateRollup.low_rate,
+        ExchangeRateRollup.close_rate,
+        ExchangeRateRollup.sample_count,
+    ).where(ExchangeRateRollup.timeframe == timeframe)
+    if start is not None:
+        query = query.where(ExchangeRateRollup.bucket_start >= start)
+    if end is not None:
+        query = query.where(ExchangeRateRollup.bucket_start < end)
+    if source_currency_id is not None:
+        query = query.where(ExchangeRateRollup.source_currency_id == source_currency_id)
+    if target_currency_id is not None:
+        query = query.where(ExchangeRateRollup.target_currency_id == target_currency_id)
+
+    df = pd.DataFrame(
+        db.execute(query).all(), columns=PAIR_COLUMNS + ["bucket_start"] + OHLC_COLUMNS
+    )
+    df["bucket_start"] = pd.to_datetime(df["bucket_start"], utc=True)
+    return df
+
+
+def aggregate_ohlc(df: pd.DataFrame, *, freq: pd.Timedelta) -> pd.DataFrame:
+    """
+    Merge OHLC rows (raw rates count as single-sample candles) into buckets
+    of `freq` per currency pair.
+    """
+    if df.empty:
+        return df
+
+    df = df.sort_values("bucket_start", kind="stable")
+    df = df.assign(bucket_start=df["bucket_start"].dt.floor(freq))
+    return (
+        df.groupby(PAIR_COLUMNS + ["bucket_start"], sort=True)
+        .agg(
+            open_rate=("open_rate", "first"),
+            high_rate=("high_rate", "max"),
+            low_rate=("low_rate", "min"),
+            close_rate=("close_rate", "last"),
+            sample_count=("sample_count", "sum"),
+        )
+        .reset_index()
+    )
+
+
+def _load_tier_source(
+    db: Session, *, timeframe: TimeFrame, start: Optional[datetime], end: datetime
+) -> pd.DataFrame:
+    index = ROLLUP_TIMEFRAMES.index(timeframe)
+    if index + 1 < len(ROLLUP_TIMEFRAMES):
+        return _load_rollups(
+            db, timeframe=ROLLUP_TIMEFRAMES[index + 1], start=start, end=end
+        )
+    return _load_raw(db, start=start, end=end)
+
+
+def _first_source_date(
+    db: Session, *, timeframe: TimeFrame, start: Optional[datetime]
+) -> Optional[datetime]:
+    index = ROLLUP_TIMEFRAMES.index(timeframe)
+    if index + 1 < len(ROLLUP_TIMEFRAMES):
+        column = ExchangeRateRollup.bucket_start
+        query = db.query(func.min(column)).filter(
+            ExchangeRateRollup.timeframe == ROLLUP_TIMEFRAMES[index + 1]
+        )
+    else:
+        column = ExchangeRate.effective_date
+        query = db.query(func.min(column))
+    if start is not None:
+        query = query.filter(column >= start)
+    return _as_utc(query.scalar())
+
+
+def rollup_tier(db: Session, *, timeframe: TimeFrame, now: datetime) -> int:
+    """
+    Incrementally rebuild one rollup tier, starting from its watermark bucket.
+
+    Args:
+        db (Session): Database session
+        timeframe (TimeFrame): Tier to rebuild, one of `ROLLUP_TIMEFRAMES`
+        now (datetime): Upper bound of the data to roll up
+
+    Returns:
+        int: Number of buckets written
+    """
+    freq = _freq(timeframe)
+    window = ROLLUP_WINDOWS[timeframe]
+    written = 0
+
+    start = get_watermark(db, timeframe=timeframe)
+    first = _first_source_date(db, timeframe=timeframe, start=start)
+    if first is None:
+        return 0
+    start = pd.Timestamp(start or first).floor(freq).to_pydatetime()
+
+    while start <= now:
+        end = start + window
+        df = aggregate_ohlc(
+            _load_tier_source(db, timeframe=timeframe, start=start, end=end),
+            freq=freq,
+        )
+
+        if df.empty:
+            start = _first_source_date(db, timeframe=timeframe, start=end)
+            if start is None:
+                break
+            start = pd.Timestamp(start).floor(freq).to_pydatetime()
+            continue
+
+        db.execute(
+            delete(ExchangeRateRollup)
+            .where(ExchangeRateRollup.timeframe == timeframe)
+            .where(ExchangeRateRollup.bucket_start >= start)
+            .where(ExchangeRateRollup.bucket_start < end)
+            .execution_options(synchronize_session=False)
+        )
+        df["timeframe"] = timeframe
+        df["bucket_start"] = df["bucket_start"].dt.to_pydatetime()
+        db.execute(insert(ExchangeRateRollup), df.astype(object).to_dict("records"))
+        db.commit()
+
+        written += len(df)
+        start = end
+
+    return written
+
+
+def rollup_exchange_rates(db: Session, *, now: Optional[datetime] = None) -> Dict:
+    """
+    Roll raw exchange rates up into every tier, finest tier first.
+    """
+    now = now or datetime.now(timezone.utc)
+    result = {}
+    for timeframe in reversed(ROLLUP_TIMEFRAMES):
+        result[timeframe.value] = rollup_tier(db, timeframe=timeframe, now=now)
+    return result
+
+
+def prune_exchange_rates(db: Session, *, now: Optional[datetime] = None) -> Dict:
+    """
+    Delete raw rates and hourly buckets past their retention horizon.
+
+    Rows are only pruned once the next tier has rolled them up, and the
+    latest raw rate of every pair is kept so `get_latest_rate` keeps working
+    for pairs that stopped receiving updates. When `exchange_rates` is
+    partitioned, whole monthly partitions are dropped instead of deleting rows.
+    """
+    now = now or datetime.now(timezone.utc)
+    result = {}
+
+    hourly_watermark = get_watermark(db, timeframe=TimeFrame.ONE_HOUR)
+    if hourly_watermark is not None:
+        cutoff = min(
+            now - timedelta(days=settings.EXCHANGE_RATE_RAW_RETENTION_DAYS),
+            hourly_watermark,
+        )
+        latest_ids = select(func.max(ExchangeRate.id)).group_by(
+            ExchangeRate.source_currency_id, ExchangeRate.target_currency_id
+        )
+        if is_partitioned(db, ExchangeRate.__tablename__):
+            result["raw_partitions"] = drop_partitions_before(
+                db,
+                table_name=ExchangeRate.__tablename__,
+                cutoff=cutoff,
+                keep=latest_ids,
+            )
+        else:
+            result["raw"] = db.execute(
+                delete(ExchangeRate)
+                .where(ExchangeRate.effective_date < cutoff)
+                .where(ExchangeRate.id.not_in(latest_ids))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+    daily_watermark = get_watermark(db, timeframe=TimeFrame.ONE_DAY)
+    if daily_watermark is not None:
+        cutoff = min(
+            now - timedelta(days=settings.EXCHANGE_RATE_HOURLY_RETENTION_DAYS),
+            daily_watermark,
+        )
+        result[TimeFrame.ONE_HOUR.value] = db.execute(
+            delete(ExchangeRateRollup)
+            .where(ExchangeRateRollup.timeframe == TimeFrame.ONE_HOUR)
+            .where(ExchangeRateRollup.bucket_start < cutoff)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    db.commit()
+    return result
+
+
+def run_retention(db: Session) -> None:
+    now = datetime.now(timezone.utc)
+    written = rollup_exchange_rates(db, now=now)
+    pruned = prune_exchange_rates(db, now=now)
+    logger.info(f"Exchange rate rollup wrote {written}, pruned {pruned}")
+
+
+def get_history_timeframe(timeframe: TimeFrame) -> Optional[TimeFrame]:
+    """
+    Coarsest rollup tier whose buckets are fine enough for `timeframe`,
+    or None when only the raw rates can answer it.
+    """
+    for tier in ROLLUP_TIMEFRAMES:
+        if tier.duration <= timeframe.duration:
+            return tier
+    return None
+
+
+def get_rate_history(
+    db: Session,
+    *,
+    source_currency_id: int,
+    target_currency_id: int,
+    start: datetime,
+    end: datetime,
+    timeframe: TimeFrame,
+) -> pd.DataFrame:
+    """
+    OHLC history of a currency pair at `timeframe` resolution.
+
+    Reads the final buckets of the coarsest tier that can serve the
+    resolution, then those of each finer tier after the coarser watermark,
+    and fills everything from the finest watermark on from the raw rates.
+    Watermark buckets are partial, so they are always re-aggregated from
+    finer data.
+
+    Returns:
+        pd.DataFrame: One row per bucket with `bucket_start` and the
+                      `OHLC_COLUMNS`, sorted by `bucket_start`
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    pair = dict(
+        source_currency_id=source_currency_id, target_currency_id=target_currency_id
+    )
+    tier = get_history_timeframe(timeframe)
+    frames: List[pd.DataFrame] = []
+    tail_start = start
+
+    if tier is not None:
+        for finer in ROLLUP_TIMEFRAMES[ROLLUP_TIMEFRAMES.index(tier) :]:
+            watermark = get_watermark(db, timeframe=finer)
+            if watermark is None or watermark <= tail_start:
+                continue
+            frames.append(
+                _load_rollups(
+                    db,
+                    timeframe=finer,
+                    start=tail_start,
+                    end=min(watermark, end),
+                    **pair,
+                )
+            )
+            tail_start = watermark
+
+    if tail_start < end:
+        frames.append(_load_raw(db, start=tail_start, end=end, **pair))
+
+    df = aggregate_ohlc(
+        pd.concat([f for f in frames if not f.empty] or frames, ignore_index=True),
+        freq=_freq(timeframe),
+    )
+    return df[["bucket_start"] + OHLC_COLUMNS].reset_index(drop=True)
+
+
+def get_rate_before(
+    db: Session,
+    *,
+    source_currency_id: int,
+    target_currency_id: int,
+    before: datetime,
+) -> Optional[float]:
+    """
+    Last known rate of a currency pair before `before`, from the raw rates
+    or, once those are pruned, the close of the newest older rollup bucket.
+    """
+    before = _as_utc(before)
+    raw = (
+        db.query(ExchangeRate.rate, ExchangeRate.effective_date)
+        .filter(
+            ExchangeRate.source_currency_id == source_currency_id,
+            ExchangeRate.target_currency_id == target_currency_id,
+            ExchangeRate.effective_date < before,
+        )
+        .order_by(ExchangeRate.effective_date.desc())
+        .first()
+    )
+    rollup = (
+        db.query(ExchangeRateRollup.close_rate, ExchangeRateRollup.bucket_start)
+        .filter(
+            ExchangeRateRollup.source_currency_id == source_currency_id,
+            ExchangeRateRollup.target_currency_id == target_currency_id,
+            ExchangeRateRollup.bucket_start < before,
+        )
+        .order_by(ExchangeRateRollup.bucket_start.desc())
+        .first()
+    )
+    candidates = [row for row in (raw, rollup) if row is not None]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda row: _as_utc(row[1]))[0]
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.market_data import MarketData
+from app.services.retention.partitions import drop_partitions_before, is_partitioned
+
+
+def prune_market_data(db: Session, *, now: Optional[datetime] = None) -> int:
+    """
+    Drop market data older than `MARKET_DATA_RETENTION_DAYS`, a whole month
+    partition at a time when the table is partitioned.
+
+    Returns:
+        int: Number of partitions dropped, or rows deleted on a plain table
+    """
+    if settings.MARKET_DATA_RETENTION_DAYS is None:
+        return 0
+
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=settings.MARKET_DATA_RETENTION_DAYS)
+    if is_partitioned(db, MarketData.__tablename__):
+        return drop_partitions_before(
+            db, table_name=MarketData.__tablename__, cutoff=cutoff
+        )
+
+    deleted = db.execute(
+        delete(MarketData)
+        .where(MarketData.date_time < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
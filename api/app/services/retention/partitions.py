@@ -0,0 +1,307 @@
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint, CreateIndex
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.core.database import Base
+from app.services.logger import logger
+
+# Tables opt in to monthly range partitioning on Postgres by declaring the
+# partition key column in their table info, e.g.
+# `__table_args__ = {"info": {"partition_by": "effective_date"}}`
+PARTITION_INFO_KEY = "partition_by"
+
+
+def get_partitioned_tables() -> List[Table]:
+    return [
+        table
+        for table in Base.metadata.sorted_tables
+        if PARTITION_INFO_KEY in table.info
+    ]
+
+
+def supports_partitioning(bind) -> bool:
+    dialect = bind.dialect if hasattr(bind, "dialect") else bind.get_bind().dialect
+    return dialect.name == "postgresql"
+
+
+def is_partitioned(bind, table_name: str) -> bool:
+    if not supports_partitioning(bind):
+        return False
+    result = bind.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+        ),
+        {"name": table_name},
+    )
+    return result.first() is not None
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+
+def default_partition_name(table_name: str) -> str:
+    return f"{table_name}_default"
+
+
+def list_month_partitions(bind, table_name: str) -> List[Tuple[str, date]]:
+    """
+    Monthly partitions currently attached to `table_name`, oldest first.
+    """
+    result = bind.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = :name"
+        ),
+        {"name": table_name},
+    )
+    prefix = f"{table_name}_p"
+    partitions = []
+    for (name,) in result:
+        suffix = name[len(prefix) :]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_month_partition(bind, table_name: str, column: str, month: date) -> bool:
+    """
+    Create the partition of `table_name` holding `month`, moving any rows
+    for that month out of the default partition first.
+
+    Returns:
+        bool: True if the partition was created, False if it existed already
+    """
+    name = partition_name(table_name, month)
+    if bind.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+
+    default = default_partition_name(table_name)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    has_default = bind.execute(
+        text("SELECT to_regclass(:name)"), {"name": default}
+    ).scalar()
+    if has_default:
+        bind.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {default}"))
+
+    bind.execute(
+        text(
+            f"CREATE TABLE {name} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+    )
+
+    if has_default:
+        bind.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {default} "
+                f"WHERE {column} >= '{lower}' AND {column} < '{upper}' RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+        bind.execute(
+            text(f"ALTER TABLE {table_name} ATTACH PARTITION {default} DEFAULT")
+        )
+    return True
+
+
+def ensure_partitions(
+    db: Session, *, months_ahead: Optional[int] = None, now: Optional[datetime] = None
+) -> int:
+    """
+    Create the partitions for the current month and `months_ahead` upcoming
+    months on every partitioned table. No-op outside Postgres.
+
+    Returns:
+        int: Number of partitions created
+    """
+    if not supports_partitioning(db.get_bind()):
+        return 0
+
+    months_ahead = (
+        settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    )
+    current = month_start(now or datetime.now(timezone.utc))
+    created = 0
+    for table in get_partitioned_tables():
+        if not is_partitioned(db, table.name):
+            continue
+        column = table.info[PARTITION_INFO_KEY]
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            created += create_month_partition(db, table.name, column, month)
+    db.commit()
+    return created
+
+
+def drop_partitions_before(
+    db: Session,
+    *,
+    table_name: str,
+    cutoff: datetime,
+    keep: Optional[Select] = None,
+) -> int:
+    """
+    Detach and drop every monthly partition of `table_name` that ends on or
+    before `cutoff`, instead of deleting its rows one by one. Only the
+    default partition is pruned row by row.
+
+    Args:
+        db (Session): Database session
+        table_name (str): Partitioned table
+        cutoff (datetime): Only partitions entirely older than this are dropped
+        keep (Select): Optional query of ids to preserve; those rows are
+                       re-inserted through the parent and land in the
+                       default partition
+
+    Returns:
+        int: Number of partitions dropped
+    """
+    dropped = 0
+    keep_ids = [row[0] for row in db.execute(keep)] if keep is not None else []
+    column = next(
+        table.info[PARTITION_INFO_KEY]
+        for table in get_partitioned_tables()
+        if table.name == table_name
+    )
+    for name, month in list_month_partitions(db, table_name):
+        if add_months(month, 1) > cutoff.date():
+            break
+        db.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+        if keep_ids:
+            db.execute(
+                text(
+                    f"INSERT INTO {table_name} SELECT * FROM {name} "
+                    f"WHERE id = ANY(:ids)"
+                ),
+                {"ids": keep_ids},
+            )
+        db.execute(text(f"DROP TABLE {name}"))
+        dropped += 1
+        logger.info(f"Dropped partition {name}")
+
+    # Rows outside the monthly ranges (e.g. backfills) live in the default
+    # partition, which is small enough to prune row by row
+    db.execute(
+        text(
+            f"DELETE FROM {default_partition_name(table_name)} "
+            f"WHERE {column} < :cutoff AND NOT id = ANY(:ids)"
+        ),
+        {"cutoff": cutoff, "ids": keep_ids},
+    )
+    db.commit()
+    return dropped
+
+
+def convert_to_partitioned(conn: Connection, table: Table) -> None:
+    """
+    Rebuild a plain table as a monthly range-partitioned one, keeping its
+    rows, id sequence, indexes and foreign keys. Used by the migrations.
+    """
+    name = table.name
+    column = table.info[PARTITION_INFO_KEY]
+    staging = f"{name}_partitioned"
+
+    conn.execute(
+        text(f"UPDATE {name} SET {column} = created_at WHERE {column} IS NULL")
+    )
+    conn.execute(
+        text(
+            f"CREATE TABLE {staging} (LIKE {name} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({column})"
+        )
+    )
+    conn.execute(text(f"ALTER TABLE {staging} ALTER COLUMN {column} SET NOT NULL"))
+    conn.execute(
+        text(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {name}_pkey_partitioned "
+            f"PRIMARY KEY (id, {column})"
+        )
+    )
+
+    first = conn.execute(text(f"SELECT min({column}) FROM {name}")).scalar()
+    now = datetime.now(timezone.utc)
+    month = month_start(first or now)
+    last = add_months(month_start(now), settings.PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        conn.execute(
+            text(
+                f"CREATE TABLE {partition_name(name, month)} PARTITION OF {staging} "
+                f"FOR VALUES FROM ('{month.isoformat()}') "
+                f"TO ('{add_months(month, 1).isoformat()}')"
+            )
+        )
+        month = add_months(month, 1)
+    conn.execute(
+        text(
+            f"CREATE TABLE {default_partition_name(name)} PARTITION OF {staging} DEFAULT"
+        )
+    )
+
+    conn.execute(text(f"INSERT INTO {staging} SELECT * FROM {name}"))
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": name}
+    ).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    conn.execute(
+        text(
+            f"ALTER TABLE {name} RENAME CONSTRAINT {name}_pkey_partitioned TO {name}_pkey"
+        )
+    )
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {name}.id"))
+
+    for index in table.indexes:
+        conn.execute(CreateIndex(index))
+    for constraint in table.foreign_key_constraints:
+        conn.execute(AddConstraint(constraint))
+
+
+def convert_to_plain(conn: Connection, table: Table) -> None:
+    """
+    Inverse of `convert_to_partitioned`, folding all partitions back into a
+    single heap table.
+    """
+    name = table.name
+    staging = f"{name}_plain"
+
+    conn.execute(text(f"CREATE TABLE {staging} (LIKE {name} INCLUDING DEFAULTS)"))
+    conn.execute(text(f"INSERT INTO {staging} SELECT * FROM {name}"))
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": name}
+    ).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    conn.execute(text(f"DROP TABLE {name} CASCADE"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    conn.execute(
+        text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_pkey PRIMARY KEY (id)")
+    )
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {name}.id"))
+
+    for index in table.indexes:
+        conn.execute(CreateIndex(index))
+    for constraint in table.foreign_key_constraints:
+        conn.execute(AddConstraint(constraint))
@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.portfolio import Portfolio
+from app.services.currency_conversion.converter import (
+    CurrencyConverter,
+    currency_converter,
+)
+from app.services.logger import logger
+from app.services.valuation.engine import load_holdings, value_holdings
+
+# Finished jobs kept around for the status endpoint
+REVALUATION_JOB_HISTORY = 20
+
+
+@dataclass
+class RevaluationJob:
+    workers: int
+    chunk_size: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "pending"
+    total: int = 0
+    done: int = 0
+    written: int = 0
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.monotonic, repr=False)
+    _elapsed: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def progress(self) -> Optional[float]:
+        return self.done / self.total if self.total else None
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """
+        Portfolios valued per second so far.
+        """
+        elapsed = self._elapsed or time.monotonic() - self._started
+        return self.done / elapsed if elapsed > 0 else None
+
+
+_jobs: "OrderedDict[str, RevaluationJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+# Rate snapshot of a worker process, see `_init_worker`
+_worker_converter: Optional[CurrencyConverter] = None
+
+
+def _init_worker(converter: CurrencyConverter) -> None:
+    global _worker_converter
+    _worker_converter = converter
+    # Never reuse pooled connections of another process
+    engine.dispose(close=False)
+
+
+def _revalue_chunk(portfolio_ids: List[int]) -> int:
+    """
+    Value a chunk of portfolios in a worker process with its own connection
+    and write their totals back with one bulk update.
+
+    Returns:
+        int: Number of portfolios written
+    """
+    with SessionLocal() as db:
+        columns = load_holdings(db, portfolio_ids=portfolio_ids)
+        valuation = value_holdings(columns, converter=_worker_converter)
+        unpriced = np.bincount(
+            np.searchsorted(valuation.portfolio_ids, columns.portfolio_id),
+            weights=np.isnan(valuation.values),
+            minlength=len(valuation.portfolio_ids),
+        )
+        totals = {
+            int(pid): None if missing else float(total)
+            for pid, total, missing in zip(
+                valuation.portfolio_ids, valuation.totals, unpriced
+            )
+        }
+
+        valued_at = datetime.now(timezone.utc)
+        rows = [
+            {"pid": pid, "total_value": totals.get(pid, 0.0), "valued_at": valued_at}
+            for pid in portfolio_ids
+        ]
+        table = Portfolio.__table__
+        # A revaluation is not an edit, so `updated_at` is kept as it is
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("pid"))
+            .values(updated_at=table.c.updated_at),
+            rows,
+        )
+        db.commit()
+        return len(rows)
+
+
+def run_revaluation(job: RevaluationJob) -> None:
+    """
+    Value every portfolio across a process pool. The portfolio ids are split
+    into chunks of `job.chunk_size`, every worker gets a read-only copy of
+    the current rate matrix and values its chunks with a vectorized pass.
+    """
+    job.status = "running"
+    try:
+        with SessionLocal() as db:
+            portfolio_ids = [
+                row[0] for row in db.query(Portfolio.id).order_by(Portfolio.id)
+            ]
+            converter = currency_converter.ensure_fresh(db)
+        chunks = [
+            portfolio_ids[offset : offset + job.chunk_size]
+            for offset in range(0, len(portfolio_ids), job.chunk_size)
+        ]
+        job.total = len(portfolio_ids)
+
+        # Spawned, not forked: the parent runs the web server and scheduler
+        # threads, whose locks and connections must not leak into workers
+        with ProcessPoolExecutor(
+            max_workers=job.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(converter,),
+        ) as pool:
+            futures = {pool.submit(_revalue_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                job.written += future.result()
+                job.done += len(futures[future])
+
+        job.status = "finished"
+    except Exception as e:
+        logger.exception(f"Portfolio revaluation {job.id} failed")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job._elapsed = time.monotonic() - job._started
+        job.finished_at = datetime.now(timezone.utc)
+
+    logger.info(
+        f"Portfolio revaluation {job.id} {job.status}: {job.done}/{job.total} "
+        f"portfolios in {job._elapsed:.1f}s with {job.workers} workers"
+    )
+
+
+class RevaluationRunning(RuntimeError):
+    pass
+
+
+def _running_job() -> Optional[RevaluationJob]:
+    # Callers hold `_jobs_lock`
+    for job in _jobs.values():
+        if job.status in ("pending", "running"):
+            return job
+    return None
+
+
+def get_running_job() -> Optional[RevaluationJob]:
+    with _jobs_lock:
+        return _running_job()
+
+
+def get_job(job_id: str) -> Optional[RevaluationJob]:
+    return _jobs.get(job_id)
+
+
+def start_revaluation(
+    *, workers: Optional[int] = None, chunk_size: Optional[int] = None
+) -> RevaluationJob:
+    """
+    Start a revaluation of every portfolio in a background thread, unless
+    one is already pending or running.
+
+    Args:
+        workers (int): Worker processes, `PORTFOLIO_REVALUATION_WORKERS` or
+                       the number of CPUs by default
+        chunk_size (int): Portfolios per task
+
+    Returns:
+        RevaluationJob: The job, to be polled for progress
+
+    Raises:
+        RevaluationRunning: Another revaluation has not finished yet
+    """
+    job = RevaluationJob(
+        workers=workers or settings.PORTFOLIO_REVALUATION_WORKERS or os.cpu_count(),
+        chunk_size=chunk_size or settings.PORTFOLIO_REVALUATION_CHUNK_SIZE,
+    )
+    # Checked and registered under one lock, so concurrent requests cannot
+    # both start a revaluation
+    with _jobs_lock:
+        if _running_job():
+            raise RevaluationRunning("A revaluation is already running")
+        _jobs[job.id] = job
+        while len(_jobs) > REVALUATION_JOB_HISTORY:
+            _jobs.popitem(last=False)
+
+    threading.Thread(target=run_revaluation, args=(job,), daemon=True).start()
+    return job
@@ -0,0 +1,82 @@
+from typing import Any, Dict
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.asset_type import AssetType
+from app.models.user import User
+from app.services.currency_conversion.converter import currency_converter
+from app.services.valuation.engine import load_holdings, value_holdings
+
+
+def compute_consolidated(db: Session, *, user: User) -> Dict[str, Any]:
+    """
+    Every holding of a user across all their portfolios, valued in the
+    user's preferred currency and merged per asset.
+
+    Uses one query for the holdings and one incremental refresh of the
+    conversion matrix, whatever the number of portfolios.
+    """
+    columns = load_holdings(db, user_id=user.id)
+    valuation = value_holdings(
+        columns,
+        converter=currency_converter.ensure_fresh(db),
+        target_currency_id=user.preferred_currency_id,
+    )
+    values = np.nan_to_num(valuation.values)
+    total = float(values.sum())
+
+    asset_ids, first, inverse = np.unique(
+        columns.asset_id, return_index=True, return_inverse=True
+    )
+    quantities = np.bincount(
+        inverse, weights=columns.quantity, minlength=len(asset_ids)
+    )
+    asset_values = np.bincount(inverse, weights=values, minlength=len(asset_ids))
+    unpriced = np.bincount(
+        inverse,
+        weights=np.isnan(valuation.values).astype(float),
+        minlength=len(asset_ids),
+    )
+    portfolio_counts = np.bincount(inverse, minlength=len(asset_ids))
+    assets = [
+        {
+            "asset_id": int(asset_ids[i]),
+            "asset_type_id": int(columns.asset_type_id[first[i]]),
+            "currency_id": int(columns.currency_id[first[i]]),
+            "quantity": float(quantities[i]),
+            "value": None if unpriced[i] else float(asset_values[i]),
+            "weight": (
+                float(asset_values[i] / total) if total and not unpriced[i] else None
+            ),
+            "portfolios_count": int(portfolio_counts[i]),
+        }
+        for i in np.argsort(-asset_values, kind="stable")
+    ]
+
+    type_ids, type_inverse = np.unique(columns.asset_type_id, return_inverse=True)
+    type_values = np.bincount(type_inverse, weights=values, minlength=len(type_ids))
+    names = dict(
+        db.query(AssetType.id, AssetType.name).filter(
+            AssetType.id.in_(type_ids.tolist())
+        )
+    )
+    allocation = [
+        {
+            "asset_type_id": int(type_id),
+            "asset_type_name": names.get(int(type_id)),
+            "value": float(value),
+            "weight": float(value / total) if total else None,
+        }
+        for type_id, value in zip(type_ids, type_values)
+    ]
+
+    return {
+        "currency_id": user.preferred_currency_id,
+        "total_value": total,
+        "portfolios_count": len(np.unique(columns.portfolio_id)),
+        "holdings_count": len(columns),
+        "unpriced_holdings_count": int(np.isnan(valuation.values).sum()),
+        "assets": assets,
+        "allocation": allocation,
+    }
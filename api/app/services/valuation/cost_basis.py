@@ -0,0 +1,506 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+
+from app.crud import portfolio as crud_portfolio
+from app.crud.session import save
+from app.models.portfolio import CostBasisMethod, Portfolio
+from app.models.portfolio_holdings import PortfolioHolding
+from app.models.portfolio_lot import PortfolioLot
+from app.models.portfolio_transaction import PortfolioTransaction, TransactionType
+from app.services.currency_conversion.converter import currency_converter
+from app.services.logger import logger
+from app.services.retention.exchange_rates import get_rate_before
+from app.services.valuation.engine import HoldingColumns, value_holdings
+
+# Open lots are consumed in batches of this size, so a sale only loads the
+# lots it actually touches
+LOT_BATCH_SIZE = 50
+
+# Quantities below this are float noise from partial sales
+QUANTITY_EPSILON = 1e-12
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _add(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return None if a is None or b is None else a + b
+
+
+def _quoted_rate_before(
+    db: Session, *, source_currency_id: int, target_currency_id: int, before: datetime
+) -> Optional[float]:
+    """
+    Last rate of a single hop before `before`, from its quoted direction or
+    the inverse of the opposite one.
+    """
+    rate = get_rate_before(
+        db,
+        source_currency_id=source_currency_id,
+        target_currency_id=target_currency_id,
+        before=before,
+    )
+    if rate is not None:
+        return rate
+    inverse = get_rate_before(
+        db,
+        source_currency_id=target_currency_id,
+        target_currency_id=source_currency_id,
+        before=before,
+    )
+    return None if not inverse else 1 / inverse
+
+
+def get_rate_at(
+    db: Session, *, source_currency_id: int, target_currency_id: int, at: datetime
+) -> Optional[float]:
+    """
+    Rate between two currencies as of `at`. Pairs without their own history
+    are chained along the converter's current conversion path. When no rate
+    that old is stored, the current rate is used.
+    """
+    if source_currency_id == target_currency_id:
+        return 1.0
+    converter = currency_converter.ensure_fresh(db)
+    pair = dict(
+        source_currency_id=source_currency_id, target_currency_id=target_currency_id
+    )
+
+    rate = _quoted_rate_before(db, before=at, **pair)
+    if rate is None:
+        path = converter.path(**pair)
+        if len(path) >= 3:
+            rate = 1.0
+            for hop_source, hop_target in zip(path, path[1:]):
+                hop = _quoted_rate_before(
+                    db,
+                    source_currency_id=hop_source,
+                    target_currency_id=hop_target,
+                    before=at,
+                )
+                if hop is None:
+                    rate = None
+                    break
+                rate *= hop
+    if rate is None:
+        rate = converter.get_rate(**pair)
+    return rate
+
+
+def get_cost_each(
+    db: Session, *, transaction: PortfolioTransaction, base_currency_id: int
+) -> Optional[float]:
+    """
+    Price of one unit of a transaction in the portfolio's base currency, or
+    None if the price currency cannot be converted.
+
+    It is converted at the rate of the transaction date and stored on the
+    transaction, so replaying the log later gives the same cost basis
+    whatever the rates have done since.
+    """
+    if transaction.price_currency_id == base_currency_id:
+        return transaction.price_each
+    if (
+        transaction.base_price_each is not None
+        and transaction.base_currency_id == base_currency_id
+    ):
+        return transaction.base_price_each
+
+    rate = get_rate_at(
+        db,
+        source_currency_id=transaction.price_currency_id,
+        target_currency_id=base_currency_id,
+        at=_as_utc(transaction.transaction_date) or datetime.now(timezone.utc),
+    )
+    if rate is None:
+        logger.warning(
+            f"No rate from currency {transaction.price_currency_id} to "
+            f"{base_currency_id}, cost basis of transaction {transaction.id} "
+            f"is unknown"
+        )
+        return None
+    transaction.base_price_each = transaction.price_each * rate
+    transaction.base_currency_id = base_currency_id
+    return transaction.base_price_each
+
+
+def _open_lots(db: Session, *, portfolio_id: int, asset_id: int):
+    return (
+        db.query(PortfolioLot)
+        .filter(
+            PortfolioLot.portfolio_id == portfolio_id,
+            PortfolioLot.asset_id == asset_id,
+            PortfolioLot.remaining_quantity > 0,
+        )
+        .order_by(PortfolioLot.acquired_at, PortfolioLot.id)
+    )
+
+
+def _take(
+    lot: PortfolioLot, quantity: float, cost: Optional[float]
+) -> Tuple[float, Optional[float]]:
+    """
+    Take up to `quantity` out of a lot.
+
+    Returns:
+        Tuple[float, Optional[float]]: Quantity still to take, and `cost`
+                                       plus the cost of what was taken
+    """
+    take = min(lot.remaining_quantity, quantity)
+    lot.remaining_quantity = (
+        0.0 if take == lot.remaining_quantity else lot.remaining_quantity - take
+    )
+    cost = _add(cost, None if lot.cost_each is None else take * lot.cost_each)
+    return quantity - take, cost
+
+
+def _consume_lots(
+    db: Session, *, portfolio_id: int, asset_id: int, quantity: float
+) -> Optional[float]:
+    """
+    Take `quantity` out of the oldest open lots.
+
+    Returns:
+        Optional[float]: Cost of the quantity taken, None if a consumed lot
+                         has an unknown cost. Quantity beyond the open lots
+                         is taken at zero cost.
+    """
+    remaining = quantity
+    cost: Optional[float] = 0.0
+    query = _open_lots(db, portfolio_id=portfolio_id, asset_id=asset_id)
+    while remaining > QUANTITY_EPSILON:
+        lots = query.limit(LOT_BATCH_SIZE).all()
+        if not lots:
+            logger.warning(
+                f"Sale of {quantity} exceeds the open lots of asset {asset_id} "
+                f"in portfolio {portfolio_id}"
+            )
+            break
+        for lot in lots:
+            remaining, cost = _take(lot, remaining, cost)
+            if remaining <= QUANTITY_EPSILON:
+                break
+        db.flush()
+    return cost
+
+
+def _consume_queue(
+    lots: Deque[PortfolioLot], *, quantity: float
+) -> Tuple[Optional[float], float]:
+    """
+    In-memory `_consume_lots` over the open lots of a replay, oldest first.
+
+    Returns:
+        Tuple[Optional[float], float]: Cost of the quantity taken and the
+                                       quantity left over
+    """
+    remaining = quantity
+    cost: Optional[float] = 0.0
+    while remaining > QUANTITY_EPSILON and lots:
+        remaining, cost = _take(lots[0], remaining, cost)
+        if lots[0].remaining_quantity <= 0:
+            lots.popleft()
+    return cost, remaining
+
+
+def _add_lot(
+    db: Session,
+    *,
+    portfolio: Portfolio,
+    transaction: PortfolioTransaction,
+    cost_each: Optional[float],
+) -> PortfolioLot:
+    lot = PortfolioLot(
+        portfolio_id=portfolio.id,
+        asset_id=transaction.asset_id,
+        transaction_id=transaction.id,
+        quantity=transaction.quantity,
+        remaining_quantity=transaction.quantity,
+        cost_each=cost_each,
+        acquired_at=transaction.transaction_date or datetime.now(timezone.utc),
+    )
+    db.add(lot)
+    return lot
+
+
+def apply_transaction(
+    db: Session,
+    *,
+    portfolio: Portfolio,
+    holding: PortfolioHolding,
+    transaction: PortfolioTransaction,
+    open_lots: Optional[Deque[PortfolioLot]] = None,
+) -> None:
+    """
+    Apply one transaction to a holding's quantity, cost basis and realized
+    PnL, without committing. Only the open lots a sale consumes are touched,
+    earlier transactions are never replayed.
+
+    A replay passes its FIFO lots as `open_lots`, so sales consume them in
+    memory instead of querying the lots table.
+    """
+    cost_each = get_cost_each(
+        db, transaction=transaction, base_currency_id=portfolio.base_currency_id
+    )
+    quantity = transaction.quantity
+    fifo = portfolio.cost_basis_method == CostBasisMethod.FIFO
+
+    if transaction.transaction_type == TransactionType.BUY:
+        cost = None if cost_each is None else quantity * cost_each
+        holding.cost_basis = _add(holding.cost_basis, cost)
+        holding.quantity += quantity
+        if fifo:
+            lot = _add_lot(
+                db, portfolio=portfolio, transaction=transaction, cost_each=cost_each
+            )
+            if open_lots is not None:
+                open_lots.append(lot)
+    elif transaction.transaction_type == TransactionType.SALE:
+        if fifo and open_lots is not None:
+            cost, remaining = _consume_queue(open_lots, quantity=quantity)
+            if remaining > QUANTITY_EPSILON:
+                logger.warning(
+                    f"Sale of {quantity} exceeds the open lots of asset "
+                    f"{transaction.asset_id} in portfolio {portfolio.id}"
+                )
+        elif fifo:
+            cost = _consume_lots(
+                db,
+                portfolio_id=portfolio.id,
+                asset_id=transaction.asset_id,
+                quantity=quantity,
+            )
+        elif holding.cost_basis is None:
+            cost = None
+        elif holding.quantity > 0:
+            cost = holding.cost_basis * min(quantity / holding.quantity, 1.0)
+        else:
+            cost = 0.0
+
+        proceeds = None if cost_each is None else quantity * cost_each
+        pnl = None if cost is None or proceeds is None else proceeds - cost
+        if pnl is not None:
+            holding.realized_pnl = (holding.realized_pnl or 0.0) + pnl
+        holding.cost_basis = (
+            None if cost is None else max((holding.cost_basis or 0.0) - cost, 0.0)
+        )
+        holding.quantity -= quantity
+
+    if holding.quantity > 0 and holding.cost_basis is not None:
+        holding.avg_purchase_price = holding.cost_basis / holding.quantity
+    else:
+        holding.avg_purchase_price = 0.0
+
+
+def _is_backdated(db: Session, *, transaction: PortfolioTransaction) -> bool:
+    latest = (
+        db.query(func.max(PortfolioTransaction.transaction_date))
+        .filter(
+            PortfolioTransaction.portfolio_id == transaction.portfolio_id,
+            PortfolioTransaction.asset_id == transaction.asset_id,
+            PortfolioTransaction.id != transaction.id,
+        )
+        .scalar()
+    )
+    return latest is not None and _as_utc(transaction.transaction_date) < _as_utc(
+        latest
+    )
+
+
+def lock_holding(
+    db: Session, *, portfolio_id: int, asset_id: int
+) -> Optional[PortfolioHolding]:
+    """
+    Load a holding fresh from the database and lock its row until the commit.
+    """
+    return (
+        db.query(PortfolioHolding)
+        .filter(
+            PortfolioHolding.portfolio_id == portfolio_id,
+            PortfolioHolding.asset_id == asset_id,
+        )
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+
+
+def rebuild_holding(
+    db: Session, *, portfolio: Portfolio, asset_id: int
+) -> Optional[PortfolioHolding]:
+    """
+    Replay the transaction log of one asset in a portfolio from scratch.
+    Only needed when history changes: a backdated or deleted transaction, or
+    a new cost basis method.
+    """
+    db.query(PortfolioLot).filter(
+        PortfolioLot.portfolio_id == portfolio.id, PortfolioLot.asset_id == asset_id
+    ).delete(synchronize_session=False)
+
+    holding = lock_holding(db, portfolio_id=portfolio.id, asset_id=asset_id)
+    transactions = (
+        db.query(PortfolioTransaction)
+        .filter(
+            PortfolioTransaction.portfolio_id == portfolio.id,
+            PortfolioTransaction.asset_id == asset_id,
+        )
+        .order_by(PortfolioTransaction.transaction_date, PortfolioTransaction.id)
+        .all()
+    )
+    if holding is None:
+        if not transactions:
+            return None
+        holding = crud_portfolio.add_to_holding(
+            db, portfolio_id=portfolio.id, asset_id=asset_id, quantity=0.0
+        )
+
+    holding.quantity = 0.0
+    holding.cost_basis = 0.0
+    holding.realized_pnl = 0.0
+    holding.avg_purchase_price = 0.0
+    open_lots: Deque[PortfolioLot] = deque()
+    for transaction in transactions:
+        apply_transaction(
+            db,
+            portfolio=portfolio,
+            holding=holding,
+            transaction=transaction,
+            open_lots=open_lots,
+        )
+    db.flush()
+    return holding
+
+
+def record_transaction(
+    db: Session, *, portfolio: Portfolio, transaction: PortfolioTransaction
+) -> Optional[PortfolioHolding]:
+    """
+    Update the holding of a newly stored transaction. A sale of an asset that
+    is not held does not create a holding.
+
+    Returns:
+        Optional[PortfolioHolding]: The updated holding
+    """
+    # Assigns the id of a transaction staged in a unit of work
+    db.flush()
+    crud_portfolio.advance_checkpoint(
+        db, portfolio_id=portfolio.id, transaction_id=transaction.id
+    )
+    backdated = _is_backdated(db, transaction=transaction)
+
+    if transaction.transaction_type == TransactionType.BUY and not backdated:
+        # A buy only adds to the holding, which is done atomically
+        cost_each = get_cost_each(
+            db, transaction=transaction, base_currency_id=portfolio.base_currency_id
+        )
+        holding = crud_portfolio.add_to_holding(
+            db,
+            portfolio_id=portfolio.id,
+            asset_id=transaction.asset_id,
+            quantity=transaction.quantity,
+            cost=None if cost_each is None else transaction.quantity * cost_each,
+        )
+        if portfolio.cost_basis_method == CostBasisMethod.FIFO:
+            _add_lot(
+                db, portfolio=portfolio, transaction=transaction, cost_each=cost_each
+            )
+    else:
+        # Anything else reads the holding, so it is locked until the commit
+        holding = lock_holding(
+            db, portfolio_id=portfolio.id, asset_id=transaction.asset_id
+        )
+        if holding is None and transaction.transaction_type != TransactionType.BUY:
+            return None
+        if backdated:
+            holding = rebuild_holding(
+                db, portfolio=portfolio, asset_id=transaction.asset_id
+            )
+        else:
+            apply_transaction(
+                db, portfolio=portfolio, holding=holding, transaction=transaction
+            )
+
+    save(db, holding)
+    return holding
+
+
+def remove_transaction(
+    db: Session, *, portfolio: Portfolio, transaction: PortfolioTransaction
+) -> Optional[PortfolioHolding]:
+    """
+    Delete a transaction and rebuild its holding without it.
+    """
+    asset_id = transaction.asset_id
+    db.query(PortfolioLot).filter(PortfolioLot.transaction_id == transaction.id).delete(
+        synchronize_session=False
+    )
+    db.delete(transaction)
+    db.flush()
+    holding = rebuild_holding(db, portfolio=portfolio, asset_id=asset_id)
+    save(db)
+    return holding
+
+
+def compute_pnl(db: Session, *, portfolio: Portfolio) -> Dict[str, Any]:
+    """
+    Cost basis, market value and realized/unrealized PnL of every holding
+    and of the whole portfolio, in its base currency.
+    """
+    holdings = (
+        db.query(PortfolioHolding)
+        .options(joinedload(PortfolioHolding.asset))
+        .filter(PortfolioHolding.portfolio_id == portfolio.id)
+        .order_by(PortfolioHolding.id)
+        .all()
+    )
+    currency_converter.refresh(db)
+    valuation = value_holdings(
+        HoldingColumns.from_holdings(
+            holdings, base_currency_id=portfolio.base_currency_id
+        ),
+        converter=currency_converter,
+    )
+
+    rows = []
+    for holding, value in zip(holdings, valuation.values):
+        market_value = None if np.isnan(value) else float(value)
+        unrealized = (
+            None
+            if market_value is None or holding.cost_basis is None
+            else market_value - holding.cost_basis
+        )
+        rows.append(
+            {
+                "holding_id": holding.id,
+                "asset_id": holding.asset_id,
+                "quantity": holding.quantity,
+                "avg_purchase_price": holding.avg_purchase_price,
+                "cost_basis": holding.cost_basis,
+                "market_value": market_value,
+                "realized_pnl": holding.realized_pnl or 0.0,
+                "unrealized_pnl": unrealized,
+            }
+        )
+
+    def total(key: str) -> Optional[float]:
+        values = [row[key] for row in rows]
+        return None if any(v is None for v in values) else float(sum(values))
+
+    return {
+        "portfolio_id": portfolio.id,
+        "base_currency_id": portfolio.base_currency_id,
+        "cost_basis_method": portfolio.cost_basis_method,
+        "cost_basis": total("cost_basis"),
+        "market_value": total("market_value"),
+        "realized_pnl": total("realized_pnl"),
+        "unrealized_pnl": total("unrealized_pnl"),
+        "holdings": rows,
+    }
@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.asset import Asset
+from app.models.portfolio import Portfolio
+from app.models.portfolio_holdings import PortfolioHolding
+from app.services.currency_conversion.converter import (
+    CurrencyConverter,
+    currency_converter,
+)
+
+COLUMNS = (
+    "holding_id",
+    "portfolio_id",
+    "asset_id",
+    "asset_type_id",
+    "currency_id",
+    "base_currency_id",
+    "quantity",
+)
+
+
+@dataclass
+class HoldingColumns:
+    """
+    Holdings of one or many portfolios as aligned column arrays.
+    `currency_id` is the asset's currency and `base_currency_id` the
+    currency its portfolio is valued in.
+    """
+
+    holding_id: np.ndarray
+    portfolio_id: np.ndarray
+    asset_id: np.ndarray
+    asset_type_id: np.ndarray
+    currency_id: np.ndarray
+    base_currency_id: np.ndarray
+    quantity: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.holding_id)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> "HoldingColumns":
+        """
+        Build columns from (holding_id, portfolio_id, asset_id, asset_type_id,
+        currency_id, base_currency_id, quantity) rows.
+        """
+        data = np.array(list(rows), dtype=float).reshape(-1, len(COLUMNS))
+        ids = np.nan_to_num(data[:, :-1], nan=-1).astype(np.int64)
+        return cls(*ids.T, quantity=data[:, -1])
+
+    @classmethod
+    def from_holdings(
+        cls, holdings: List[PortfolioHolding], *, base_currency_id: int
+    ) -> "HoldingColumns":
+        """
+        Build columns from already loaded holdings of a single portfolio.
+        """
+        return cls.from_rows(
+            (
+                h.id,
+                h.portfolio_id,
+                h.asset_id,
+                h.asset.asset_type_id,
+                h.asset.currency_id,
+                base_currency_id,
+                h.quantity,
+            )
+            for h in holdings
+        )
+
+
+def load_holdings(
+    db: Session,
+    *,
+    portfolio_ids: Optional[Iterable[int]] = None,
+    user_id: Optional[int] = None,
+    active_only: bool = False,
+) -> HoldingColumns:
+    """
+    Load the holdings of the selected portfolios as columns in one query.
+    """
+    query = (
+        select(
+            PortfolioHolding.id,
+            PortfolioHolding.portfolio_id,
+            PortfolioHolding.asset_id,
+            Asset.asset_type_id,
+            Asset.currency_id,
+            Portfolio.base_currency_id,
+            PortfolioHolding.quantity,
+        )
+        .join(Asset, Asset.id == PortfolioHolding.asset_id)
+        .join(Portfolio, Portfolio.id == PortfolioHolding.portfolio_id)
+        .order_by(PortfolioHolding.portfolio_id, PortfolioHolding.id)
+    )
+
+    if portfolio_ids is not None:
+        query = query.where(PortfolioHolding.portfolio_id.in_(list(portfolio_ids)))
+
+    if user_id is not None:
+        query = query.where(Portfolio.user_id == user_id)
+
+    if active_only:
+        query = query.where(Portfolio.is_active.is_(True))
+
+    return HoldingColumns.from_rows(db.execute(query).all())
+
+
+@dataclass
+class Valuation:
+    """
+    Per-holding values and weights aligned with `columns`, plus one total
+    per portfolio aligned with `portfolio_ids`. Values are NaN for holdings
+    that cannot be converted and count as zero in the totals.
+    """
+
+    columns: HoldingColumns
+    rates: np.ndarray
+    values: np.ndarray
+    weights: np.ndarray
+    portfolio_ids: np.ndarray
+    totals: np.ndarray
+
+    def totals_by_portfolio(self) -> Dict[int, float]:
+        return {
+            int(pid): float(total)
+            for pid, total in zip(self.portfolio_ids, self.totals)
+        }
+
+    def total_for(self, portfolio_id: int) -> float:
+        index = np.searchsorted(self.portfolio_ids, portfolio_id)
+        if (
+            index < len(self.portfolio_ids)
+            and self.portfolio_ids[index] == portfolio_id
+        ):
+            return float(self.totals[index])
+        return 0.0
+
+
+def value_holdings(
+    columns: HoldingColumns,
+    *,
+    converter: CurrencyConverter,
+    target_currency_id: Optional[int] = None,
+) -> Valuation:
+    """
+    Value every holding and total every portfolio in one vectorized pass.
+
+    Args:
+        columns (HoldingColumns): Holdings to value
+        converter (CurrencyConverter): Source of the rate vector
+        target_currency_id (int): Value everything in this currency instead
+                                  of each portfolio's base currency
+
+    Returns:
+        Valuation: Values, weights and per-portfolio totals
+    """
+    targets = (
+        columns.base_currency_id if target_currency_id is None else target_currency_id
+    )
+    rates = converter.get_rates(columns.currency_id, targets)
+    values = columns.quantity * rates
+
+    portfolio_ids, inverse = np.unique(columns.portfolio_id, return_inverse=True)
+    totals = np.bincount(
+        inverse, weights=np.nan_to_num(values), minlength=len(portfolio_ids)
+    )
+    holding_totals = totals[inverse]
+    weights = np.divide(
+        values,
+        holding_totals,
+        out=np.full(len(values), np.nan),
+        where=holding_totals != 0,
+    )
+
+    return Valuation(
+        columns=columns,
+        rates=rates,
+        values=values,
+        weights=weights,
+        portfolio_ids=portfolio_ids,
+        totals=totals,
+    )
+
+
+def value_portfolios(
+    db: Session,
+    *,
+    portfolio_ids: Optional[Iterable[int]] = None,
+    active_only: bool = False,
+) -> Valuation:
+    """
+    Batch valuation of many portfolios (all of them by default) in their
+    base currencies.
+    """
+    columns = load_holdings(db, portfolio_ids=portfolio_ids, active_only=active_only)
+    currency_converter.refresh(db)
+    return value_holdings(columns, converter=currency_converter)
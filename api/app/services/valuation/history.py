@@ -0,0 +1,273 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.asset import Asset
+from app.models.market_data import TimeFrame
+from app.models.portfolio import Portfolio
+from app.models.portfolio_transaction import PortfolioTransaction, TransactionType
+from app.services.currency_conversion.converter import currency_converter
+from app.services.retention.exchange_rates import get_rate_before, get_rate_history
+
+
+def _epoch_ns(values) -> np.ndarray:
+    return pd.DatetimeIndex(values).as_unit("ns").asi8
+
+
+def get_bucket_starts(
+    *, start: datetime, end: datetime, timeframe: TimeFrame
+) -> pd.DatetimeIndex:
+    freq = pd.Timedelta(timeframe.duration)
+    first = pd.Timestamp(start).tz_convert("UTC").floor(freq)
+    return pd.date_range(first, pd.Timestamp(end).tz_convert("UTC"), freq=freq)
+
+
+def load_transactions(
+    db: Session, *, portfolio_ids: List[int], end: datetime
+) -> pd.DataFrame:
+    """
+    Signed quantity changes of the given portfolios up to `end`, with each
+    asset's currency.
+    """
+    query = (
+        select(
+            PortfolioTransaction.portfolio_id,
+            PortfolioTransaction.asset_id,
+            Asset.currency_id,
+            PortfolioTransaction.transaction_type,
+            PortfolioTransaction.quantity,
+            PortfolioTransaction.transaction_date,
+        )
+        .join(Asset, Asset.id == PortfolioTransaction.asset_id)
+        .where(
+            PortfolioTransaction.portfolio_id.in_(portfolio_ids),
+            PortfolioTransaction.transaction_date < end,
+        )
+    )
+    df = pd.DataFrame(
+        db.execute(query).all(),
+        columns=[
+            "portfolio_id",
+            "asset_id",
+            "currency_id",
+            "transaction_type",
+            "quantity",
+            "date",
+        ],
+    )
+    sign = np.where(df["transaction_type"] == TransactionType.SALE.value, -1.0, 1.0)
+    df["quantity"] = df["quantity"].astype(float) * sign
+    df["date"] = pd.to_datetime(df["date"], utc=True)
+    return df.drop(columns=["transaction_type"])
+
+
+def quantities_at(
+    transactions: pd.DataFrame, *, points: pd.DatetimeIndex, asset_ids: np.ndarray
+) -> np.ndarray:
+    """
+    Quantity of every asset held at every point in time, as a
+    (points, assets) matrix: each transaction's change is added to the first
+    point at or after it, then accumulated over time.
+    """
+    asset_index = np.searchsorted(asset_ids, transactions["asset_id"].to_numpy())
+    point_index = np.searchsorted(_epoch_ns(points), _epoch_ns(transactions["date"]))
+    inside = point_index < len(points)
+
+    deltas = np.zeros((len(points), len(asset_ids)))
+    np.add.at(
+        deltas,
+        (point_index[inside], asset_index[inside]),
+        transactions["quantity"].to_numpy()[inside],
+    )
+    return np.cumsum(deltas, axis=0)
+
+
+class _RateSeries:
+    """
+    Close rates of currency pairs as-of-joined onto a fixed set of points,
+    loaded once per pair and direction.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        *,
+        points: pd.DatetimeIndex,
+        start: datetime,
+        end: datetime,
+        timeframe: TimeFrame,
+    ):
+        self.db = db
+        self.points = points
+        self.start = start
+        self.end = end
+        self.timeframe = timeframe
+        self._quoted: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def _load_quoted(
+        self, source_currency_id: int, target_currency_id: int
+    ) -> np.ndarray:
+        key = (source_currency_id, target_currency_id)
+        if key in self._quoted:
+            return self._quoted[key]
+
+        pair = dict(
+            source_currency_id=source_currency_id,
+            target_currency_id=target_currency_id,
+        )
+        history = get_rate_history(
+            self.db, start=self.start, end=self.end, timeframe=self.timeframe, **pair
+        )
+        rates = np.full(len(self.points), np.nan)
+        if not history.empty:
+            # Latest close at or before each point
+            index = (
+                np.searchsorted(
+                    _epoch_ns(history["bucket_start"]),
+                    _epoch_ns(self.points),
+                    side="right",
+                )
+                - 1
+            )
+            known = index >= 0
+            rates[known] = history["close_rate"].to_numpy()[index[known]]
+
+        if np.isnan(rates[0]):
+            seed = get_rate_before(self.db, before=self.start, **pair)
+            if seed is not None:
+                rates[0] = seed
+        # Carry the last known rate forward over gaps
+        rates = pd.Series(rates).ffill().to_numpy()
+        self._quoted[key] = rates
+        return rates
+
+    def direct(self, source_currency_id: int, target_currency_id: int) -> np.ndarray:
+        """
+        Rates of a single hop, from its quoted direction or the inverse of
+        the opposite one.
+        """
+        rates = self._load_quoted(source_currency_id, target_currency_id)
+        if not np.isnan(rates).all():
+            return rates
+        return 1 / self._load_quoted(target_currency_id, source_currency_id)
+
+    def get(self, source_currency_id: int, target_currency_id: int) -> np.ndarray:
+        """
+        Rates between any two currencies. Pairs without their own history
+        are chained along the converter's current conversion path.
+        """
+        if source_currency_id == target_currency_id:
+            return np.ones(len(self.points))
+
+        rates = self.direct(source_currency_id, target_currency_id)
+        if not np.isnan(rates).all():
+            return rates
+
+        path = currency_converter.path(
+            source_currency_id=source_currency_id,
+            target_currency_id=target_currency_id,
+        )
+        if len(path) < 3:
+            return rates
+        rates = np.ones(len(self.points))
+        for hop_source, hop_target in zip(path, path[1:]):
+            rates = rates * self.direct(hop_source, hop_target)
+        return rates
+
+
+def _nav(
+    transactions: pd.DataFrame,
+    *,
+    points: pd.DatetimeIndex,
+    base_currency_id: int,
+    series: _RateSeries,
+) -> np.ndarray:
+    asset_ids, asset_index = np.unique(
+        transactions["asset_id"].to_numpy(), return_index=True
+    )
+    quantities = quantities_at(transactions, points=points, asset_ids=asset_ids)
+
+    asset_currencies = transactions["currency_id"].to_numpy()[asset_index]
+    currency_ids, currency_index = np.unique(asset_currencies, return_inverse=True)
+    rates = np.column_stack(
+        [series.get(int(currency_id), base_currency_id) for currency_id in currency_ids]
+        or [np.empty((len(points), 0))]
+    )[:, currency_index]
+
+    held = quantities != 0
+    values = np.where(held, quantities * rates, 0.0)
+    nav = values.sum(axis=1)
+    nav[(held & np.isnan(rates)).any(axis=1)] = np.nan
+    return nav
+
+
+def compute_nav_series(
+    db: Session,
+    *,
+    portfolios: List[Portfolio],
+    start: datetime,
+    end: datetime,
+    timeframe: TimeFrame,
+) -> Tuple[pd.DatetimeIndex, Dict[int, np.ndarray]]:
+    """
+    Net asset value of many portfolios in their base currencies over time,
+    from one read of their transactions and one rate history per currency
+    pair.
+
+    Quantities are rebuilt from the transaction log and valued at the end of
+    each bucket with the close rate of the latest bucket up to then.
+
+    Returns:
+        Tuple[pd.DatetimeIndex, Dict[int, np.ndarray]]: Bucket starts and
+            the value at the end of each bucket per portfolio id, NaN where a
+            held asset has no rate yet
+    """
+    bucket_starts = get_bucket_starts(start=start, end=end, timeframe=timeframe)
+    points = bucket_starts + pd.Timedelta(timeframe.duration)
+    transactions = load_transactions(
+        db, portfolio_ids=[portfolio.id for portfolio in portfolios], end=points[-1]
+    )
+
+    currency_converter.ensure_fresh(db)
+    series = _RateSeries(
+        db,
+        points=bucket_starts,
+        start=bucket_starts[0].to_pydatetime(),
+        end=end,
+        timeframe=timeframe,
+    )
+    groups = dict(tuple(transactions.groupby("portfolio_id")))
+    empty = transactions.iloc[0:0]
+    return bucket_starts, {
+        portfolio.id: _nav(
+            groups.get(portfolio.id, empty),
+            points=points,
+            base_currency_id=portfolio.base_currency_id,
+            series=series,
+        )
+        for portfolio in portfolios
+    }
+
+
+def compute_nav_history(
+    db: Session,
+    *,
+    portfolio: Portfolio,
+    start: datetime,
+    end: datetime,
+    timeframe: TimeFrame,
+) -> pd.DataFrame:
+    """
+    Net asset value of a single portfolio, see `compute_nav_series`.
+
+    Returns:
+        pd.DataFrame: One row per bucket with `bucket_start` and `value`
+    """
+    bucket_starts, values = compute_nav_series(
+        db, portfolios=[portfolio], start=start, end=end, timeframe=timeframe
+    )
+    return pd.DataFrame({"bucket_start": bucket_starts, "value": values[portfolio.id]})
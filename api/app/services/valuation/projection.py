@@ -0,0 +1,525 @@
+import io
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core import events
+from app.crud import portfolio as crud_portfolio
+from app.crud.session import save
+from app.models.portfolio import CostBasisMethod, Portfolio
+from app.models.portfolio_holdings import PortfolioHolding
+from app.models.portfolio_lot import PortfolioLot
+from app.models.portfolio_transaction import PortfolioTransaction, TransactionType
+from app.services.logger import logger
+from app.services.valuation.cost_basis import (
+    apply_transaction,
+    get_rate_at,
+    lock_holding,
+    rebuild_holding,
+)
+
+# Portfolios rebuilt per pass of a full rebuild
+PROJECTION_BATCH_SIZE = 500
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+LOG_COLUMNS = [
+    "id",
+    "portfolio_id",
+    "asset_id",
+    "sale",
+    "quantity",
+    "price_each",
+    "price_currency_id",
+    "base_price_each",
+    "base_currency_id",
+    "date",
+]
+
+
+def _load_log(db: Session, *, portfolio_ids: List[int]) -> pd.DataFrame:
+    """
+    Transaction log of the given portfolios, ordered the way it is replayed:
+    per (portfolio, asset) by date, then id.
+
+    On PostgreSQL the rows are streamed with `COPY` and parsed by pandas,
+    several times faster than building a result row per transaction.
+    """
+    query = select(
+        PortfolioTransaction.id,
+        PortfolioTransaction.portfolio_id,
+        PortfolioTransaction.asset_id,
+        (PortfolioTransaction.transaction_type == TransactionType.SALE).label("sale"),
+        PortfolioTransaction.quantity,
+        PortfolioTransaction.price_each,
+        PortfolioTransaction.price_currency_id,
+        PortfolioTransaction.base_price_each,
+        PortfolioTransaction.base_currency_id,
+        PortfolioTransaction.transaction_date,
+    ).where(PortfolioTransaction.portfolio_id.in_(portfolio_ids))
+
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        sql = query.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+        buffer = io.StringIO()
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV", buffer)
+        finally:
+            cursor.close()
+        buffer.seek(0)
+        df = pd.read_csv(buffer, header=None, names=LOG_COLUMNS)
+        df["sale"] = df["sale"] == "t"
+    else:
+        df = pd.DataFrame(db.execute(query).all(), columns=LOG_COLUMNS)
+
+    df["date"] = pd.to_datetime(df["date"], utc=True, format="ISO8601")
+    order = np.lexsort(
+        (
+            df["id"].to_numpy(),
+            pd.DatetimeIndex(df["date"]).as_unit("ns").asi8,
+            df["asset_id"].to_numpy(),
+            df["portfolio_id"].to_numpy(),
+        )
+    )
+    return df.iloc[order].reset_index(drop=True)
+
+
+def _price_log(
+    db: Session, *, log: pd.DataFrame, portfolios: Dict[int, Portfolio]
+) -> int:
+    """
+    Store the base currency price of the log's foreign currency rows that
+    have none for their portfolio's base currency yet, at the rate of their
+    date, the way `get_cost_each` does for a single transaction.
+
+    Returns:
+        int: Number of transactions priced
+    """
+    base_currency_ids = log["portfolio_id"].map(
+        {pid: portfolio.base_currency_id for pid, portfolio in portfolios.items()}
+    )
+    unpriced = (log["price_currency_id"] != base_currency_ids) & (
+        log["base_price_each"].isna() | (log["base_currency_id"] != base_currency_ids)
+    )
+    rows = []
+    for i in np.flatnonzero(unpriced.to_numpy()):
+        row = log.iloc[i]
+        rate = get_rate_at(
+            db,
+            source_currency_id=int(row["price_currency_id"]),
+            target_currency_id=int(base_currency_ids.iloc[i]),
+            at=row["date"].to_pydatetime(),
+        )
+        if rate is None:
+            continue
+        rows.append(
+            {
+                "id": int(row["id"]),
+                "base_price_each": float(row["price_each"]) * rate,
+                "base_currency_id": int(base_currency_ids.iloc[i]),
+            }
+        )
+    if rows:
+        db.execute(update(PortfolioTransaction), rows)
+        priced = log["id"].isin([row["id"] for row in rows])
+        log.loc[priced, "base_price_each"] = [row["base_price_each"] for row in rows]
+        log.loc[priced, "base_currency_id"] = [row["base_currency_id"] for row in rows]
+    return len(rows)
+
+
+def _project(
+    log: pd.DataFrame, *, portfolios: Dict[int, Portfolio]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Holdings of a transaction log in one vectorized pass, grouped by
+    (portfolio, asset). Gives the same result as replaying every transaction
+    with `apply_transaction`:
+
+    - quantity is the running sum of the signed quantities
+    - average cost: every sale keeps a fraction of the cost held before it,
+      so the final cost basis is each buy's cost times the fractions kept by
+      the sales after it
+    - FIFO: sales consume the oldest lots first, so the total quantity
+      taken from the lots comes off their front in order. A sale takes at
+      most what is open at the time, which is a running minimum
+
+    Realized PnL is the sales' proceeds minus the cost that left the holding.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: One row per (portfolio, asset)
+            with the holding's figures and `replay` set where the log has to
+            be replayed instead, when a price has no conversion rate. And the
+            open FIFO lots of the other holdings, one row per buy.
+    """
+    sale = log["sale"].to_numpy(dtype=bool)
+    buy = ~sale
+    quantity = log["quantity"].to_numpy(dtype=float)
+
+    portfolio_ids = log["portfolio_id"].to_numpy()
+    # Base currency and method of every row's portfolio
+    keys = np.array(sorted(portfolios))
+    rows = np.searchsorted(keys, portfolio_ids)
+    base_currency_ids = np.array(
+        [portfolios[pid].base_currency_id for pid in keys], dtype=np.int64
+    )[rows]
+    fifo = np.array(
+        [portfolios[pid].cost_basis_method == CostBasisMethod.FIFO for pid in keys],
+        dtype=bool,
+    )[rows]
+    # Foreign prices were converted at the rate of their date by `_price_log`
+    priced = log["base_currency_id"].to_numpy(dtype=float) == base_currency_ids
+    cost_each = np.where(
+        log["price_currency_id"].to_numpy() == base_currency_ids,
+        log["price_each"].to_numpy(dtype=float),
+        np.where(priced, log["base_price_each"].to_numpy(dtype=float), np.nan),
+    )
+
+    # Consecutive rows of one (portfolio, asset)
+    asset_ids = log["asset_id"].to_numpy()
+    starts = np.ones(len(log), dtype=bool)
+    starts[1:] = (portfolio_ids[1:] != portfolio_ids[:-1]) | (
+        asset_ids[1:] != asset_ids[:-1]
+    )
+    pair = np.cumsum(starts) - 1
+
+    def grouped(values: np.ndarray):
+        return pd.Series(values).groupby(pair, sort=False)
+
+    held_after = grouped(np.where(sale, -quantity, quantity)).cumsum()
+    held_before = held_after.groupby(pair, sort=False).shift(1, fill_value=0.0)
+    held_before = held_before.to_numpy()
+
+    buy_cost = np.where(buy, quantity * cost_each, 0.0)
+    proceeds = np.where(sale, quantity * cost_each, 0.0)
+
+    # Average cost: fraction of the held cost each transaction keeps
+    kept = np.ones(len(log))
+    selling = sale & (held_before > 0)
+    kept[selling] = 1.0 - np.minimum(quantity[selling] / held_before[selling], 1.0)
+    # Product of the fractions kept after each row, suffix cumprod per pair
+    kept_after = pd.Series(kept[::-1]).groupby(pair[::-1], sort=False).cumprod()
+    kept_after = grouped(kept_after.to_numpy()[::-1]).shift(-1, fill_value=1.0)
+    kept_after = kept_after.to_numpy(dtype=float)
+    average_cost = buy_cost * kept_after
+
+    # FIFO: quantity taken from the lots up to each row, which is what was
+    # sold less the most any sale so far asked for beyond the open lots
+    bought = grouped(np.where(buy, quantity, 0.0)).cumsum().to_numpy()
+    sold = grouped(np.where(sale, quantity, 0.0)).cumsum().to_numpy()
+    taken = sold + np.minimum(grouped(bought - sold).cummin().to_numpy(), 0.0)
+    total_taken = grouped(taken).transform("last").to_numpy()
+    # What is left of each lot once the pair's total is taken
+    lot_remaining = np.where(buy, np.clip(bought - total_taken, 0.0, quantity), 0.0)
+    fifo_cost = lot_remaining * np.nan_to_num(cost_each)
+    replay = grouped(np.isnan(cost_each)).transform("any").to_numpy(dtype=bool)
+
+    frame = pd.DataFrame(
+        {
+            "portfolio_id": portfolio_ids,
+            "asset_id": asset_ids,
+            "quantity": held_after.to_numpy(),
+            "cost_basis": np.where(fifo, fifo_cost, average_cost),
+            "buy_cost": buy_cost,
+            "proceeds": proceeds,
+            "replay": replay,
+        }
+    )
+    holdings = frame.groupby(pair, sort=False).agg(
+        portfolio_id=("portfolio_id", "first"),
+        asset_id=("asset_id", "first"),
+        quantity=("quantity", "last"),
+        cost_basis=("cost_basis", "sum"),
+        buy_cost=("buy_cost", "sum"),
+        proceeds=("proceeds", "sum"),
+        replay=("replay", "first"),
+    )
+    holdings["realized_pnl"] = holdings["proceeds"] - (
+        holdings["buy_cost"] - holdings["cost_basis"]
+    )
+    holdings["avg_purchase_price"] = np.where(
+        holdings["quantity"] > 0,
+        holdings["cost_basis"] / holdings["quantity"].where(holdings["quantity"] > 0),
+        0.0,
+    )
+
+    # Open FIFO lots, fully consumed ones are never read again
+    open_lot = fifo & buy & (lot_remaining > 0) & ~replay
+    lots = log.loc[
+        open_lot, ["id", "portfolio_id", "asset_id", "quantity", "date"]
+    ].assign(remaining_quantity=lot_remaining[open_lot], cost_each=cost_each[open_lot])
+    return holdings.drop(columns=["buy_cost", "proceeds"]), lots
+
+
+def _write(
+    db: Session,
+    *,
+    portfolio_ids: List[int],
+    holdings: pd.DataFrame,
+    lots: pd.DataFrame,
+) -> None:
+    """
+    Replace the holdings and open lots of the given portfolios with a
+    projection. Holdings whose asset has no transactions left are zeroed,
+    like a replay of an empty log.
+    """
+    db.execute(
+        update(PortfolioHolding)
+        .where(PortfolioHolding.portfolio_id.in_(portfolio_ids))
+        .values(quantity=0.0, cost_basis=0.0, realized_pnl=0.0, avg_purchase_price=0.0)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(PortfolioLot)
+        .where(PortfolioLot.portfolio_id.in_(portfolio_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    projected = holdings[~holdings["replay"]]
+    crud_portfolio.upsert_holdings(
+        db,
+        rows=[
+            {
+                "portfolio_id": int(row.portfolio_id),
+                "asset_id": int(row.asset_id),
+                "quantity": float(row.quantity),
+                "cost_basis": float(row.cost_basis),
+                "avg_purchase_price": float(row.avg_purchase_price),
+                "realized_pnl": float(row.realized_pnl),
+            }
+            for row in projected.itertuples()
+        ],
+    )
+
+    if lots.empty:
+        return
+    lots = pd.DataFrame(
+        {
+            "portfolio_id": lots["portfolio_id"],
+            "asset_id": lots["asset_id"],
+            "transaction_id": lots["id"],
+            "quantity": lots["quantity"],
+            "remaining_quantity": lots["remaining_quantity"],
+            "cost_each": lots["cost_each"],
+            "acquired_at": lots["date"].fillna(pd.Timestamp.now(tz=timezone.utc)),
+        }
+    )
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        lots.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {PortfolioLot.__tablename__} ({', '.join(lots.columns)}) "
+                f"FROM STDIN WITH CSV",
+                buffer,
+            )
+        finally:
+            cursor.close()
+    else:
+        rows = lots.to_dict("records")
+        for row in rows:
+            row["acquired_at"] = row["acquired_at"].to_pydatetime()
+        db.execute(insert(PortfolioLot), rows)
+
+
+def rebuild_holdings(
+    db: Session, *, portfolio_ids: Optional[List[int]] = None
+) -> Dict[str, int]:
+    """
+    Rebuild the holdings of the given portfolios, or of all portfolios, from
+    their transaction log. Each batch of portfolios is read with one query,
+    its foreign currency prices not yet converted are priced at the rate of
+    their date, then it is projected with grouped cumulative sums instead of a per-transaction
+    replay, and written with one multi-row upsert. Only the holdings the
+    vectorized projection cannot reproduce are replayed one by one.
+
+    The portfolio rows are locked first, so transactions recorded meanwhile
+    wait and are applied on top of the rebuilt holdings. The holdings are
+    written with Core statements, so `PORTFOLIO_CHANGED` is published for
+    every rebuilt portfolio once the batch commits.
+
+    Returns:
+        Dict[str, int]: Number of portfolios, transactions and holdings
+                        rebuilt, and of holdings that were replayed
+    """
+    if portfolio_ids is None:
+        portfolio_ids = [
+            row[0] for row in db.query(Portfolio.id).order_by(Portfolio.id)
+        ]
+
+    result = {"portfolios": 0, "transactions": 0, "holdings": 0, "replayed": 0}
+    for offset in range(0, len(portfolio_ids), PROJECTION_BATCH_SIZE):
+        batch = portfolio_ids[offset : offset + PROJECTION_BATCH_SIZE]
+        portfolios = {
+            portfolio.id: portfolio
+            for portfolio in db.query(Portfolio)
+            .filter(Portfolio.id.in_(batch))
+            .order_by(Portfolio.id)
+            .with_for_update()
+        }
+        batch = list(portfolios)
+        log = _load_log(db, portfolio_ids=batch)
+        _price_log(db, log=log, portfolios=portfolios)
+        holdings, lots = _project(log, portfolios=portfolios)
+        _write(db, portfolio_ids=batch, holdings=holdings, lots=lots)
+
+        replay = holdings[holdings["replay"]]
+        for row in replay.itertuples():
+            rebuild_holding(
+                db,
+                portfolio=portfolios[int(row.portfolio_id)],
+                asset_id=int(row.asset_id),
+            )
+
+        checkpoints = log.groupby("portfolio_id")["id"].max()
+        for portfolio_id, transaction_id in checkpoints.items():
+            crud_portfolio.advance_checkpoint(
+                db, portfolio_id=int(portfolio_id), transaction_id=int(transaction_id)
+            )
+        for portfolio_id in batch:
+            events.publish_after_commit(
+                db, events.PORTFOLIO_CHANGED, portfolio_id=portfolio_id, since=None
+            )
+        save(db)
+
+        result["portfolios"] += len(batch)
+        result["transactions"] += len(log)
+        result["holdings"] += len(holdings)
+        result["replayed"] += len(replay)
+
+    logger.info(
+        f"Rebuilt {result['holdings']} holdings of {result['portfolios']} "
+        f"portfolios from {result['transactions']} transactions, "
+        f"{result['replayed']} replayed"
+    )
+    return result
+
+
+def catch_up(db: Session, *, portfolio_id: int) -> int:
+    """
+    Apply the transactions of a portfolio after its checkpoint to its
+    holdings, in order. An asset with a new transaction dated before one
+    that was already applied is replayed from its whole log instead.
+
+    The transactions may have been written to the log directly, so
+    `PORTFOLIO_CHANGED` is published since the earliest of them once this
+    commits.
+
+    Returns:
+        int: Number of transactions applied
+    """
+    portfolio = (
+        db.query(Portfolio)
+        .filter(Portfolio.id == portfolio_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+    if portfolio is None:
+        return 0
+    checkpoint = portfolio.holdings_checkpoint or 0
+
+    transactions = (
+        db.query(PortfolioTransaction)
+        .filter(
+            PortfolioTransaction.portfolio_id == portfolio_id,
+            PortfolioTransaction.id > checkpoint,
+        )
+        .order_by(PortfolioTransaction.transaction_date, PortfolioTransaction.id)
+        .all()
+    )
+    if not transactions:
+        return 0
+
+    by_asset: Dict[int, List[PortfolioTransaction]] = defaultdict(list)
+    for transaction in transactions:
+        by_asset[transaction.asset_id].append(transaction)
+    applied_until = dict(
+        db.query(
+            PortfolioTransaction.asset_id,
+            func.max(PortfolioTransaction.transaction_date),
+        )
+        .filter(
+            PortfolioTransaction.portfolio_id == portfolio_id,
+            PortfolioTransaction.id <= checkpoint,
+            PortfolioTransaction.asset_id.in_(by_asset),
+        )
+        .group_by(PortfolioTransaction.asset_id)
+        .all()
+    )
+
+    for asset_id, new in by_asset.items():
+        latest = applied_until.get(asset_id)
+        if latest is not None and _as_utc(new[0].transaction_date) < _as_utc(latest):
+            rebuild_holding(db, portfolio=portfolio, asset_id=asset_id)
+            continue
+
+        holding = lock_holding(db, portfolio_id=portfolio_id, asset_id=asset_id)
+        if holding is None:
+            holding = crud_portfolio.add_to_holding(
+                db, portfolio_id=portfolio_id, asset_id=asset_id, quantity=0.0
+            )
+        for transaction in new:
+            apply_transaction(
+                db, portfolio=portfolio, holding=holding, transaction=transaction
+            )
+
+    crud_portfolio.advance_checkpoint(
+        db,
+        portfolio_id=portfolio_id,
+        transaction_id=max(transaction.id for transaction in transactions),
+    )
+    events.publish_after_commit(
+        db,
+        events.PORTFOLIO_CHANGED,
+        portfolio_id=portfolio_id,
+        since=_as_utc(transactions[0].transaction_date),
+    )
+    save(db)
+    return len(transactions)
+
+
+def catch_up_all(db: Session) -> int:
+    """
+    Catch up every portfolio with transactions after its checkpoint, e.g.
+    ones written to the log directly. Portfolios are committed one by one.
+
+    Returns:
+        int: Number of transactions applied
+    """
+    behind = (
+        db.query(Portfolio.id)
+        .filter(
+            exists().where(
+                PortfolioTransaction.portfolio_id == Portfolio.id,
+                PortfolioTransaction.id
+                > func.coalesce(Portfolio.holdings_checkpoint, 0),
+            )
+        )
+        .order_by(Portfolio.id)
+        .all()
+    )
+    applied = 0
+    for (portfolio_id,) in behind:
+        applied += catch_up(db, portfolio_id=portfolio_id)
+    if applied:
+        logger.info(
+            f"Applied {applied} transactions to the holdings of "
+            f"{len(behind)} portfolios"
+        )
+    return applied
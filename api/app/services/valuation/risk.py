@@ -0,0 +1,295 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.market_data import MarketData, TimeFrame
+from app.models.portfolio import Portfolio
+from app.services.currency_conversion.converter import currency_converter
+from app.services.valuation.engine import load_holdings, value_holdings
+from app.services.valuation.history import _epoch_ns, get_bucket_starts
+
+# Covariance cache entries kept at most, least recently used dropped first
+RISK_CACHE_SIZE = 256
+# Share of a window's returns an asset needs to be measured. One with a
+# shorter history would cut the sample every other asset is measured over
+RISK_MIN_OBSERVATION_SHARE = 0.8
+
+RiskKey = Tuple[Tuple[int, ...], int, TimeFrame, pd.Timestamp]
+
+
+@dataclass
+class ReturnStats:
+    """
+    Return series of a set of assets over a window, with the statistics that
+    only depend on the assets and not on the portfolio weights. Assets with
+    returns for less than `RISK_MIN_OBSERVATION_SHARE` of the window are
+    left out of `asset_ids` and listed in `missing_asset_ids`.
+    """
+
+    asset_ids: np.ndarray
+    missing_asset_ids: np.ndarray
+    returns: np.ndarray
+    covariance: np.ndarray
+    volatility: np.ndarray
+    max_drawdown: np.ndarray
+
+
+class CovarianceCache:
+    """
+    Return statistics per (asset set, window, timeframe, last bucket). A new
+    candle moves the last bucket and so gets a new key; the TTL bounds how
+    long a still-forming candle is served.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[RiskKey, Tuple[float, ReturnStats]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: RiskKey) -> Optional[ReturnStats]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] > settings.RISK_CACHE_SECONDS:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: RiskKey, stats: ReturnStats) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), stats)
+            self._entries.move_to_end(key)
+            while len(self._entries) > RISK_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+covariance_cache = CovarianceCache()
+
+
+def _max_drawdown(returns: np.ndarray) -> np.ndarray:
+    """
+    Largest peak-to-trough loss of each column of a return matrix, as a
+    positive fraction.
+    """
+    wealth = np.cumprod(1 + returns, axis=0)
+    wealth = np.concatenate([np.ones((1,) + wealth.shape[1:]), wealth])
+    drawdown = 1 - wealth / np.maximum.accumulate(wealth, axis=0)
+    return drawdown.max(axis=0)
+
+
+def load_closes(
+    db: Session,
+    *,
+    asset_ids: np.ndarray,
+    bucket_starts: pd.DatetimeIndex,
+    timeframe: TimeFrame,
+) -> np.ndarray:
+    """
+    Close prices of the assets on a grid of buckets, as a (buckets, assets)
+    matrix from one query. Buckets without a candle carry the previous close
+    forward, NaN before an asset's first candle.
+    """
+    query = (
+        select(MarketData.asset_id, MarketData.date_time, MarketData.close_price)
+        .where(
+            MarketData.asset_id.in_(asset_ids.tolist()),
+            MarketData.timeframe == timeframe,
+            MarketData.date_time >= bucket_starts[0].to_pydatetime(),
+            MarketData.date_time
+            < (bucket_starts[-1] + timeframe.duration).to_pydatetime(),
+        )
+        .order_by(MarketData.date_time)
+    )
+    rows = pd.DataFrame(
+        db.execute(query).all(), columns=["asset_id", "date_time", "close_price"]
+    )
+    closes = np.full((len(bucket_starts), len(asset_ids)), np.nan)
+    if rows.empty:
+        return closes
+
+    dates = pd.to_datetime(rows["date_time"], utc=True)
+    row_index = (
+        np.searchsorted(_epoch_ns(bucket_starts), _epoch_ns(dates), side="right") - 1
+    )
+    column_index = np.searchsorted(asset_ids, rows["asset_id"].to_numpy())
+    # Rows are ordered by time, so the latest candle of a bucket is written last
+    closes[row_index, column_index] = rows["close_price"].to_numpy(dtype=float)
+    closes[closes <= 0] = np.nan
+    return pd.DataFrame(closes).ffill().to_numpy()
+
+
+def get_return_stats(
+    db: Session,
+    *,
+    asset_ids: np.ndarray,
+    timeframe: TimeFrame,
+    window: int,
+    now: Optional[datetime] = None,
+) -> ReturnStats:
+    """
+    Simple returns of the last `window` completed buckets of every asset and
+    their covariance, volatility and max drawdown, cached per asset set.
+    """
+    duration = timeframe.duration
+    end = now or datetime.now(timezone.utc)
+    last = pd.Timestamp(end).tz_convert("UTC").floor(duration) - duration
+    key = (tuple(asset_ids.tolist()), window, timeframe, last)
+    stats = covariance_cache.get(key)
+    if stats is not None:
+        return stats
+
+    bucket_starts = get_bucket_starts(
+        start=(last - window * duration).to_pydatetime(),
+        end=last.to_pydatetime(),
+        timeframe=timeframe,
+    )
+    closes = load_closes(
+        db, asset_ids=asset_ids, bucket_starts=bucket_starts, timeframe=timeframe
+    )
+    returns = closes[1:] / closes[:-1] - 1
+
+    # Only rows where every covered asset has a return are used, so all
+    # statistics share one sample. Closes are carried forward, so an asset
+    # only lacks returns before its first candle and the shared sample is
+    # as long as the shortest covered history
+    min_observations = max(2, math.ceil(window * RISK_MIN_OBSERVATION_SHARE))
+    covered = np.isfinite(returns).sum(axis=0) >= min_observations
+    returns = returns[:, covered]
+    returns = returns[np.isfinite(returns).all(axis=1)]
+    if len(returns) < 2 or not covered.any():
+        covered[:] = False
+        returns = np.empty((0, 0))
+
+    covariance = (
+        np.cov(returns, rowvar=False).reshape(returns.shape[1], returns.shape[1])
+        if returns.shape[1]
+        else np.empty((0, 0))
+    )
+    stats = ReturnStats(
+        asset_ids=asset_ids[covered],
+        missing_asset_ids=asset_ids[~covered],
+        returns=returns,
+        covariance=covariance,
+        volatility=np.sqrt(np.diag(covariance)),
+        max_drawdown=_max_drawdown(returns),
+    )
+    covariance_cache.set(key, stats)
+    return stats
+
+
+def _correlation(stats: ReturnStats) -> np.ndarray:
+    outer = np.outer(stats.volatility, stats.volatility)
+    return np.divide(
+        stats.covariance,
+        outer,
+        out=np.full(outer.shape, np.nan),
+        where=outer > 0,
+    )
+
+
+def compute_risk(
+    db: Session,
+    *,
+    portfolio: Portfolio,
+    timeframe: TimeFrame,
+    window: int,
+    confidence: float,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Risk of a portfolio's current holdings over the last `window` buckets of
+    their market data: volatility and max drawdown per asset and of the
+    portfolio, the correlation matrix, and historical VaR and CVaR.
+
+    Returns are taken in each asset's quote currency, so currency risk
+    against the base currency is not included. Holdings without market data
+    or without a rate are left out and the weights of the others rescaled;
+    `coverage` is the share of the portfolio value that was measured.
+
+    Volatilities are annualized; VaR, CVaR and drawdowns are fractions of
+    the measured value over one bucket or the whole window.
+    """
+    columns = load_holdings(db, portfolio_ids=[portfolio.id])
+    valuation = value_holdings(columns, converter=currency_converter.ensure_fresh(db))
+    values = np.nan_to_num(valuation.values)
+    held_ids, inverse = np.unique(columns.asset_id, return_inverse=True)
+    held_values = np.bincount(inverse, weights=values, minlength=len(held_ids))
+    held = held_values > 0
+    asset_ids, asset_values = held_ids[held], held_values[held]
+
+    stats = get_return_stats(
+        db, asset_ids=asset_ids, timeframe=timeframe, window=window, now=now
+    )
+    measured = asset_values[np.isin(asset_ids, stats.asset_ids)]
+    measured_value = float(measured.sum())
+    weights = measured / measured_value if measured_value else measured
+    total_value = float(values.sum())
+
+    periods_per_year = timedelta(days=365) / timeframe.duration
+    correlation = _correlation(stats)
+    result = {
+        "portfolio_id": portfolio.id,
+        "base_currency_id": portfolio.base_currency_id,
+        "timeframe": timeframe,
+        "window": window,
+        "confidence": confidence,
+        "observations": len(stats.returns),
+        "coverage": measured_value / total_value if total_value else None,
+        "volatility": None,
+        "var": None,
+        "cvar": None,
+        "var_amount": None,
+        "cvar_amount": None,
+        "max_drawdown": None,
+        "asset_ids": stats.asset_ids.tolist(),
+        "missing_asset_ids": held_ids[~np.isin(held_ids, stats.asset_ids)].tolist(),
+        "correlation": np.where(np.isnan(correlation), None, correlation).tolist(),
+        "assets": [
+            {
+                "asset_id": int(asset_id),
+                "weight": float(weight),
+                "volatility": float(volatility * np.sqrt(periods_per_year)),
+                "max_drawdown": float(drawdown),
+            }
+            for asset_id, weight, volatility, drawdown in zip(
+                stats.asset_ids, weights, stats.volatility, stats.max_drawdown
+            )
+        ],
+    }
+    if not measured_value or not len(stats.returns):
+        return result
+
+    portfolio_returns = stats.returns @ weights
+    var = -float(np.quantile(portfolio_returns, 1 - confidence))
+    tail = portfolio_returns[portfolio_returns <= -var]
+    cvar = -float(tail.mean()) if len(tail) else var
+    result.update(
+        volatility=float(
+            np.sqrt(weights @ stats.covariance @ weights * periods_per_year)
+        ),
+        var=var,
+        cvar=cvar,
+        var_amount=var * measured_value,
+        cvar_amount=cvar * measured_value,
+        max_drawdown=float(_max_drawdown(portfolio_returns)),
+    )
+    return result
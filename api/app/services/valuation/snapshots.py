@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.core import events
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud import portfolio_snapshot as crud_portfolio_snapshot
+from app.models.market_data import TimeFrame
+from app.models.portfolio import Portfolio
+from app.models.portfolio_snapshot import PortfolioSnapshot
+from app.models.portfolio_transaction import PortfolioTransaction
+from app.services.logger import logger
+from app.services.valuation.engine import value_portfolios
+from app.services.valuation.history import (
+    compute_nav_history,
+    compute_nav_series,
+    get_bucket_starts,
+)
+
+SNAPSHOT_TIMEFRAME = TimeFrame.ONE_DAY
+
+# Portfolios valued per pass of the snapshot job
+SNAPSHOT_BATCH_SIZE = 500
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def day_start(value: datetime) -> datetime:
+    value = _as_utc(value).astimezone(timezone.utc)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _first_days(
+    db: Session, *, portfolios: List[Portfolio], today: datetime
+) -> Dict[int, datetime]:
+    """
+    First day each portfolio still needs a snapshot for: the day after its
+    latest snapshot, or the day of its first transaction, but never further
+    back than `PORTFOLIO_SNAPSHOT_BACKFILL_DAYS`.
+    """
+    ids = [portfolio.id for portfolio in portfolios]
+    latest = crud_portfolio_snapshot.get_latest_days(db, portfolio_ids=ids)
+    first_transactions = dict(
+        db.query(
+            PortfolioTransaction.portfolio_id,
+            func.min(PortfolioTransaction.transaction_date),
+        )
+        .filter(PortfolioTransaction.portfolio_id.in_(ids))
+        .group_by(PortfolioTransaction.portfolio_id)
+        .all()
+    )
+    earliest = today - timedelta(days=settings.PORTFOLIO_SNAPSHOT_BACKFILL_DAYS)
+
+    first_days = {}
+    for portfolio in portfolios:
+        if portfolio.id in latest:
+            first = day_start(latest[portfolio.id]) + timedelta(days=1)
+        else:
+            first = day_start(
+                first_transactions.get(portfolio.id) or portfolio.created_at or today
+            )
+        first_days[portfolio.id] = max(first, earliest)
+    return first_days
+
+
+def take_snapshots(db: Session, *, now: Optional[datetime] = None) -> int:
+    """
+    Snapshot every active portfolio for each completed day since its latest
+    snapshot. The daily run fills yesterday, the first run after downtime
+    backfills the missed days.
+
+    Each batch of portfolios is valued from one read of their transactions
+    and the rate histories, then written with one multi-row insert.
+
+    Returns:
+        int: Number of snapshots written
+    """
+    today = day_start(now or datetime.now(timezone.utc))
+    portfolios = (
+        db.query(Portfolio)
+        .filter(Portfolio.is_active.is_(True))
+        .order_by(Portfolio.id)
+        .all()
+    )
+
+    written = 0
+    for offset in range(0, len(portfolios), SNAPSHOT_BATCH_SIZE):
+        batch = portfolios[offset : offset + SNAPSHOT_BATCH_SIZE]
+        first_days = _first_days(db, portfolios=batch, today=today)
+        batch = [p for p in batch if first_days[p.id] < today]
+        if not batch:
+            continue
+
+        start = min(first_days[p.id] for p in batch)
+        bucket_starts, values = compute_nav_series(
+            db,
+            portfolios=batch,
+            start=start,
+            end=today - timedelta(microseconds=1),
+            timeframe=SNAPSHOT_TIMEFRAME,
+        )
+        rows = []
+        for portfolio in batch:
+            first = pd.Timestamp(first_days[portfolio.id])
+            for bucket_start, value in zip(bucket_starts, values[portfolio.id]):
+                if bucket_start < first:
+                    continue
+                rows.append(
+                    {
+                        "portfolio_id": portfolio.id,
+                        "base_currency_id": portfolio.base_currency_id,
+                        "bucket_start": bucket_start.to_pydatetime(),
+                        "total_value": None if np.isnan(value) else float(value),
+                    }
+                )
+        if rows:
+            db.execute(insert(PortfolioSnapshot), rows)
+            db.commit()
+            written += len(rows)
+
+    logger.info(f"Wrote {written} portfolio snapshots")
+    return written
+
+
+def get_live_value(db: Session, *, portfolio: Portfolio) -> float:
+    """
+    Value of a portfolio right now, NaN if a holding cannot be converted.
+    """
+    valuation = value_portfolios(db, portfolio_ids=[portfolio.id])
+    if np.isnan(valuation.values).any():
+        return np.nan
+    return valuation.total_for(portfolio.id)
+
+
+def get_portfolio_history(
+    db: Session,
+    *,
+    portfolio: Portfolio,
+    start: datetime,
+    end: datetime,
+    timeframe: TimeFrame,
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """
+    Portfolio value at the end of each bucket. Completed buckets come from
+    the daily snapshots, the current partial bucket is valued live and only
+    days without a snapshot are rebuilt from the transaction log. Buckets
+    after the current one are NaN. Timeframes finer than a day are always
+    rebuilt.
+
+    Returns:
+        pd.DataFrame: One row per bucket with `bucket_start` and `value`
+    """
+    day = pd.Timedelta(SNAPSHOT_TIMEFRAME.duration)
+    duration = pd.Timedelta(timeframe.duration)
+    if duration < day or duration % day:
+        return compute_nav_history(
+            db, portfolio=portfolio, start=start, end=end, timeframe=timeframe
+        )
+
+    today = pd.Timestamp(day_start(now or datetime.now(timezone.utc)))
+    bucket_starts = get_bucket_starts(start=start, end=end, timeframe=timeframe)
+    values = np.full(len(bucket_starts), np.nan)
+
+    # A completed bucket's value is the snapshot of its last day
+    last_days = bucket_starts + duration - day
+    complete = last_days < today
+    found = np.zeros(len(bucket_starts), dtype=bool)
+    if complete.any():
+        snapshots = crud_portfolio_snapshot.get_multi(
+            db,
+            portfolio_id=portfolio.id,
+            start=last_days[complete][0].to_pydatetime(),
+            end=last_days[complete][-1].to_pydatetime(),
+        )
+        snapshot_values = {
+            pd.Timestamp(_as_utc(s.bucket_start)): s.total_value
+            for s in snapshots
+            if s.base_currency_id == portfolio.base_currency_id
+        }
+        for i in np.flatnonzero(complete):
+            if last_days[i] in snapshot_values:
+                value = snapshot_values[last_days[i]]
+                values[i] = np.nan if value is None else value
+                found[i] = True
+
+    missing = complete & ~found
+    if missing.any():
+        rebuilt = compute_nav_history(
+            db,
+            portfolio=portfolio,
+            start=bucket_starts[missing][0].to_pydatetime(),
+            end=(bucket_starts[missing][-1] + duration).to_pydatetime()
+            - timedelta(microseconds=1),
+            timeframe=timeframe,
+        ).set_index("bucket_start")["value"]
+        for i in np.flatnonzero(missing):
+            values[i] = rebuilt.get(bucket_starts[i], np.nan)
+
+    # Only the bucket holding today is valued live, later ones stay empty
+    current = ~complete & (bucket_starts <= today)
+    if current.any():
+        values[current] = get_live_value(db, portfolio=portfolio)
+
+    return pd.DataFrame({"bucket_start": bucket_starts, "value": values})
+
+
+def _on_portfolio_changed(
+    *, portfolio_id: int, since: Optional[datetime] = None
+) -> None:
+    # A transaction dated before today changes the value of every snapshot
+    # from its day on; the snapshot job rebuilds them on its next run
+    if since is None or day_start(since) >= day_start(datetime.now(timezone.utc)):
+        return
+    with SessionLocal() as db:
+        deleted = crud_portfolio_snapshot.delete_since(
+            db, portfolio_id=portfolio_id, since=day_start(since)
+        )
+        db.commit()
+    if deleted:
+        logger.info(f"Dropped {deleted} snapshots of portfolio {portfolio_id}")
+
+
+events.subscribe(events.PORTFOLIO_CHANGED, _on_portfolio_changed)
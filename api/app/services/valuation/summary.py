@@ -0,0 +1,257 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import events
+from app.core.config import settings
+from app.crud import portfolio_snapshot as crud_portfolio_snapshot
+from app.models.asset_type import AssetType
+from app.models.portfolio import Portfolio
+from app.services.currency_conversion.converter import currency_converter
+from app.services.valuation.engine import load_holdings, value_holdings
+from app.services.valuation.snapshots import SNAPSHOT_TIMEFRAME
+
+Edge = FrozenSet[int]
+
+
+class PortfolioSummaryCache:
+    """
+    Per-portfolio summaries, each remembering the currency pairs (undirected
+    edges) on the conversion paths it was valued through.
+
+    An entry is dropped when its portfolio changes or one of its edges gets
+    a new rate. A rate that adds a new edge can shorten paths anywhere, so it
+    drops every entry. The last dropped summary of a portfolio is kept as its
+    previous valuation for portfolios without daily snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, Dict[str, Any], Set[Edge]]] = {}
+        self._previous: Dict[int, Dict[str, Any]] = {}
+        # Bumped on every invalidation, so a summary computed while its
+        # inputs changed is not stored
+        self._generation = 0
+        self._portfolio_generation: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, portfolio_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(portfolio_id)
+            if (
+                entry
+                and time.monotonic() - entry[0]
+                > settings.PORTFOLIO_SUMMARY_CACHE_SECONDS
+            ):
+                self._drop(portfolio_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def token(self, portfolio_id: int) -> Tuple[int, int]:
+        with self._lock:
+            return self._generation, self._portfolio_generation.get(portfolio_id, 0)
+
+    def set(
+        self,
+        portfolio_id: int,
+        summary: Dict[str, Any],
+        edges: Set[Edge],
+        token: Tuple[int, int],
+    ) -> bool:
+        """
+        Store a summary unless the cache was invalidated for it since `token`
+        was taken.
+        """
+        with self._lock:
+            if token != (
+                self._generation,
+                self._portfolio_generation.get(portfolio_id, 0),
+            ):
+                return False
+            self._entries[portfolio_id] = (time.monotonic(), summary, edges)
+            return True
+
+    def previous(self, portfolio_id: int) -> Optional[Dict[str, Any]]:
+        return self._previous.get(portfolio_id)
+
+    def _drop(self, portfolio_id: int) -> None:
+        entry = self._entries.pop(portfolio_id, None)
+        if entry:
+            self._previous[portfolio_id] = entry[1]
+
+    def invalidate(self, portfolio_id: int) -> None:
+        with self._lock:
+            self._portfolio_generation[portfolio_id] = (
+                self._portfolio_generation.get(portfolio_id, 0) + 1
+            )
+            self._drop(portfolio_id)
+
+    def invalidate_edge(self, edge: Edge) -> None:
+        with self._lock:
+            self._generation += 1
+            stale = [pid for pid, entry in self._entries.items() if edge in entry[2]]
+            for pid in stale:
+                self._drop(pid)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            for pid in list(self._entries):
+                self._drop(pid)
+
+
+summary_cache = PortfolioSummaryCache()
+
+
+def _on_portfolio_changed(
+    *, portfolio_id: int, since: Optional[datetime] = None
+) -> None:
+    summary_cache.invalidate(portfolio_id)
+
+
+def _on_exchange_rate_created(
+    *,
+    source_currency_id: int,
+    target_currency_id: int,
+    rate: float,
+    effective_date: Optional[datetime],
+) -> None:
+    added = currency_converter.update_rate(
+        source_currency_id=source_currency_id,
+        target_currency_id=target_currency_id,
+        rate=rate,
+        effective_date=effective_date,
+    )
+    if added:
+        summary_cache.clear()
+    else:
+        summary_cache.invalidate_edge(
+            frozenset((source_currency_id, target_currency_id))
+        )
+
+
+def _on_relay_resumed() -> None:
+    summary_cache.clear()
+
+
+events.subscribe(events.PORTFOLIO_CHANGED, _on_portfolio_changed, remote=True)
+events.subscribe(events.EXCHANGE_RATE_CREATED, _on_exchange_rate_created, remote=True)
+events.subscribe(events.RELAY_RESUMED, _on_relay_resumed)
+
+
+def _path_edges(source_currency_id: int, target_currency_id: int) -> Set[Edge]:
+    path = currency_converter.path(
+        source_currency_id=source_currency_id, target_currency_id=target_currency_id
+    )
+    return {frozenset(pair) for pair in zip(path, path[1:])}
+
+
+def compute_summary(
+    db: Session, *, portfolio: Portfolio
+) -> Tuple[Dict[str, Any], Set[Edge]]:
+    """
+    Value a portfolio and break it down by asset type.
+
+    Returns:
+        Tuple[Dict[str, Any], Set[Edge]]: The summary and the currency pairs
+                                          it was converted through
+    """
+    columns = load_holdings(db, portfolio_ids=[portfolio.id])
+    valuation = value_holdings(columns, converter=currency_converter.ensure_fresh(db))
+    values = np.nan_to_num(valuation.values)
+    total = float(values.sum())
+
+    type_ids, inverse = np.unique(columns.asset_type_id, return_inverse=True)
+    type_values = np.bincount(inverse, weights=values, minlength=len(type_ids))
+    names = dict(
+        db.query(AssetType.id, AssetType.name).filter(
+            AssetType.id.in_(type_ids.tolist())
+        )
+    )
+    allocation = [
+        {
+            "asset_type_id": int(type_id),
+            "asset_type_name": names.get(int(type_id)),
+            "value": float(value),
+            "weight": float(value / total) if total else None,
+        }
+        for type_id, value in zip(type_ids, type_values)
+    ]
+
+    edges: Set[Edge] = set()
+    for currency_id in np.unique(columns.currency_id).tolist():
+        edges |= _path_edges(currency_id, portfolio.base_currency_id)
+
+    summary = {
+        "portfolio_id": portfolio.id,
+        "user_id": portfolio.user_id,
+        "base_currency_id": portfolio.base_currency_id,
+        "total_value": total,
+        "holdings_count": len(columns),
+        "unpriced_holdings_count": int(np.isnan(valuation.values).sum()),
+        "allocation": allocation,
+        "valued_at": datetime.now(timezone.utc),
+    }
+    return summary, edges
+
+
+def with_change(
+    summary: Dict[str, Any], previous: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Add the change against a previous valuation of the same portfolio.
+    """
+    result = dict(summary, previous_total_value=None, previous_valued_at=None)
+    result["change"] = result["change_percent"] = None
+    if previous is None or previous["base_currency_id"] != summary["base_currency_id"]:
+        return result
+
+    result["previous_total_value"] = previous["total_value"]
+    result["previous_valued_at"] = previous["valued_at"]
+    result["change"] = summary["total_value"] - previous["total_value"]
+    if previous["total_value"]:
+        result["change_percent"] = result["change"] / previous["total_value"] * 100
+    return result
+
+
+def get_snapshot(db: Session, *, portfolio: Portfolio) -> Optional[Dict[str, Any]]:
+    """
+    The latest daily snapshot in the shape of a summary, or None if there is
+    none to compare against.
+    """
+    snapshot = crud_portfolio_snapshot.get_latest(db, portfolio_id=portfolio.id)
+    if snapshot is None or snapshot.total_value is None:
+        return None
+    return {
+        "base_currency_id": snapshot.base_currency_id,
+        "total_value": snapshot.total_value,
+        "valued_at": snapshot.bucket_start + SNAPSHOT_TIMEFRAME.duration,
+    }
+
+
+def get_cached_summary(portfolio_id: int) -> Optional[Dict[str, Any]]:
+    return summary_cache.get(portfolio_id)
+
+
+def build_summary(db: Session, *, portfolio: Portfolio) -> Dict[str, Any]:
+    """
+    Compute a portfolio's summary, with the change since its previous
+    valuation, and cache it.
+    """
+    token = summary_cache.token(portfolio.id)
+    summary, edges = compute_summary(db, portfolio=portfolio)
+    summary = with_change(
+        summary,
+        get_snapshot(db, portfolio=portfolio) or summary_cache.previous(portfolio.id),
+    )
+    summary_cache.set(portfolio.id, summary, edges, token)
+    return summary
@@ -0,0 +1,166 @@
+"""
+Throughput of the hot read endpoints under concurrent load.
+
+Keeps `--concurrency` keep-alive connections busy for `--duration` seconds
+against a running server, round-robin over the portfolio list, a
+portfolio, a page of transactions and the holdings, and reports requests
+per second and latency. The client writes raw HTTP/1.1 so it stays cheap
+next to the server. Start the server from the `api` directory first:
+
+    uvicorn app.main:app --port 8765 --log-level warning
+    python -m benchmarks.async_endpoints --concurrency 10 50 200
+
+The benchmark user and its portfolio are created in the server's database
+on first run.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from app import models
+from app.core.config import settings
+from app.core.database import SessionLocal
+from benchmarks.common import auth_headers, get_or_create_user, summarize
+
+EMAIL = "endpoints@benchmark.example.com"
+TRANSACTIONS = 50
+
+
+def prepare(base_url: str) -> tuple:
+    """
+    Token of the benchmark user and the id of its portfolio.
+    """
+    with SessionLocal() as db:
+        user = get_or_create_user(db, email=EMAIL)
+        headers = auth_headers(user)
+        portfolio = (
+            db.query(models.Portfolio)
+            .filter(models.Portfolio.user_id == user.id)
+            .first()
+        )
+        if portfolio is not None:
+            return headers, portfolio.id
+
+        currency = db.query(models.Currency).order_by(models.Currency.id).first()
+        asset_type = db.query(models.AssetType).first()
+        portfolio = models.Portfolio(
+            name="Benchmark", user_id=user.id, base_currency_id=currency.id
+        )
+        assets = [
+            models.Asset(
+                name=f"Endpoints {i}",
+                symbol=f"ENDPOINTS{i}",
+                asset_type_id=asset_type.id,
+                currency_id=currency.id,
+            )
+            for i in range(5)
+        ]
+        db.add_all([portfolio, *assets])
+        db.commit()
+        portfolio_id, currency_id = portfolio.id, currency.id
+        asset_ids = [asset.id for asset in assets]
+
+    # Through the API, so the holdings are projected as usual
+    now = datetime.now(timezone.utc)
+    for i in range(TRANSACTIONS):
+        body = {
+            "portfolio_id": portfolio_id,
+            "asset_id": asset_ids[i % len(asset_ids)],
+            "transaction_type": "buy",
+            "quantity": 1,
+            "price_each": 10,
+            "price_currency_id": currency_id,
+            "transaction_date": (now - timedelta(days=i)).isoformat(),
+        }
+        request = urllib.request.Request(
+            f"{base_url}{settings.API_V1_STR}/portfolio-transactions/",
+            data=json.dumps(body).encode(),
+            headers={**headers, "Content-Type": "application/json"},
+        )
+        urllib.request.urlopen(request).read()
+    return headers, portfolio_id
+
+
+async def run(*, host: str, port: int, requests: list, concurrency: int, duration):
+    timings = []
+    errors = 0
+    end = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        i = offset
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            i += 1
+            status = await reader.readline()
+            if not status:
+                # The server closed the connection
+                errors += 1
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            timings.append(time.perf_counter() - start)
+            if b" 200 " not in status:
+                errors += 1
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"concurrency {concurrency}: {len(timings) / elapsed:.0f} req/s, "
+        f"{summarize(timings)}, errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    headers, portfolio_id = prepare(args.url)
+    api = settings.API_V1_STR
+    paths = [
+        f"{api}/portfolios/",
+        f"{api}/portfolios/{portfolio_id}",
+        f"{api}/portfolio-transactions/?limit=20&total=none",
+        f"{api}/portfolios/{portfolio_id}/holdings",
+    ]
+    url = urlsplit(args.url)
+    requests = [
+        (
+            f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+            f"Authorization: {headers['Authorization']}\r\n\r\n"
+        ).encode()
+        for path in paths
+    ]
+    for concurrency in args.concurrency:
+        asyncio.run(
+            run(
+                host=url.hostname,
+                port=url.port or 80,
+                requests=requests,
+                concurrency=concurrency,
+                duration=args.duration,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
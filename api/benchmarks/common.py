@@ -0,0 +1,43 @@
+import statistics
+from typing import Dict, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.security import create_access_token, get_password_hash
+
+PASSWORD = "benchmark"
+
+
+def get_or_create_user(db: Session, *, email: str) -> models.User:
+    """
+    Benchmark user with password `PASSWORD`, created on first use.
+    """
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is None:
+        currency = db.query(models.Currency).order_by(models.Currency.id).first()
+        user = models.User(
+            email=email,
+            hashed_password=get_password_hash(PASSWORD),
+            full_name="Benchmark",
+            preferred_currency_id=currency.id,
+        )
+        db.add(user)
+        db.commit()
+    return user
+
+
+def auth_headers(user: models.User) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token(user.id)}"}
+
+
+def summarize(timings: Sequence[float]) -> str:
+    """
+    Median, p95 and max of timings in seconds, in milliseconds.
+    """
+    ordered: List[float] = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (
+        f"median {statistics.median(ordered) * 1000:.1f} ms, "
+        f"p95 {p95 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms"
+    )
@@ -0,0 +1,82 @@
+"""
+Login throughput under a burst, and what it does to other endpoints.
+
+Fires `--logins` concurrent logins through the ASGI app while a probe keeps
+requesting the currency list, and reports logins per second and the probe
+latency. The bcrypt cost and the hashing pool come from the settings, so
+size the executor by rerunning with other values:
+
+    PASSWORD_HASH_ROUNDS=10 PASSWORD_HASH_WORKERS=2 python -m benchmarks.login
+
+Run from the `api` directory against a migrated scratch database.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.main import app
+from benchmarks.common import PASSWORD, auth_headers, get_or_create_user, summarize
+
+EMAIL = "login@benchmark.example.com"
+
+
+async def run(*, logins: int, headers) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+
+        async def login():
+            response = await client.post(
+                f"{settings.API_V1_STR}/auth/access-token",
+                data={"username": EMAIL, "password": PASSWORD},
+            )
+            assert response.status_code == 200, response.text
+
+        async def probe(done: asyncio.Event):
+            timings = []
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get(
+                    f"{settings.API_V1_STR}/currencies/", headers=headers
+                )
+                timings.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+            return timings
+
+        # Upgrades the stored hash to the configured rounds, if needed
+        await login()
+
+        done = asyncio.Event()
+        probing = asyncio.create_task(probe(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        timings = await probing
+
+    print(
+        f"rounds {settings.PASSWORD_HASH_ROUNDS}, "
+        f"workers {settings.PASSWORD_HASH_WORKERS}: "
+        f"{logins} logins in {elapsed:.2f} s ({logins / elapsed:.1f}/s)"
+    )
+    print(f"probe during the burst: {summarize(timings)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        headers = auth_headers(get_or_create_user(db, email=EMAIL))
+    asyncio.run(run(logins=args.logins, headers=headers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Range query and pruning costs of exchange rates in a plain heap table
+versus monthly range partitions (Postgres only).
+
+Builds two scratch tables shaped like `exchange_rates` in the configured
+database, one plain and one partitioned like the migration does, fills
+both with the same rows spread evenly over `--months` months, then times:
+
+- a one-day and a one-month range query for one currency pair
+- pruning the oldest month: `DELETE` plus `VACUUM` on the heap table,
+  `DETACH` plus `DROP` of its partition on the partitioned one
+
+Run from the `api` directory against a scratch database:
+
+    python -m benchmarks.partitions --rows 100000000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.services.retention.partitions import (
+    add_months,
+    create_month_partition,
+    list_month_partitions,
+    month_start,
+)
+
+HEAP = "bench_exchange_rates_heap"
+PARTITIONED = "bench_exchange_rates_partitioned"
+PAIRS = 20
+
+COLUMNS = """
+    id bigint NOT NULL,
+    rate double precision NOT NULL,
+    effective_date timestamptz NOT NULL,
+    source_currency_id integer,
+    target_currency_id integer
+"""
+
+
+def as_datetime(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def create_tables(conn, first_month, months):
+    conn.execute(text(f"DROP TABLE IF EXISTS {HEAP}, {PARTITIONED} CASCADE"))
+    conn.execute(text(f"CREATE TABLE {HEAP} ({COLUMNS}, PRIMARY KEY (id))"))
+    conn.execute(
+        text(
+            f"CREATE TABLE {PARTITIONED} ({COLUMNS}, PRIMARY KEY (id, effective_date)) "
+            f"PARTITION BY RANGE (effective_date)"
+        )
+    )
+    for offset in range(months):
+        create_month_partition(
+            conn, PARTITIONED, "effective_date", add_months(first_month, offset)
+        )
+    conn.execute(
+        text(f"CREATE TABLE {PARTITIONED}_default PARTITION OF {PARTITIONED} DEFAULT")
+    )
+
+
+def fill(conn, table, first_month, months, rows):
+    # One INSERT per month keeps each statement's memory bounded
+    per_month = rows // months
+    for offset in range(months):
+        lower = add_months(first_month, offset)
+        upper = add_months(lower, 1)
+        conn.execute(
+            text(
+                f"INSERT INTO {table} SELECT "
+                f"  :base + n, 100 + random(), "
+                f"  :lower + (n * (:upper - :lower) / :per_month), "
+                f"  n % {PAIRS} + 1, (n / {PAIRS}) % {PAIRS} + 1 "
+                f"FROM generate_series(0, :per_month - 1) AS n"
+            ),
+            {
+                "base": offset * per_month,
+                "lower": as_datetime(lower),
+                "upper": as_datetime(upper),
+                "per_month": per_month,
+            },
+        )
+        conn.commit()
+    conn.execute(
+        text(
+            f"CREATE INDEX {table}_pair_date ON {table} "
+            f"(source_currency_id, target_currency_id, effective_date)"
+        )
+    )
+    conn.execute(text(f"CREATE INDEX {table}_date_id ON {table} (effective_date, id)"))
+    conn.commit()
+
+
+def time_query(conn, table, lower, upper, repeat):
+    query = text(
+        f"SELECT count(*), min(rate), max(rate) FROM {table} "
+        f"WHERE source_currency_id = 1 AND target_currency_id = 1 "
+        f"AND effective_date >= :lower AND effective_date < :upper"
+    )
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query, {"lower": lower, "upper": upper}).one()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def prune_heap(conn, cutoff):
+    start = time.perf_counter()
+    deleted = conn.execute(
+        text(f"DELETE FROM {HEAP} WHERE effective_date < :cutoff"), {"cutoff": cutoff}
+    ).rowcount
+    conn.commit()
+    deleted_at = time.perf_counter()
+    conn.execution_options(isolation_level="AUTOCOMMIT").execute(text(f"VACUUM {HEAP}"))
+    return deleted, deleted_at - start, time.perf_counter() - deleted_at
+
+
+def prune_partitioned(conn, cutoff):
+    # The statements `drop_partitions_before` runs for each expired month
+    start = time.perf_counter()
+    dropped = 0
+    for name, month in list_month_partitions(conn, PARTITIONED):
+        if add_months(month, 1) > cutoff.date():
+            break
+        conn.execute(text(f"ALTER TABLE {PARTITIONED} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped += 1
+    conn.commit()
+    return dropped, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the tables")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Partitioning is only benchmarked on Postgres")
+
+    first_month = add_months(
+        month_start(datetime.now(timezone.utc)), -(args.months - 1)
+    )
+    with engine.connect() as conn:
+        create_tables(conn, first_month, args.months)
+        conn.commit()
+        for table in (HEAP, PARTITIONED):
+            start = time.perf_counter()
+            fill(conn, table, first_month, args.months, args.rows)
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+                text(f"VACUUM ANALYZE {table}")
+            )
+            print(f"{table}: loaded in {time.perf_counter() - start:.1f} s")
+
+        middle = add_months(first_month, args.months // 2)
+        day = datetime(middle.year, middle.month, 10, tzinfo=timezone.utc)
+        ranges = {
+            "1 day": (day, day.replace(day=11)),
+            "1 month": (as_datetime(middle), as_datetime(add_months(middle, 1))),
+        }
+        for label, (lower, upper) in ranges.items():
+            for table in (HEAP, PARTITIONED):
+                elapsed = time_query(conn, table, lower, upper, args.repeat)
+                print(f"{label} range, {table}: {elapsed * 1000:.1f} ms")
+
+        cutoff = as_datetime(add_months(first_month, 1))
+        deleted, delete_seconds, vacuum_seconds = prune_heap(conn, cutoff)
+        print(
+            f"prune one month, {HEAP}: DELETE {deleted} rows {delete_seconds:.2f} s, "
+            f"VACUUM {vacuum_seconds:.2f} s"
+        )
+        dropped, drop_seconds = prune_partitioned(conn, cutoff)
+        print(
+            f"prune one month, {PARTITIONED}: "
+            f"DETACH+DROP {dropped} partition(s) {drop_seconds:.3f} s"
+        )
+
+        if not args.keep:
+            conn.execute(text(f"DROP TABLE IF EXISTS {HEAP}, {PARTITIONED} CASCADE"))
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
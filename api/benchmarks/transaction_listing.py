@@ -0,0 +1,168 @@
+"""
+Latency of the user-scoped transaction list with a large log per user.
+
+Seeds `--per-user` transactions for each of two benchmark users, spread
+over their portfolios, assets and two years, then times through the API
+(`total=none`) the first page, cursor pages and the portfolio, asset and
+date range filters of one of them.
+
+The insert uses `generate_series`, so this runs on Postgres only. Run from
+the `api` directory against a migrated scratch database:
+
+    python -m benchmarks.transaction_listing --per-user 1000000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import case, func, insert, literal, select, text
+
+from app import models
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.main import app
+from app.models.portfolio_transaction import TransactionType
+from benchmarks.common import auth_headers, get_or_create_user, summarize
+
+USERS = ("listing-1@benchmark.example.com", "listing-2@benchmark.example.com")
+PORTFOLIOS_PER_USER = 5
+ASSETS = 20
+SPAN = timedelta(days=730)
+
+
+def seed(db, *, user, per_user, now):
+    currency = db.query(models.Currency).order_by(models.Currency.id).first()
+    asset_type = db.query(models.AssetType).first()
+    portfolios = (
+        db.query(models.Portfolio).filter(models.Portfolio.user_id == user.id).all()
+    )
+    for i in range(len(portfolios), PORTFOLIOS_PER_USER):
+        portfolios.append(
+            models.Portfolio(
+                name=f"Benchmark {i}", user_id=user.id, base_currency_id=currency.id
+            )
+        )
+    assets = db.query(models.Asset).filter(models.Asset.symbol.like("BENCH%")).all()
+    for i in range(len(assets), ASSETS):
+        assets.append(
+            models.Asset(
+                name=f"Benchmark {i}",
+                symbol=f"BENCH{i}",
+                asset_type_id=asset_type.id,
+                currency_id=currency.id,
+            )
+        )
+    db.add_all(portfolios + assets)
+    db.commit()
+
+    existing = (
+        db.query(func.count(models.PortfolioTransaction.id))
+        .filter(
+            models.PortfolioTransaction.portfolio_id.in_([p.id for p in portfolios])
+        )
+        .scalar()
+    )
+    missing = per_user - existing
+    if missing > 0:
+        n = func.generate_series(1, missing).table_valued("value").render_derived()
+        portfolio_id = case(
+            {i: p.id for i, p in enumerate(portfolios)},
+            value=n.c.value % len(portfolios),
+        )
+        asset_id = case(
+            {i: a.id for i, a in enumerate(assets)}, value=n.c.value % len(assets)
+        )
+        step = max(1, int(SPAN.total_seconds()) // missing)
+        db.execute(
+            insert(models.PortfolioTransaction).from_select(
+                [
+                    "portfolio_id",
+                    "asset_id",
+                    "transaction_type",
+                    "quantity",
+                    "price_each",
+                    "price_currency_id",
+                    "transaction_date",
+                ],
+                select(
+                    portfolio_id,
+                    asset_id,
+                    literal(
+                        TransactionType.BUY,
+                        models.PortfolioTransaction.transaction_type.type,
+                    ),
+                    literal(1.0),
+                    literal(1.0),
+                    literal(currency.id),
+                    literal(now)
+                    - func.make_interval(0, 0, 0, 0, 0, 0, n.c.value * step),
+                ),
+            )
+        )
+        db.commit()
+    return portfolios, assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--per-user", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("The listing benchmark seeds with generate_series (Postgres)")
+
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        users = [get_or_create_user(db, email=email) for email in USERS]
+        start = time.perf_counter()
+        seeded = [
+            seed(db, user=user, per_user=args.per_user, now=now) for user in users
+        ]
+        print(f"Seeded in {time.perf_counter() - start:.1f} s")
+        portfolios, assets = seeded[0]
+        headers = auth_headers(users[0])
+        portfolio_id, asset_id = portfolios[0].id, assets[0].id
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("ANALYZE portfolio_transactions")
+        )
+
+    url = f"{settings.API_V1_STR}/portfolio-transactions/"
+    month_ago = now - timedelta(days=30)
+    cases = {
+        "first page": {},
+        "portfolio filter": {"portfolio_id": portfolio_id},
+        "asset filter": {"asset_id": asset_id},
+        "last 30 days": {"from": month_ago.isoformat(), "to": now.isoformat()},
+    }
+
+    with TestClient(app) as client:
+
+        def get(params):
+            start = time.perf_counter()
+            response = client.get(
+                url, headers=headers, params={"limit": 100, "total": "none", **params}
+            )
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            return elapsed, response.json()
+
+        get({})  # Warm up the connection pools and caches
+        for label, params in cases.items():
+            timings = [get(params)[0] for _ in range(args.repeat)]
+            print(f"{label}: {summarize(timings)}")
+
+        timings = []
+        cursor = get({})[1]["next_cursor"]
+        for _ in range(args.repeat):
+            elapsed, page = get({"cursor": cursor})
+            timings.append(elapsed)
+            cursor = page["next_cursor"]
+        print(f"cursor pages: {summarize(timings)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Settings are read on import, so point the app at a scratch SQLite database
+# before anything from it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ["SQLALCHEMY_DATABASE_URI"] = (
+    f"sqlite:///{_db_dir}/test.db"
+)
+os.environ["SECRET_KEY"] = "test"
+os.environ["BACKGROUND_TASKS_ENABLED"] = "false"
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import models  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def client():
+    config = Config(os.path.join(API_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(API_DIR, "alembic"))
+    command.upgrade(config, "head")
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(scope="session")
+def superuser_headers(client):
+    response = client.post(
+        f"{settings.API_V1_STR}/auth/access-token",
+        data={
+            "username": settings.FIRST_SUPERUSER_EMAIL,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        },
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def superuser(db) -> models.User:
+    return db.query(models.User).filter_by(email=settings.FIRST_SUPERUSER_EMAIL).one()
+
+
+@pytest.fixture
+def currency(db) -> models.Currency:
+    return db.query(models.Currency).order_by(models.Currency.id).first()
+
+
+@pytest.fixture
+def make_portfolio(db, superuser, currency):
+    def make(**fields) -> models.Portfolio:
+        portfolio = models.Portfolio(
+            **{
+                "name": "Test portfolio",
+                "user_id": superuser.id,
+                "base_currency_id": currency.id,
+                **fields,
+            }
+        )
+        db.add(portfolio)
+        db.commit()
+        return portfolio
+
+    return make
+
+
+@pytest.fixture
+def make_asset(db, currency):
+    asset_type = db.query(models.AssetType).first()
+
+    def make(**fields) -> models.Asset:
+        asset = models.Asset(
+            **{
+                "name": "Test asset",
+                "symbol": "TEST",
+                "asset_type_id": asset_type.id,
+                "currency_id": currency.id,
+                **fields,
+            }
+        )
+        db.add(asset)
+        db.commit()
+        return asset
+
+    return make
+
+
+@pytest.fixture
+def portfolio(make_portfolio) -> models.Portfolio:
+    return make_portfolio()
+
+
+@pytest.fixture
+def asset(make_asset) -> models.Asset:
+    return make_asset()
+
+
+@pytest.fixture
+def foreign_currency(db, currency) -> models.Currency:
+    """
+    A new currency quoted at 2 `currency` 30 days ago and at 3 since a day ago.
+    """
+    foreign = models.Currency(name="Foreign", code="FRN", symbol="F")
+    db.add(foreign)
+    db.commit()
+    now = datetime.now(timezone.utc)
+    db.add_all(
+        models.ExchangeRate(
+            source_currency_id=foreign.id,
+            target_currency_id=currency.id,
+            rate=rate,
+            effective_date=now - timedelta(days=days_ago),
+        )
+        for rate, days_ago in [(2.0, 30), (3.0, 1)]
+    )
+    db.commit()
+    return foreign
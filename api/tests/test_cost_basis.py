@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+
+
+def test_foreign_buys_are_costed_at_the_rate_of_their_date(
+    client, superuser_headers, portfolio, asset, foreign_currency
+):
+    now = datetime.now(timezone.utc)
+
+    def buy(days_ago):
+        response = client.post(
+            f"{settings.API_V1_STR}/portfolio-transactions/",
+            headers=superuser_headers,
+            json={
+                "portfolio_id": portfolio.id,
+                "asset_id": asset.id,
+                "transaction_type": "buy",
+                "quantity": 1,
+                "price_each": 10,
+                "price_currency_id": foreign_currency.id,
+                "transaction_date": (now - timedelta(days=days_ago)).isoformat(),
+            },
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    def cost_basis():
+        response = client.get(
+            f"{settings.API_V1_STR}/portfolios/{portfolio.id}/pnl",
+            headers=superuser_headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["cost_basis"]
+
+    buy(days_ago=0)
+    assert cost_basis() == 30
+    # Backdated, so the holding is replayed
+    second = buy(days_ago=10)
+    assert cost_basis() == 50
+
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolios/holdings/rebuild",
+        headers=superuser_headers,
+        params={"portfolio_id": portfolio.id},
+    )
+    assert response.status_code == 200, response.text
+    assert cost_basis() == 50
+
+    response = client.delete(
+        f"{settings.API_V1_STR}/portfolio-transactions/{second}",
+        headers=superuser_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert cost_basis() == 30
@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+from app.core import events
+
+
+def test_relayed_events_reach_only_remote_handlers_of_other_processes(monkeypatch):
+    local, remote = [], []
+
+    def on_local(**payload):
+        local.append(payload)
+
+    def on_remote(**payload):
+        remote.append(payload)
+
+    events.subscribe("relay_test", on_local)
+    events.subscribe("relay_test", on_remote, remote=True)
+    try:
+        since = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        own = events._messages([("relay_test", {"portfolio_id": 1, "since": since})])
+        for message in own:
+            events.receive(message)
+        assert local == remote == []
+
+        monkeypatch.setattr(events, "_ORIGIN", "other")
+        batch = [
+            ("relay_test", {"portfolio_id": i, "since": since}) for i in range(500)
+        ]
+        messages = events._messages(batch)
+        assert len(messages) > 1
+        assert all(len(m) <= events.RELAY_MESSAGE_BYTES for m in messages)
+        monkeypatch.undo()
+
+        for message in messages:
+            events.receive(message)
+        assert local == []
+        assert remote == [payload for _, payload in batch]
+    finally:
+        events.unsubscribe("relay_test", on_local)
+        events.unsubscribe("relay_test", on_remote)
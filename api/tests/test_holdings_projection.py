@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from app import models
+from app.core.config import settings
+from app.services.valuation.projection import catch_up_all
+
+
+def test_holdings_rebuilds_invalidate_the_summary(
+    client, db, superuser_headers, portfolio, asset
+):
+    def write_to_log(quantity):
+        # Straight to the log, like a bulk load, bypassing the session
+        db.execute(
+            insert(models.PortfolioTransaction),
+            [
+                {
+                    "portfolio_id": portfolio.id,
+                    "asset_id": asset.id,
+                    "transaction_type": "buy",
+                    "quantity": quantity,
+                    "price_each": 1,
+                    "price_currency_id": portfolio.base_currency_id,
+                    "transaction_date": datetime.now(timezone.utc),
+                }
+            ],
+        )
+        db.commit()
+
+    def total_value():
+        response = client.get(
+            f"{settings.API_V1_STR}/portfolios/{portfolio.id}/summary",
+            headers=superuser_headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["total_value"]
+
+    write_to_log(200000)
+    catch_up_all(db)
+    assert total_value() == 200000
+
+    write_to_log(5)
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolios/holdings/rebuild",
+        headers=superuser_headers,
+        params={"portfolio_id": portfolio.id},
+    )
+    assert response.status_code == 200, response.text
+    assert total_value() == 200005
+
+    write_to_log(1)
+    catch_up_all(db)
+    assert total_value() == 200006
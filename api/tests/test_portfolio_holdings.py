@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import delete, event
+
+from app import crud, models
+from app.api.v1.endpoints.portfolio import _value_holdings_page
+from app.core.config import settings
+from app.core.database import async_engine, async_read_engine, engine, read_engine
+
+
+@contextmanager
+def count_statements():
+    engines = {
+        id(e): e
+        for e in (
+            engine,
+            read_engine,
+            async_engine.sync_engine,
+            async_read_engine.sync_engine,
+        )
+    }.values()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for e in engines:
+        event.listen(e, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def create_portfolio(db, make_portfolio, make_asset):
+    currencies = db.query(models.Currency).order_by(models.Currency.id).all()
+
+    def create(*, holdings: int) -> int:
+        portfolio = make_portfolio(name=f"{holdings} holdings")
+        for i in range(holdings):
+            # Spread the assets over the currencies, so holdings need conversion
+            asset = make_asset(
+                name=f"Asset {holdings}-{i}",
+                currency_id=currencies[i % len(currencies)].id,
+            )
+            db.add(
+                models.PortfolioHolding(
+                    portfolio=portfolio, asset=asset, quantity=i + 1
+                )
+            )
+        for currency in currencies[1:]:
+            db.add(
+                models.ExchangeRate(
+                    source_currency_id=currency.id,
+                    target_currency_id=currencies[0].id,
+                    rate=2.0,
+                )
+            )
+        db.commit()
+        return portfolio.id
+
+    return create
+
+
+def test_get_portfolio_holdings_query_count_is_constant(
+    client, superuser_headers, create_portfolio
+):
+    portfolio_ids = {
+        holdings: create_portfolio(holdings=holdings) for holdings in (5, 100)
+    }
+
+    def get_holdings(portfolio_id):
+        response = client.get(
+            f"{settings.API_V1_STR}/portfolios/{portfolio_id}/holdings",
+            headers=superuser_headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    # Warm the token and user caches and load the currency converter, which
+    # only happen on the first request
+    get_holdings(portfolio_ids[5])
+
+    counts = {}
+    for holdings, portfolio_id in portfolio_ids.items():
+        with count_statements() as statements:
+            result = get_holdings(portfolio_id)
+        assert len(result) == holdings
+        assert all(row["total_value"] is not None for row in result)
+        counts[holdings] = len(statements)
+
+    assert counts[5] == counts[100], counts
+
+
+def test_delete_portfolio_holding_of_another_portfolio(
+    client, db, superuser_headers, create_portfolio
+):
+    portfolio_id = create_portfolio(holdings=1)
+    other = db.get(models.Portfolio, create_portfolio(holdings=1))
+    holding_id = other.holdings[0].id
+
+    response = client.delete(
+        f"{settings.API_V1_STR}/portfolios/{portfolio_id}/holdings/{holding_id}",
+        headers=superuser_headers,
+    )
+
+    assert response.status_code == 404, response.text
+    db.expire_all()
+    assert db.get(models.PortfolioHolding, holding_id) is not None
+    assert (
+        db.query(models.PortfolioTransaction)
+        .filter(models.PortfolioTransaction.portfolio_id.in_([portfolio_id, other.id]))
+        .count()
+        == 0
+    )
+
+
+def test_holdings_removed_after_the_page_was_read_are_not_valued(db, create_portfolio):
+    portfolio = db.get(models.Portfolio, create_portfolio(holdings=3))
+    rows = crud.portfolio.get_multi_holdings(db, portfolio_id=portfolio.id, limit=3)[0]
+    for removed in (rows[1], rows[2]):
+        db.execute(
+            delete(models.PortfolioHolding).where(
+                models.PortfolioHolding.id == removed.id
+            )
+        )
+    db.commit()
+
+    _value_holdings_page(db, portfolio=portfolio, rows=rows, whole_portfolio=False)
+
+    assert rows[0].total_value == 1
+    assert getattr(rows[1], "total_value", None) is None
+    assert getattr(rows[2], "total_value", None) is None
+
+
+def test_rebuild_matches_the_holdings_after_a_delete(
+    client, db, superuser_headers, portfolio, asset
+):
+    url = f"{settings.API_V1_STR}/portfolios/{portfolio.id}/holdings"
+    response = client.post(
+        url,
+        headers=superuser_headers,
+        json={"asset_id": asset.id, "quantity": 2},
+    )
+    assert response.status_code == 200, response.text
+    response = client.delete(
+        f"{url}/{response.json()['id']}", headers=superuser_headers
+    )
+    assert response.status_code == 200, response.text
+
+    def holdings():
+        db.expire_all()
+        return [
+            (h.asset_id, h.quantity, h.cost_basis, h.realized_pnl)
+            for h in db.query(models.PortfolioHolding).filter_by(
+                portfolio_id=portfolio.id
+            )
+        ]
+
+    deleted = holdings()
+    assert [row[:2] for row in deleted] == [(asset.id, 0)]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolios/holdings/rebuild",
+        headers=superuser_headers,
+        params={"portfolio_id": portfolio.id},
+    )
+    assert response.status_code == 200, response.text
+    assert holdings() == deleted
+
+
+def test_holdings_after_a_cursor_without_a_limit(
+    client, superuser_headers, create_portfolio
+):
+    url = f"{settings.API_V1_STR}/portfolios/{create_portfolio(holdings=5)}/holdings"
+    response = client.get(url, headers=superuser_headers, params={"limit": 2})
+    assert response.status_code == 200, response.text
+    first = [row["id"] for row in response.json()]
+
+    response = client.get(
+        url,
+        headers=superuser_headers,
+        params={"cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert response.status_code == 200, response.text
+    rest = [row["id"] for row in response.json()]
+
+    assert len(first) == 2 and len(rest) == 3
+    assert max(first) < min(rest)
@@ -0,0 +1,26 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.valuation import bulk
+
+
+def test_concurrent_starts_run_one_revaluation(monkeypatch):
+    finish = threading.Event()
+    monkeypatch.setattr(bulk, "_jobs", OrderedDict())
+    monkeypatch.setattr(bulk, "run_revaluation", lambda job: finish.wait(10))
+
+    def start(_):
+        try:
+            return bulk.start_revaluation(workers=1)
+        except bulk.RevaluationRunning:
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            started = [job for job in pool.map(start, range(32)) if job]
+    finally:
+        finish.set()
+
+    assert len(started) == 1
+    assert bulk.get_running_job() is started[0]
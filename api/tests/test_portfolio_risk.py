@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app import models
+from app.models.market_data import TimeFrame
+from app.services.valuation.risk import get_return_stats
+
+
+def test_assets_with_a_short_history_do_not_cut_the_sample(db, make_asset):
+    window = 30
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    history = {make_asset(name="Long").id: window + 1, make_asset(name="Short").id: 3}
+    db.add_all(
+        models.MarketData(
+            asset_id=asset_id,
+            timeframe=TimeFrame.ONE_DAY,
+            date_time=today - timedelta(days=day),
+            close_price=100 + day % 5,
+        )
+        for asset_id, days in history.items()
+        for day in range(1, days + 1)
+    )
+    db.commit()
+
+    long_id, short_id = history
+    stats = get_return_stats(
+        db,
+        asset_ids=np.array(sorted(history)),
+        timeframe=TimeFrame.ONE_DAY,
+        window=window,
+        now=today,
+    )
+
+    assert stats.asset_ids.tolist() == [long_id]
+    assert stats.missing_asset_ids.tolist() == [short_id]
+    assert len(stats.returns) == window
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.core.config import settings
+from app.services.valuation.snapshots import day_start, take_snapshots
+
+
+def create_transaction(client, headers, portfolio, asset, *, days_ago: int) -> int:
+    date = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolio-transactions/",
+        headers=headers,
+        json={
+            "portfolio_id": portfolio.id,
+            "asset_id": asset.id,
+            "transaction_type": "buy",
+            "quantity": 1,
+            "price_each": 10,
+            "price_currency_id": portfolio.base_currency_id,
+            "transaction_date": date.isoformat(),
+        },
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def snapshot_days(db, portfolio):
+    db.expire_all()
+    return sorted(
+        day_start(snapshot.bucket_start)
+        for snapshot in db.query(models.PortfolioSnapshot).filter_by(
+            portfolio_id=portfolio.id
+        )
+    )
+
+
+def test_history_leaves_future_buckets_empty(
+    client, superuser_headers, portfolio, asset
+):
+    create_transaction(client, superuser_headers, portfolio, asset, days_ago=10)
+    today = day_start(datetime.now(timezone.utc))
+
+    response = client.get(
+        f"{settings.API_V1_STR}/portfolios/{portfolio.id}/history",
+        headers=superuser_headers,
+        params={
+            "from": (today - timedelta(days=2)).isoformat(),
+            "to": (today + timedelta(days=3)).isoformat(),
+        },
+    )
+
+    assert response.status_code == 200, response.text
+    values = [row["value"] for row in response.json()["result"]]
+    assert values[:3] == [1, 1, 1]
+    assert all(value is None for value in values[3:]), values
+
+
+def test_backdated_transactions_drop_snapshots(
+    client, db, superuser_headers, portfolio, asset
+):
+    create_transaction(client, superuser_headers, portfolio, asset, days_ago=10)
+    take_snapshots(db)
+    today = day_start(datetime.now(timezone.utc))
+    assert snapshot_days(db, portfolio)[-1] == today - timedelta(days=1)
+
+    # Today's transactions leave the completed days alone
+    create_transaction(client, superuser_headers, portfolio, asset, days_ago=0)
+    assert snapshot_days(db, portfolio)[-1] == today - timedelta(days=1)
+
+    transaction_id = create_transaction(
+        client, superuser_headers, portfolio, asset, days_ago=5
+    )
+    assert snapshot_days(db, portfolio)[-1] == today - timedelta(days=6)
+
+    take_snapshots(db)
+    assert snapshot_days(db, portfolio)[-1] == today - timedelta(days=1)
+    response = client.delete(
+        f"{settings.API_V1_STR}/portfolio-transactions/{transaction_id}",
+        headers=superuser_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert snapshot_days(db, portfolio)[-1] == today - timedelta(days=6)
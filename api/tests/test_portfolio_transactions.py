@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+from app import models
+from app.core.config import settings
+from app.core.security import create_access_token, get_password_hash
+
+
+def test_read_transaction_of_another_user(
+    client, db, superuser_headers, portfolio, asset
+):
+    other = models.User(
+        email="other@example.com",
+        hashed_password=get_password_hash("other"),
+        preferred_currency_id=portfolio.base_currency_id,
+    )
+    db.add(other)
+    db.commit()
+
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolio-transactions/",
+        headers=superuser_headers,
+        json={
+            "portfolio_id": portfolio.id,
+            "asset_id": asset.id,
+            "transaction_type": "buy",
+            "quantity": 1,
+            "price_each": 10,
+            "price_currency_id": portfolio.base_currency_id,
+            "transaction_date": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+    assert response.status_code == 200, response.text
+    url = f"{settings.API_V1_STR}/portfolio-transactions/{response.json()['id']}"
+
+    response = client.get(
+        url, headers={"Authorization": f"Bearer {create_access_token(other.id)}"}
+    )
+    assert response.status_code == 403, response.text
+
+    response = client.get(url, headers=superuser_headers)
+    assert response.status_code == 200, response.text
@@ -0,0 +1,69 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core.auth_cache import user_cache
+from app.core.config import settings
+from app.core.database import async_engine, async_read_engine, engine, read_engine
+from app.core.replica import LAST_WRITE_HEADER, read_router
+from app.main import app
+
+
+def test_reads_after_a_write_go_to_the_primary_in_any_process(
+    superuser_headers, monkeypatch, currency
+):
+    monkeypatch.setattr(settings, "READ_REPLICA_DATABASE_URI", "replica")
+    url = f"{settings.API_V1_STR}/portfolios/"
+
+    def read(client, **headers):
+        primary = read_router.primary_reads
+        response = client.get(url, headers={**superuser_headers, **headers})
+        assert response.status_code == 200, response.text
+        return "primary" if read_router.primary_reads > primary else "replica"
+
+    writer = TestClient(app)
+    assert read(writer) == "replica"
+    response = writer.post(
+        url,
+        headers=superuser_headers,
+        json={"name": "Replica", "is_active": True, "base_currency_id": currency.id},
+    )
+    assert response.status_code == 200, response.text
+    last_write = response.headers[LAST_WRITE_HEADER]
+
+    # The cookie routes the writer, the header any other client, and no
+    # server state is involved, so it holds whichever process serves them
+    assert read(writer) == "primary"
+    assert read(TestClient(app), **{LAST_WRITE_HEADER: last_write}) == "primary"
+    assert read(TestClient(app)) == "replica"
+
+
+def test_reads_check_out_one_connection(client, superuser_headers):
+    pools = {
+        id(e.pool): e.pool
+        for e in (
+            engine,
+            read_engine,
+            async_engine.sync_engine,
+            async_read_engine.sync_engine,
+        )
+    }.values()
+    checkouts = []
+
+    def on_checkout(*args):
+        checkouts.append(args)
+
+    user_cache.clear()
+    for pool in pools:
+        event.listen(pool, "checkout", on_checkout)
+    try:
+        for path in ("/portfolios/", "/currencies/"):
+            checkouts.clear()
+            response = client.get(
+                f"{settings.API_V1_STR}{path}", headers=superuser_headers
+            )
+            assert response.status_code == 200, response.text
+            assert len(checkouts) == 1, path
+            user_cache.clear()
+    finally:
+        for pool in pools:
+            event.remove(pool, "checkout", on_checkout)
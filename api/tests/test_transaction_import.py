@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.core.config import settings
+from app.services.imports import transactions as imports
+
+
+def test_import_rejects_bad_encoding_before_committing(
+    client, db, superuser_headers, monkeypatch, portfolio, asset
+):
+    # Valid rows well past the first read, then a byte that is not UTF-8,
+    # with a commit after every row
+    monkeypatch.setattr(imports, "IMPORT_CHUNK_SIZE", 1)
+    lines = ["asset_id,transaction_type,quantity,price_each,price_currency_id"]
+    lines += [f"{asset.id},buy,1,10,{portfolio.base_currency_id}"] * 2000
+    upload = ("\n".join(lines) + "\n").encode() + b"\xff\n"
+
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolio-transactions/import",
+        headers=superuser_headers,
+        params={"portfolio_id": portfolio.id},
+        files={"file": ("transactions.csv", upload, "text/csv")},
+    )
+
+    assert response.status_code == 400, response.text
+    assert (
+        db.query(models.PortfolioTransaction)
+        .filter_by(portfolio_id=portfolio.id)
+        .count()
+        == 0
+    )
+
+
+def test_imported_history_is_costed_at_the_rates_of_its_dates(
+    client, superuser_headers, portfolio, asset, foreign_currency
+):
+    now = datetime.now(timezone.utc)
+    lines = [
+        "asset_id,transaction_type,quantity,price_each,price_currency_id,transaction_date"
+    ]
+    lines += [
+        f"{asset.id},buy,1,10,{foreign_currency.id},"
+        f"{(now - timedelta(days=days_ago)).isoformat()}"
+        for days_ago in (20, 15)
+    ]
+    response = client.post(
+        f"{settings.API_V1_STR}/portfolio-transactions/import",
+        headers=superuser_headers,
+        params={"portfolio_id": portfolio.id},
+        files={"file": ("transactions.csv", "\n".join(lines) + "\n", "text/csv")},
+    )
+    assert response.status_code == 200, response.text
+
+    response = client.get(
+        f"{settings.API_V1_STR}/portfolios/{portfolio.id}/pnl",
+        headers=superuser_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["cost_basis"] == 40